@@ -0,0 +1,493 @@
+import copy
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from question_model import QuestionTable, pack_questions
+
+logger = logging.getLogger(__name__)
+
+STORE_BACKEND = os.environ.get('ANALYSIS_STORE_BACKEND', 'sqlite')
+STORE_PATH = os.environ.get('ANALYSIS_STORE_PATH', 'analyses.sqlite3')
+
+# Writes are queued and flushed in batches by a background thread
+WRITE_BATCH_SIZE = int(os.environ.get('ANALYSIS_STORE_BATCH_SIZE', 200))
+WRITE_FLUSH_SECONDS = float(os.environ.get('ANALYSIS_STORE_FLUSH_SECONDS', 1.0))
+WRITE_QUEUE_MAX = int(os.environ.get('ANALYSIS_STORE_QUEUE_MAX', 10000))
+# A batch that finds the database locked (another worker mid-transaction) is retried with backoff
+WRITE_RETRIES = int(os.environ.get('ANALYSIS_STORE_WRITE_RETRIES', 5))
+WRITE_RETRY_BACKOFF = float(os.environ.get('ANALYSIS_STORE_WRITE_RETRY_BACKOFF', 0.5))
+
+SUMMARY_KEYS = ('examType', 'language', 'totalScore', 'maxScore', 'totalQuestions',
+                'correctCount', 'wrongCount', 'unattemptedCount')
+
+def record_for(result, source_url=None):
+    """Row-ready form of an analysis: identity columns plus the JSON/packed payload"""
+    candidate = result.get('candidate') or {}
+    return {
+        'rollNumber': candidate.get('rollNumber', ''),
+        'examType': result['examType'],
+        'testDate': candidate.get('testDate', ''),
+        'shift': candidate.get('shift', ''),
+        'sourceUrl': source_url,
+        'result': result,
+    }
+
+def light_result(exam_type, candidate, total_score, sections):
+    """Just what the rank and normalization rebuilds read"""
+    return {'examType': exam_type, 'candidate': candidate, 'totalScore': total_score, 'sections': sections}
+
+class SQLiteStore:
+    """Parsed analyses on disk, one row per (examType, rollNumber), latest wins.
+
+    Candidate info, section scores and the packed question table live on the
+    analyses row; per-question status and selected/correct option bitmasks are
+    also kept one row per question in question_responses for bulk queries, and
+    as one fixed-size record per question in analyses.responses for re-scoring.
+    Revised answer keys are kept per shift in answer_key_overrides, and each
+    completed re-score is logged in answer_key_revisions so other processes
+    can tell their standings are out of date.
+    """
+
+    def __init__(self, path=STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS analyses (
+                id INTEGER PRIMARY KEY,
+                roll_number TEXT NOT NULL,
+                exam_type TEXT NOT NULL,
+                test_date TEXT NOT NULL,
+                shift TEXT NOT NULL,
+                total_score REAL NOT NULL,
+                source_url TEXT,
+                candidate TEXT NOT NULL,
+                summary TEXT NOT NULL,
+                sections TEXT NOT NULL,
+                questions TEXT NOT NULL,
+                responses BLOB,
+                updated_at REAL NOT NULL,
+                UNIQUE (exam_type, roll_number)
+            );
+            CREATE INDEX IF NOT EXISTS idx_analyses_roll ON analyses (roll_number);
+            CREATE INDEX IF NOT EXISTS idx_analyses_shift ON analyses (exam_type, test_date, shift);
+            CREATE INDEX IF NOT EXISTS idx_analyses_test_date ON analyses (test_date);
+            CREATE INDEX IF NOT EXISTS idx_analyses_source_url ON analyses (source_url);
+            CREATE INDEX IF NOT EXISTS idx_analyses_updated ON analyses (updated_at);
+            CREATE TABLE IF NOT EXISTS question_responses (
+                analysis_id INTEGER NOT NULL REFERENCES analyses (id),
+                question_number INTEGER NOT NULL,
+                part TEXT NOT NULL,
+                status INTEGER NOT NULL,
+                selected INTEGER NOT NULL,
+                correct INTEGER NOT NULL,
+                PRIMARY KEY (analysis_id, part, question_number)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS answer_key_overrides (
+                exam_type TEXT NOT NULL,
+                test_date TEXT NOT NULL,
+                shift TEXT NOT NULL,
+                part TEXT NOT NULL,
+                question_number INTEGER NOT NULL,
+                correct INTEGER,
+                dropped INTEGER NOT NULL,
+                PRIMARY KEY (exam_type, test_date, shift, part, question_number)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS answer_key_revisions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                exam_type TEXT NOT NULL,
+                test_date TEXT NOT NULL,
+                shift TEXT NOT NULL,
+                revised_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS plan_rescores (
+                exam_type TEXT PRIMARY KEY,
+                version TEXT NOT NULL,
+                claimed_at REAL NOT NULL
+            );
+        ''')
+        columns = {row[1] for row in self._conn.execute('PRAGMA table_info(analyses)')}
+        if 'responses' not in columns:
+            # Stores created before re-scoring; rows are backfilled by load_responses
+            self._conn.execute('ALTER TABLE analyses ADD COLUMN responses BLOB')
+
+    def save_many(self, records):
+        """Upsert a batch of records in one transaction"""
+        now = time.time()
+        tables = [pack_questions(record['result']['questions']) for record in records]
+        with self._lock, self._conn:
+            for record, table in zip(records, tables):
+                result = record['result']
+                self._conn.execute(
+                    'INSERT INTO analyses (roll_number, exam_type, test_date, shift, total_score, source_url, '
+                    'candidate, summary, sections, questions, responses, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) '
+                    'ON CONFLICT (exam_type, roll_number) DO UPDATE SET test_date = excluded.test_date, '
+                    'shift = excluded.shift, total_score = excluded.total_score, source_url = excluded.source_url, '
+                    'candidate = excluded.candidate, summary = excluded.summary, sections = excluded.sections, '
+                    'questions = excluded.questions, responses = excluded.responses, updated_at = excluded.updated_at',
+                    (
+                        record['rollNumber'], record['examType'], record['testDate'], record['shift'],
+                        result['totalScore'], record['sourceUrl'],
+                        json.dumps(result['candidate']),
+                        json.dumps({k: result[k] for k in SUMMARY_KEYS if k in result}),
+                        json.dumps(result['sections']),
+                        json.dumps(table.to_json(), separators=(',', ':')),
+                        table.responses(),
+                        now,
+                    ),
+                )
+                analysis_id = self._conn.execute(
+                    'SELECT id FROM analyses WHERE exam_type = ? AND roll_number = ?',
+                    (record['examType'], record['rollNumber']),
+                ).fetchone()[0]
+                self._conn.execute('DELETE FROM question_responses WHERE analysis_id = ?', (analysis_id,))
+                self._conn.executemany(
+                    'INSERT INTO question_responses (analysis_id, question_number, part, status, selected, correct) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    [
+                        (analysis_id, table.numbers[i], table.values[table.parts[i]],
+                         table.statuses[i], table.selected[i], table.correct[i])
+                        for i in range(len(table))
+                    ],
+                )
+
+    def get_by_roll(self, roll_number, exam_type=None):
+        """Most recently stored full result for a roll number, or None"""
+        sql = 'SELECT exam_type, candidate, summary, sections, questions, source_url FROM analyses WHERE roll_number = ?'
+        params = [roll_number]
+        if exam_type:
+            sql += ' AND exam_type = ?'
+            params.append(exam_type)
+        return self._fetch_one(sql, params)
+
+    def get_by_source_url(self, source_url, exam_type):
+        """Most recently stored full result analyzed from this sheet URL, or None"""
+        sql = ('SELECT exam_type, candidate, summary, sections, questions, source_url FROM analyses '
+               'WHERE source_url = ? AND exam_type = ?')
+        return self._fetch_one(sql, [source_url, exam_type])
+
+    def _fetch_one(self, sql, params):
+        sql += ' ORDER BY updated_at DESC LIMIT 1'
+        with self._lock:
+            row = self._conn.execute(sql, params).fetchone()
+        if row is None:
+            return None
+        exam_type, candidate, summary, sections, questions, source_url = row
+        result = {'candidate': json.loads(candidate)}
+        result.update(json.loads(summary))
+        result['sections'] = json.loads(sections)
+        result['questions'] = QuestionTable.from_json(json.loads(questions)).rows()
+        return result, source_url
+
+    def iter_summaries(self, exam_type=None):
+        """Light results (no questions) for rebuilding the rank/normalization indexes"""
+        sql = 'SELECT exam_type, candidate, total_score, sections FROM analyses'
+        params = []
+        if exam_type:
+            sql += ' WHERE exam_type = ?'
+            params.append(exam_type)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        for exam_type, candidate, total_score, sections in rows:
+            yield light_result(exam_type, json.loads(candidate), total_score, json.loads(sections))
+
+    def summaries_since(self, since):
+        """(light results, latest updated_at) for analyses saved or re-scored at or after since (time.time())"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT exam_type, candidate, total_score, sections, updated_at FROM analyses WHERE updated_at >= ? ORDER BY updated_at',
+                (since,),
+            ).fetchall()
+        results = [light_result(exam_type, json.loads(candidate), total_score, json.loads(sections)) for exam_type, candidate, total_score, sections, _ in rows]
+        return results, rows[-1][4] if rows else since
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM analyses').fetchone()[0]
+
+    def list_shifts(self, exam_type):
+        """[(testDate, shift)] with at least one stored analysis of exam_type"""
+        with self._lock:
+            return self._conn.execute(
+                'SELECT DISTINCT test_date, shift FROM analyses WHERE exam_type = ?', (exam_type,),
+            ).fetchall()
+
+    def key_overrides(self, exam_type, test_date, shift):
+        """{(part, question number): (correct bitmask or None, dropped)} for one shift"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT part, question_number, correct, dropped FROM answer_key_overrides '
+                'WHERE exam_type = ? AND test_date = ? AND shift = ?',
+                (exam_type, test_date, shift),
+            ).fetchall()
+        return {(part, number): (correct, bool(dropped)) for part, number, correct, dropped in rows}
+
+    def save_key_overrides(self, exam_type, test_date, shift, overrides):
+        """Merge a key revision into the shift's overrides (a later correct option wins, drops stick)"""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                'INSERT INTO answer_key_overrides (exam_type, test_date, shift, part, question_number, correct, dropped) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (exam_type, test_date, shift, part, question_number) '
+                'DO UPDATE SET correct = COALESCE(excluded.correct, correct), dropped = MAX(dropped, excluded.dropped)',
+                [
+                    (exam_type, test_date, shift, part, number, correct, int(dropped))
+                    for (part, number), (correct, dropped) in overrides.items()
+                ],
+            )
+            # Keep the per-question rows in line with the shift's key
+            self._conn.execute(
+                'UPDATE question_responses SET correct = COALESCE(o.correct, question_responses.correct), '
+                'status = CASE WHEN o.dropped THEN 0 WHEN question_responses.selected = 0 THEN 2 '
+                'WHEN question_responses.selected & COALESCE(o.correct, question_responses.correct) THEN 0 ELSE 1 END '
+                'FROM answer_key_overrides AS o JOIN analyses AS a '
+                'ON a.exam_type = o.exam_type AND a.test_date = o.test_date AND a.shift = o.shift '
+                'WHERE question_responses.analysis_id = a.id AND question_responses.part = o.part '
+                'AND question_responses.question_number = o.question_number '
+                'AND o.exam_type = ? AND o.test_date = ? AND o.shift = ?',
+                (exam_type, test_date, shift),
+            )
+
+    def record_key_revision(self, exam_type, test_date, shift):
+        """Log that a shift's stored scores now follow a revised key; returns the new key_revision()"""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                'INSERT INTO answer_key_revisions (exam_type, test_date, shift, revised_at) VALUES (?, ?, ?, ?)',
+                (exam_type, test_date, shift, time.time()),
+            )
+            return cursor.lastrowid
+
+    def key_revision(self):
+        """Id of the latest logged key revision across all shifts (0 if none)"""
+        with self._lock:
+            return self._conn.execute('SELECT COALESCE(MAX(id), 0) FROM answer_key_revisions').fetchone()[0]
+
+    def claim_rescore(self, exam_type, version):
+        """Claim re-scoring an exam's stored analyses under a plan version; False if a worker already has"""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                'INSERT INTO plan_rescores (exam_type, version, claimed_at) VALUES (?, ?, ?) '
+                'ON CONFLICT (exam_type) DO UPDATE SET version = excluded.version, claimed_at = excluded.claimed_at '
+                'WHERE plan_rescores.version != excluded.version',
+                (exam_type, version, time.time()),
+            )
+            return cursor.rowcount == 1
+
+    def load_responses(self, exam_type, test_date, shift):
+        """(ids, response blobs) for every stored analysis of one shift"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT id, responses FROM analyses WHERE exam_type = ? AND test_date = ? AND shift = ?',
+                (exam_type, test_date, shift),
+            ).fetchall()
+            missing = [analysis_id for analysis_id, blob in rows if blob is None]
+            if missing:
+                backfilled = self._backfill_responses(missing)
+                rows = [(i, blob if blob is not None else backfilled[i]) for i, blob in rows]
+        return [row[0] for row in rows], [row[1] for row in rows]
+
+    def _backfill_responses(self, ids):
+        blobs = {}
+        with self._conn:
+            for analysis_id in ids:
+                questions = self._conn.execute('SELECT questions FROM analyses WHERE id = ?', (analysis_id,)).fetchone()[0]
+                blobs[analysis_id] = QuestionTable.from_json(json.loads(questions)).responses()
+                self._conn.execute('UPDATE analyses SET responses = ? WHERE id = ?', (blobs[analysis_id], analysis_id))
+        return blobs
+
+    def save_scores(self, rows):
+        """Write re-scored (id, total score, (correct, wrong, unattempted), sections) rows in one transaction"""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                'UPDATE analyses SET total_score = ?, sections = ?, updated_at = ?, '
+                "summary = json_set(summary, '$.totalScore', ?, '$.correctCount', ?, '$.wrongCount', ?, '$.unattemptedCount', ?) "
+                'WHERE id = ?',
+                [
+                    (total_score, json.dumps(sections), now, total_score, *counts, analysis_id)
+                    for analysis_id, total_score, counts, sections in rows
+                ],
+            )
+
+class MemoryStore:
+    """In-process stand-in for SQLiteStore (nothing survives a restart).
+
+    Results are deep-copied on the way in and out, like a round trip through
+    SQLite, so callers can mark up what they read without changing the record.
+    """
+
+    def __init__(self):
+        self._results = {}
+        self._updated = {}
+        self._overrides = {}
+        self._key_revision = 0
+        self._rescored = {}
+        self._lock = threading.Lock()
+
+    def save_many(self, records):
+        now = time.time()
+        with self._lock:
+            for record in records:
+                key = (record['examType'], record['rollNumber'])
+                self._results[key] = (copy.deepcopy(record['result']), record['sourceUrl'])
+                self._updated[key] = now
+
+    def get_by_roll(self, roll_number, exam_type=None):
+        with self._lock:
+            for (stored_exam, stored_roll), value in reversed(list(self._results.items())):
+                if stored_roll == roll_number and (not exam_type or stored_exam == exam_type):
+                    return copy.deepcopy(value[0]), value[1]
+        return None
+
+    def get_by_source_url(self, source_url, exam_type):
+        with self._lock:
+            for (stored_exam, _), value in reversed(list(self._results.items())):
+                if value[1] == source_url and stored_exam == exam_type:
+                    return copy.deepcopy(value[0]), value[1]
+        return None
+
+    def iter_summaries(self, exam_type=None):
+        with self._lock:
+            results = [result for result, _ in self._results.values()]
+        for result in results:
+            if not exam_type or result['examType'] == exam_type:
+                yield light_result(result['examType'], result['candidate'], result['totalScore'], result['sections'])
+
+    def summaries_since(self, since):
+        with self._lock:
+            changed = sorted((updated, key) for key, updated in self._updated.items() if updated >= since)
+            results = [self._results[key][0] for _, key in changed]
+        summaries = [light_result(r['examType'], r['candidate'], r['totalScore'], r['sections']) for r in results]
+        return summaries, changed[-1][0] if changed else since
+
+    def count(self):
+        with self._lock:
+            return len(self._results)
+
+    def list_shifts(self, exam_type):
+        with self._lock:
+            results = [result for result, _ in self._results.values() if result['examType'] == exam_type]
+        return list(dict.fromkeys((r['candidate'].get('testDate', ''), r['candidate'].get('shift', '')) for r in results))
+
+    def key_overrides(self, exam_type, test_date, shift):
+        with self._lock:
+            return dict(self._overrides.get((exam_type, test_date, shift), {}))
+
+    def save_key_overrides(self, exam_type, test_date, shift, overrides):
+        with self._lock:
+            current = self._overrides.setdefault((exam_type, test_date, shift), {})
+            for key, (correct, dropped) in overrides.items():
+                old_correct, old_dropped = current.get(key, (None, False))
+                current[key] = (correct if correct is not None else old_correct, dropped or old_dropped)
+
+    def record_key_revision(self, exam_type, test_date, shift):
+        with self._lock:
+            self._key_revision += 1
+            return self._key_revision
+
+    def key_revision(self):
+        with self._lock:
+            return self._key_revision
+
+    def claim_rescore(self, exam_type, version):
+        with self._lock:
+            if self._rescored.get(exam_type) == version:
+                return False
+            self._rescored[exam_type] = version
+            return True
+
+    def load_responses(self, exam_type, test_date, shift):
+        with self._lock:
+            items = [
+                (key, result) for key, (result, _) in self._results.items()
+                if key[0] == exam_type and result['candidate'].get('testDate') == test_date
+                and result['candidate'].get('shift') == shift
+            ]
+        return [key for key, _ in items], [pack_questions(result['questions']).responses() for _, result in items]
+
+    def save_scores(self, rows):
+        now = time.time()
+        with self._lock:
+            for key, total_score, (correct, wrong, unattempted), sections in rows:
+                self._updated[key] = now
+                result, source_url = self._results[key]
+                self._results[key] = (dict(
+                    result, totalScore=total_score, correctCount=correct, wrongCount=wrong,
+                    unattemptedCount=unattempted, sections=sections,
+                ), source_url)
+
+STORE_BACKENDS = {
+    'sqlite': SQLiteStore,
+    'memory': MemoryStore,
+}
+
+def create_store(backend=STORE_BACKEND, **kwargs):
+    """Build an analysis store for the named backend ('sqlite' or 'memory')"""
+    if backend not in STORE_BACKENDS:
+        raise ValueError(f'Unknown analysis store backend: {backend}')
+    return STORE_BACKENDS[backend](**kwargs)
+
+class StoreWriter:
+    """Background thread that drains queued analyses into the store in batches"""
+
+    def __init__(self, store, batch_size=WRITE_BATCH_SIZE, flush_seconds=WRITE_FLUSH_SECONDS, max_queued=WRITE_QUEUE_MAX):
+        self.store = store
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._thread = threading.Thread(target=self._run, name='analysis-store-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, result, source_url=None):
+        """Queue an analysis for persistence; returns False if it was dropped"""
+        if not (result.get('candidate') or {}).get('rollNumber'):
+            return False
+        try:
+            self._queue.put_nowait(record_for(result, source_url))
+            return True
+        except queue.Full:
+            logger.warning('analysis store queue full, dropping write roll=%s', result['candidate']['rollNumber'])
+            return False
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.time() + self.flush_seconds
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self._save(batch)
+            for _ in batch:
+                self._queue.task_done()
+
+    def _save(self, batch):
+        for attempt in range(WRITE_RETRIES + 1):
+            try:
+                self.store.save_many(batch)
+                return
+            except sqlite3.OperationalError as e:
+                # Usually 'database is locked' while another worker holds a long write
+                if attempt == WRITE_RETRIES:
+                    logger.exception('analysis store write failed batch=%d attempts=%d error=%s', len(batch), attempt + 1, e)
+                    return
+                logger.warning('analysis store write retrying batch=%d attempt=%d error=%s', len(batch), attempt + 1, e)
+                time.sleep(WRITE_RETRY_BACKOFF * 2 ** attempt)
+            except Exception as e:
+                logger.exception('analysis store write failed batch=%d error=%s', len(batch), e)
+                return
+
+    def flush(self):
+        """Block until everything queued so far has been written"""
+        self._queue.join()
@@ -0,0 +1,198 @@
+"""The regex parser server.py used before the single-pass tokenizer, as a benchmark baseline.
+
+Copied unchanged apart from dropping the banner it printed on every call, so
+bench_parse.py times the parsing alone. Not used by the server.
+"""
+import re
+
+def parse_candidate_info(html):
+    """Parse candidate information from HTML (matching index.ts parseCandidateInfo)"""
+    def get_table_value(label):
+        pattern = rf'<td[^>]*>[^<]*{re.escape(label)}[^<]*</td>\s*<td[^>]*>:?(?:&nbsp;)*\s*([^<]+)'
+        match = re.search(pattern, html, re.IGNORECASE)
+        if match:
+            return match.group(1).replace('&nbsp;', ' ').strip()
+        return ''
+    
+    return {
+        'rollNumber': get_table_value('Roll No') or get_table_value('Roll Number') or '',
+        'name': get_table_value('Candidate Name') or get_table_value('Name') or '',
+        'examLevel': get_table_value('Exam Level') or '',
+        'testDate': get_table_value('Test Date') or '',
+        'shift': get_table_value('Test Time') or get_table_value('Shift') or '',
+        'centreName': get_table_value('Centre Name') or get_table_value('Center Name') or '',
+    }
+
+def get_language_urls(image_url):
+    """Get Hindi and English URLs (matching index.ts getLanguageUrls)"""
+    if not image_url:
+        return {'hindi': '', 'english': ''}
+    
+    is_hindi = bool(re.search(r'_HI\.(jpg|jpeg|png|gif)', image_url, re.IGNORECASE))
+    is_english = bool(re.search(r'_EN\.(jpg|jpeg|png|gif)', image_url, re.IGNORECASE))
+    
+    hindi_url = image_url
+    english_url = image_url
+    
+    if is_hindi:
+        english_url = re.sub(r'_HI\.(jpg|jpeg|png|gif)', r'_EN.\1', image_url, flags=re.IGNORECASE)
+    elif is_english:
+        hindi_url = re.sub(r'_EN\.(jpg|jpeg|png|gif)', r'_HI.\1', image_url, flags=re.IGNORECASE)
+    
+    return {'hindi': hindi_url, 'english': english_url}
+
+def parse_questions_for_part(html, part, base_url, subject, question_offset):
+    """Parse questions from HTML for a specific part (matching index.ts parseQuestionsForPart)"""
+    questions = []
+    
+    url_parts = base_url.split('?')[0]
+    last_slash = url_parts.rfind('/')
+    base_dir = url_parts[:last_slash + 1]
+    
+    # Find all question tables
+    question_table_pattern = re.compile(r'<table[^>]*>[\s\S]*?Q\.No:\s*&nbsp;(\d+)[\s\S]*?</table>', re.IGNORECASE)
+    
+    for table_match in question_table_pattern.finditer(html):
+        q_num = int(table_match.group(1))
+        table_content = table_match.group(0)
+        
+        # Extract question image
+        q_img_pattern = re.search(r'Q\.No:\s*&nbsp;\d+</font></td><td[^>]*>[\s\S]*?<img[^>]+src\s*=\s*["\']([^"\']+)["\']', table_content, re.IGNORECASE)
+        question_image_url = q_img_pattern.group(1) if q_img_pattern else ''
+        
+        if question_image_url and not question_image_url.startswith('http'):
+            question_image_url = base_dir + question_image_url
+        
+        # Get language URLs for question
+        question_lang_urls = get_language_urls(question_image_url)
+        final_q_hindi = question_lang_urls['hindi'] or question_image_url
+        final_q_english = question_lang_urls['english'] or question_image_url
+        
+        options = []
+        option_ids = ['A', 'B', 'C', 'D']
+        
+        # Parse option rows
+        option_row_pattern = re.compile(r'<tr[^>]*(?:bgcolor\s*=\s*["\']([^"\']+)["\'])?[^>]*>([\s\S]*?)</tr>', re.IGNORECASE)
+        opt_idx = 0
+        found_question_row = False
+        
+        for row_match in option_row_pattern.finditer(table_content):
+            if opt_idx >= 4:
+                break
+                
+            row_bgcolor = (row_match.group(1) or '').lower()
+            row_content = row_match.group(2)
+            
+            if 'Q.No:' in row_content:
+                found_question_row = True
+                continue
+            
+            if not found_question_row:
+                continue
+            
+            # Extract ALL images from this option row
+            img_regex = re.compile(r'<img[^>]+src\s*=\s*["\']([^"\']+)["\']', re.IGNORECASE)
+            image_urls = []
+            
+            for img_match in img_regex.finditer(row_content):
+                url = img_match.group(1)
+                if url and not url.startswith('http'):
+                    url = base_dir + url
+                image_urls.append(url)
+            
+            if not image_urls:
+                continue
+            
+            # Identify Hindi and English URLs
+            hindi_url = ''
+            english_url = ''
+            default_url = image_urls[0]
+            
+            for url in image_urls:
+                if re.search(r'_HI\.(jpg|jpeg|png|gif)', url, re.IGNORECASE):
+                    hindi_url = url
+                elif re.search(r'_EN\.(jpg|jpeg|png|gif)', url, re.IGNORECASE):
+                    english_url = url
+            
+            # Fallback logic
+            if not hindi_url and not english_url:
+                lang_urls = get_language_urls(default_url)
+                hindi_url = lang_urls['hindi'] or default_url
+                english_url = lang_urls['english'] or default_url
+            else:
+                if not hindi_url:
+                    hindi_url = english_url or default_url
+                if not english_url:
+                    english_url = hindi_url or default_url
+            
+            # Get bgcolor from td if not on tr
+            bgcolor = row_bgcolor
+            if not bgcolor:
+                td_bg_match = re.search(r'bgcolor\s*=\s*["\']([^"\']+)["\']', row_content, re.IGNORECASE)
+                if td_bg_match:
+                    bgcolor = td_bg_match.group(1).lower()
+            
+            is_green = 'green' in bgcolor
+            is_red = 'red' in bgcolor
+            is_yellow = 'yellow' in bgcolor
+            
+            is_correct = is_green or is_yellow
+            is_selected = is_green or is_red
+            
+            options.append({
+                'id': option_ids[opt_idx],
+                'imageUrl': default_url,
+                'imageUrlHindi': hindi_url,
+                'imageUrlEnglish': english_url,
+                'isSelected': is_selected,
+                'isCorrect': is_correct,
+            })
+            
+            opt_idx += 1
+        
+        # Pad options to 4
+        while len(options) < 4:
+            options.append({
+                'id': option_ids[len(options)],
+                'imageUrl': '',
+                'imageUrlHindi': '',
+                'imageUrlEnglish': '',
+                'isSelected': False,
+                'isCorrect': False,
+            })
+        
+        if len(options) >= 2:
+            # Determine status
+            has_selected = any(o['isSelected'] for o in options)
+            selected_is_correct = any(o['isSelected'] and o['isCorrect'] for o in options)
+            
+            if not has_selected:
+                status = 'unattempted'
+            elif selected_is_correct:
+                status = 'correct'
+            else:
+                status = 'wrong'
+            
+            # Calculate marks
+            if status == 'correct':
+                marks_awarded = subject['correctMarks']
+            elif status == 'wrong':
+                marks_awarded = -subject['negativeMarks']
+            else:
+                marks_awarded = 0
+            
+            actual_question_number = question_offset + q_num
+            
+            questions.append({
+                'questionNumber': actual_question_number,
+                'part': part,
+                'subject': subject['name'],
+                'questionImageUrl': question_image_url,
+                'questionImageUrlHindi': final_q_hindi,
+                'questionImageUrlEnglish': final_q_english,
+                'options': options,
+                'status': status,
+                'marksAwarded': marks_awarded,
+            })
+    
+    return questions
@@ -0,0 +1,114 @@
+"""Memory and throughput of the compact question model on large batches of results.
+
+Run from the repo root:  python bench/bench_compact.py [--candidates N] [--iterations N]
+
+Each synthetic candidate is the ssc_cgl_pre_large fixture re-rooted under its
+own image directory, so no strings are shared between candidates (as with real
+sheets, where every candidate has a distinct base path).
+"""
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from server import build_result, generate_part_urls, get_exam_plan, parse_response_page, score_questions
+from question_model import pack_result, unpack_result
+from response_cache import encode_value
+from stub_upstream import FIXTURES_DIR
+from bench_suite import report, sample
+
+FIXTURE_SET = 'ssc_cgl_pre_large'
+EXAM_TYPE = 'SSC_CGL_PRE'
+
+def load_result():
+    plan = get_exam_plan(EXAM_TYPE)
+    part_urls = generate_part_urls(f'https://ssc.example.org/per/g27/pub/2207/{FIXTURE_SET}/ViewCandResponse.aspx?rid=1', plan)
+    part_offsets = plan.offsets
+    candidate = None
+    questions = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for part_info in part_urls:
+            file_name = part_info['url'].split('?')[0].rsplit('/', 1)[1]
+            with open(os.path.join(FIXTURES_DIR, FIXTURE_SET, file_name), encoding='utf-8') as f:
+                html = f.read()
+            page_candidate, page_questions = parse_response_page(
+                html, part_info['part'], part_info['url'], part_info['subject'], part_offsets[part_info['part']],
+            )
+            candidate = candidate or page_candidate
+            questions.extend(page_questions)
+        return build_result(EXAM_TYPE, plan, 'english', candidate, questions)
+
+def reroot(value, old, new):
+    if isinstance(value, str):
+        return value.replace(old, new)
+    if isinstance(value, list):
+        return [reroot(v, old, new) for v in value]
+    if isinstance(value, dict):
+        return {k: reroot(v, old, new) for k, v in value.items()}
+    return value
+
+def candidate_results(template, count):
+    return [reroot(template, f'/{FIXTURE_SET}/', f'/{FIXTURE_SET}/c{i:06d}/') for i in range(count)]
+
+def measure(build):
+    """Bytes still allocated by whatever build() returns"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return kept, after - before
+
+def three_scan_scoring(questions, exam_config):
+    """Per-subject filter plus separate count scans, as scoring worked before score_questions"""
+    sections = []
+    for subject in exam_config['subjects']:
+        part_questions = [q for q in questions if q['part'] == subject['part']]
+        correct = len([q for q in part_questions if q['status'] == 'correct'])
+        wrong = len([q for q in part_questions if q['status'] == 'wrong'])
+        unattempted = len([q for q in part_questions if q['status'] == 'unattempted'])
+        sections.append((correct, wrong, unattempted))
+    counts = [len([q for q in questions if q['status'] == status]) for status in ('correct', 'wrong', 'unattempted')]
+    return sections, counts
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--candidates', type=int, default=500, help='results held at once for the memory figures')
+    parser.add_argument('--iterations', type=int, default=200, help='calls per throughput benchmark')
+    args = parser.parse_args()
+
+    template = load_result()
+    questions = template['questions']
+    plan = get_exam_plan(EXAM_TYPE)
+    print(f'Fixture: {FIXTURE_SET}, {len(questions)} questions per candidate, {args.candidates} candidates')
+
+    print('--- memory (results held at once) ---')
+    dicts, dict_bytes = measure(lambda: candidate_results(template, args.candidates))
+    packed, packed_bytes = measure(lambda: [pack_result(r) for r in dicts])
+    print(f'{"question dicts":<48} {dict_bytes / 2**20:10.1f} MiB  {dict_bytes / args.candidates / 1024:8.1f} KiB/candidate')
+    print(f'{"QuestionTable":<48} {packed_bytes / 2**20:10.1f} MiB  {packed_bytes / args.candidates / 1024:8.1f} KiB/candidate')
+    assert all(unpack_result(p) == d for p, d in zip(packed[:10], dicts[:10]))
+
+    print('--- stored size (JSON, one candidate) ---')
+    plain_size = len(json.dumps(dicts[0], separators=(',', ':')))
+    packed_size = len(json.dumps(packed[0], separators=(',', ':'), default=encode_value))
+    print(f'{"question dicts":<48} {plain_size:10d} bytes')
+    print(f'{"QuestionTable":<48} {packed_size:10d} bytes')
+
+    print('--- throughput (per candidate) ---')
+    report(f'three-scan scoring ({len(questions)}q)', sample(lambda: three_scan_scoring(questions, plan.config), args.iterations))
+    report(f'score_questions ({len(questions)}q)', sample(lambda: score_questions(questions, plan), args.iterations))
+    report('pack_result', sample(lambda: pack_result(template), args.iterations))
+    report('unpack_result', sample(lambda: unpack_result(packed[0]), args.iterations))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""Micro-benchmark for the page parsing hot path on a saved response sheet.
+
+Run from the repo root:  python bench/bench_parse.py [iterations] [page]
+
+page defaults to the 25-question fixture; e.g.
+bench/fixtures/ssc_cgl_pre_large/ViewCandResponse.aspx is a 100-question part.
+
+Each parser entry point is timed against the regex parser it replaced
+(bench/baseline_parser.py), so the before/after ratio is measured on every run.
+With PARSE_PROCESSES=N set, also times a page sent through the parse pool
+(round trip, and the unpickle + rows() part that still runs in-process).
+"""
+import os
+import pickle
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import baseline_parser
+import parse_pool
+from response_parser import get_language_urls, parse_candidate_info, parse_questions_for_part, parse_response_page
+
+FIXTURE = os.path.join(os.path.dirname(__file__), 'fixtures', 'ViewCandResponse.html')
+PART_URL = 'https://ssc.example.org/per/g27/pub/2207/touchstone/ViewCandResponse.aspx?rid=1'
+SUBJECT = {'name': 'General Awareness', 'part': 'A', 'totalQuestions': 25, 'maxMarks': 25, 'correctMarks': 1, 'negativeMarks': 0.25}
+
+def timed(label, fn, iterations, repeat=5):
+    """Best-of-repeat time per call, which is the least noisy figure on a busy box"""
+    fn()
+    best = min(timeit.repeat(fn, number=iterations, repeat=repeat)) / iterations
+    print(f'{label:<36} {best * 1000:8.3f} ms/call')
+    return best
+
+def compared(label, fn, baseline_fn, iterations):
+    """Time fn and the baseline implementation of the same call, and print the ratio"""
+    current = timed(label, fn, iterations)
+    baseline = timed('  baseline (regex)', baseline_fn, iterations)
+    print(f'{"  speedup":<36} {baseline / current:8.1f}x')
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    fixture = sys.argv[2] if len(sys.argv) > 2 else FIXTURE
+    with open(fixture, encoding='utf-8') as f:
+        html = f.read()
+
+    print(f'Fixture: {os.path.basename(fixture)} ({len(html)} bytes), {iterations} iterations')
+
+    candidate, questions = parse_response_page(html, 'A', PART_URL, SUBJECT, 0)
+    print(f'Parsed {len(questions)} questions for roll number {candidate["rollNumber"]}')
+    if baseline_parser.parse_questions_for_part(html, 'A', PART_URL, SUBJECT, 0) != questions:
+        print('warning: baseline parser output differs from response_parser')
+
+    image_urls = [q['questionImageUrl'] for q in questions] + [o['imageUrl'] for q in questions for o in q['options']]
+
+    timed('parse_response_page', lambda: parse_response_page(html, 'A', PART_URL, SUBJECT, 0), iterations)
+    compared(
+        'parse_questions_for_part',
+        lambda: parse_questions_for_part(html, 'A', PART_URL, SUBJECT, 0),
+        lambda: baseline_parser.parse_questions_for_part(html, 'A', PART_URL, SUBJECT, 0),
+        iterations,
+    )
+    compared('parse_candidate_info', lambda: parse_candidate_info(html), lambda: baseline_parser.parse_candidate_info(html), iterations)
+    compared(
+        f'get_language_urls x{len(image_urls)}',
+        lambda: [get_language_urls(u) for u in image_urls],
+        lambda: [baseline_parser.get_language_urls(u) for u in image_urls],
+        iterations,
+    )
+
+    if parse_pool.PARSE_PROCESSES:
+        body = html.encode('utf-8')
+        args = (body, 'utf-8', 'A', PART_URL, SUBJECT, 0)
+        result = pickle.dumps(parse_pool.parse_page_bytes(*args))
+        timed(f'parse_pool.parse_page x{parse_pool.PARSE_PROCESSES}', lambda: parse_pool.parse_page(*args), iterations)
+        timed(f'  in-process share ({len(result)} B)', lambda: pickle.loads(result)[1].rows(), iterations)
+        parse_pool.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Per-question stats: running counters versus rescanning every analysis.
+
+Run from the repo root:  python bench/bench_question_stats.py [--candidates N]
+
+Feeds N synthetic analyses of one shift (random answers against a fixed key)
+into each question stats backend (in-process counters, and the SQLite table
+shared by workers), then times a query against each and the same numbers
+computed by looping over every candidate's questions.
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from exam_plans import ExamPlanRegistry
+from question_stats import QuestionStatsEngine, SQLiteQuestionStats
+from response_parser import OPTION_IDS
+
+EXAM_TYPE = 'DELHI_POLICE_HEAD_CONSTABLE'
+CANDIDATE = {'testDate': '21/11/2025', 'shift': '9:00 AM - 10:30 AM'}
+
+def make_results(plan, candidates, seed=7):
+    rng = random.Random(seed)
+    key = []
+    for subject in plan.subjects:
+        for n in range(subject['totalQuestions']):
+            key.append((subject['part'], plan.offsets[subject['part']] + n + 1, rng.randrange(4)))
+
+    results = []
+    for c in range(candidates):
+        questions = []
+        for part, number, answer in key:
+            # A fifth of answers left blank, the rest spread over the four options
+            choice = rng.randrange(5)
+            questions.append({
+                'part': part,
+                'questionNumber': number,
+                'options': [{'isSelected': i == choice, 'isCorrect': i == answer} for i in range(len(OPTION_IDS))],
+            })
+        results.append({'examType': EXAM_TYPE, 'candidate': dict(CANDIDATE, rollNumber=f'R{c:07d}'), 'questions': questions})
+    return results
+
+def rescan(results):
+    """{(part, number): [attempted, correct, option counts]} the slow way"""
+    stats = {}
+    for result in results:
+        for q in result['questions']:
+            entry = stats.setdefault((q['part'], q['questionNumber']), [0, 0, [0] * len(OPTION_IDS)])
+            for i, option in enumerate(q['options']):
+                if option['isSelected']:
+                    entry[0] += 1
+                    entry[2][i] += 1
+                    entry[1] += option['isCorrect']
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--candidates', type=int, default=20000, help='analyses recorded for the shift')
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    plan = ExamPlanRegistry().get(EXAM_TYPE)
+    results = make_results(plan, args.candidates)
+    with tempfile.TemporaryDirectory() as tmp:
+        engines = [
+            ('memory', QuestionStatsEngine(path='', snapshot_seconds=0)),
+            ('sqlite', SQLiteQuestionStats(path=os.path.join(tmp, 'question_stats.sqlite3'))),
+        ]
+        for name, engine in engines:
+            start = time.perf_counter()
+            for result in results:
+                engine.record(result)
+            elapsed = time.perf_counter() - start
+            print(f'{f"{name} record (per analysis)":<32} {elapsed / len(results) * 1e6:8.1f}us')
+
+            start = time.perf_counter()
+            engine.summary(EXAM_TYPE, CANDIDATE['testDate'], CANDIDATE['shift'], plan.subjects)
+            print(f'{f"{name} summary from counters":<32} {(time.perf_counter() - start) * 1e3:8.2f}ms')
+
+    start = time.perf_counter()
+    rescan(results)
+    print(f'{"rescan of every analysis":<32} {(time.perf_counter() - start) * 1e3:8.2f}ms  {len(results)} analyses')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Bulk re-scoring of a whole shift after an answer-key revision.
+
+Run from the repo root:  python bench/bench_rescore.py [--candidates N]
+
+Fills a throwaway SQLite store with N synthetic analyses of one shift (random
+responses against a fixed key), then times rescore_shift for a revision that
+changes three answers and drops one question, and the numpy pass on its own.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from analysis_store import SQLiteStore
+from exam_plans import ExamPlanRegistry
+from rescoring import RESPONSE_DTYPE, rescore_shift, score_responses
+
+EXAM_TYPE = 'DELHI_POLICE_HEAD_CONSTABLE'
+TEST_DATE = '21/11/2025'
+SHIFT = '9:00 AM - 10:30 AM'
+
+def populate(store, plan, candidates, seed=7):
+    """Insert candidates analyses straight into the store (responses and summary only)"""
+    rng = np.random.default_rng(seed)
+    question_count = sum(s['totalQuestions'] for s in plan.subjects)
+    template = np.zeros(question_count, dtype=RESPONSE_DTYPE)
+    i = 0
+    for subject in plan.subjects:
+        for n in range(subject['totalQuestions']):
+            template[i] = (plan.offsets[subject['part']] + n + 1, subject['part'].encode(), 0, 1 << rng.integers(4))
+            i += 1
+
+    # A fifth of answers left blank, the rest spread over the four options
+    choices = rng.integers(0, 5, size=(candidates, question_count))
+    selected = np.where(choices == 4, 0, np.left_shift(1, choices)).astype(np.uint8)
+
+    rows = []
+    for c in range(candidates):
+        records = template.copy()
+        records['selected'] = selected[c]
+        rows.append((f'R{c:07d}', EXAM_TYPE, TEST_DATE, SHIFT, 0.0, '{}', json.dumps({'examType': EXAM_TYPE}),
+                     '[]', '{}', records.tobytes(), 0.0))
+    with store._conn:
+        store._conn.executemany(
+            'INSERT INTO analyses (roll_number, exam_type, test_date, shift, total_score, candidate, summary, '
+            'sections, questions, responses, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            rows,
+        )
+    return template
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--candidates', type=int, default=200000, help='analyses stored for the shift')
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    plan = ExamPlanRegistry().get(EXAM_TYPE)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SQLiteStore(os.path.join(tmp, 'bench.sqlite3'))
+        start = time.perf_counter()
+        template = populate(store, plan, args.candidates)
+        print(f'Populated {args.candidates} analyses x {len(template)} questions in {time.perf_counter() - start:.1f}s')
+
+        numbers = template['number'].tolist()
+        parts = [p.decode() for p in template['part'].tolist()]
+        revision = {(parts[i], numbers[i]): (0b0100, False) for i in (3, 40, 77)}
+        revision[(parts[10], numbers[10])] = (None, True)
+
+        _, blobs = store.load_responses(EXAM_TYPE, TEST_DATE, SHIFT)
+        start = time.perf_counter()
+        score_responses(plan, revision, blobs)
+        print(f'{"score_responses (numpy pass)":<40} {time.perf_counter() - start:8.2f}s')
+        del blobs
+
+        start = time.perf_counter()
+        count = rescore_shift(store, plan, EXAM_TYPE, TEST_DATE, SHIFT, revision)
+        print(f'{"rescore_shift (load, score, write)":<40} {time.perf_counter() - start:8.2f}s  {count} analyses')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""Offline benchmark suite: parsing, scoring and end-to-end POST / against a stub upstream.
+
+Run from the repo root:  python bench/bench_suite.py [--iterations N] [--requests N]
+    [--concurrency N] [--latency S] [--jitter S] [--failure-rate F] [--upstream-rate R]
+
+Nothing touches the live answer-key site: fixtures come from bench/fixtures
+(see make_fixtures.py) and part pages are served by stub_upstream.py.
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+import server
+from server import calculate_sections, generate_part_urls, get_exam_plan, parse_candidate_info, parse_questions_for_part
+from stub_upstream import FIXTURES_DIR, start_stub
+from upstream_guard import TokenBucket, guard_for
+from make_fixtures import FIXTURE_SETS
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+def report(label, samples, wall_time=None):
+    samples = sorted(samples)
+    wall_time = wall_time if wall_time is not None else sum(samples)
+    throughput = len(samples) / wall_time if wall_time else 0.0
+    print(
+        f'{label:<48} n={len(samples):<5} {throughput:10.1f}/s  '
+        f'p50={percentile(samples, 50) * 1000:8.3f}ms  '
+        f'p95={percentile(samples, 95) * 1000:8.3f}ms  '
+        f'p99={percentile(samples, 99) * 1000:8.3f}ms'
+    )
+
+def sample(fn, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def bench_parsing(iterations):
+    print('--- parsing and scoring (per call) ---')
+    for name, exam_type, _ in FIXTURE_SETS:
+        plan = get_exam_plan(exam_type)
+        part_urls = generate_part_urls(f'http://stub/{name}/ViewCandResponse.aspx?rid=1', plan)
+        part_offsets = plan.offsets
+
+        pages = []
+        for part_info in part_urls:
+            file_name = part_info['url'].split('?')[0].rsplit('/', 1)[1]
+            with open(os.path.join(FIXTURES_DIR, name, file_name), encoding='utf-8') as f:
+                pages.append((part_info, f.read()))
+
+        def parse_all():
+            questions = []
+            for part_info, html in pages:
+                questions.extend(parse_questions_for_part(
+                    html, part_info['part'], part_info['url'], part_info['subject'], part_offsets[part_info['part']],
+                ))
+            return questions
+
+        questions = parse_all()
+        parse_samples = sample(parse_all, iterations)
+
+        first_page = pages[0][1]
+        report(f'{name}: parse_questions_for_part x{len(pages)}', parse_samples)
+        report(f'{name}: parse_candidate_info', sample(lambda: parse_candidate_info(first_page), iterations))
+        report(f'{name}: calculate_sections ({len(questions)}q)', sample(lambda: calculate_sections(questions, plan), iterations))
+
+def bench_end_to_end(requests_count, concurrency, stub_config, upstream_rate=None):
+    print(f'--- end-to-end POST / ({concurrency} concurrent, stub {stub_config}, upstream rate {upstream_rate or "default"}) ---')
+    stub, base_url = start_stub(seed=42, **stub_config)
+    client = server.app.test_client()
+    if upstream_rate:
+        # The stub is local, so the politeness limit would otherwise be what gets measured
+        guard_for(base_url).bucket = TokenBucket(rate=upstream_rate, burst=upstream_rate)
+
+    try:
+        for name, exam_type, _ in FIXTURE_SETS:
+            # A distinct rid per request keeps the response cache and request coalescing out of the numbers
+            def post(index):
+                url = f'{base_url}/{name}/ViewCandResponse.aspx?rid={name}-{index}'
+                start = time.perf_counter()
+                response = client.post('/', json={'url': url, 'examType': exam_type})
+                elapsed = time.perf_counter() - start
+                body = response.get_json(silent=True) or {}
+                return elapsed, response.status_code, bool((body.get('data') or {}).get('missingParts'))
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                results = list(executor.map(post, range(requests_count)))
+            wall_time = time.perf_counter() - started
+
+            # A 200 with missingParts is a partial score, not a success
+            errors = sum(1 for _, status, _ in results if status != 200)
+            partial = sum(1 for _, status, missing in results if status == 200 and missing)
+            report(f'{name}: POST / (errors={errors} partial={partial})', [elapsed for elapsed, _, _ in results], wall_time)
+    finally:
+        stub.shutdown()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=200, help='calls per parsing/scoring benchmark')
+    parser.add_argument('--requests', type=int, default=50, help='POST / calls per fixture set')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--latency', type=float, default=0.05, help='stub delay per part request, seconds')
+    parser.add_argument('--jitter', type=float, default=0.05)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--upstream-rate', type=float, default=1000, help='stub host token bucket, requests/second (0 keeps UPSTREAM_RATE)')
+    args = parser.parse_args()
+
+    # Per-request INFO lines would drown the report
+    logging.disable(logging.INFO)
+
+    bench_parsing(args.iterations)
+    bench_end_to_end(args.requests, args.concurrency, {
+        'latency': args.latency, 'jitter': args.jitter, 'failure_rate': args.failure_rate,
+    }, args.upstream_rate)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""Generate the synthetic, anonymized response-sheet fixtures used by the benchmarks.
+
+Run from the repo root:  python bench/make_fixtures.py
+
+Pages follow the layout of the real ViewCandResponse*.aspx sheets (candidate
+table, then one table per question with an option row per answer) but every
+name, roll number and image path is made up. Output is deterministic.
+"""
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from server import generate_part_urls, get_exam_plan
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+# (fixture set, exam type, questions per part override)
+FIXTURE_SETS = [
+    ('dp_head_constable', 'DELHI_POLICE_HEAD_CONSTABLE', None),
+    ('ssc_cgl_pre', 'SSC_CGL_PRE', None),
+    ('ssc_cgl_pre_large', 'SSC_CGL_PRE', 100),
+]
+
+PAGE_HEAD = (
+    '<html><head><title>Candidate Response</title>'
+    '<style>td{font-family:Arial;font-size:12px}</style>'
+    '<script type="text/javascript">function chk(a,b){return a<b;}</script>'
+    '</head><body>'
+)
+
+def candidate_table(seed):
+    rows = [
+        ('Roll No', f'99{seed:08d}'),
+        ('Candidate Name', f'TEST CANDIDATE {seed}'),
+        ('Exam Level', 'Sample Exam Level'),
+        ('Test Date', '21/11/2025'),
+        ('Test Time', '9:00 AM - 10:30 AM'),
+        ('Centre Name', 'Sample Exam Centre'),
+    ]
+    cells = ''.join(f'<tr><td>{label}</td><td>:&nbsp;&nbsp;{value}</td></tr>\n' for label, value in rows)
+    return f'<table border="1" width="100%">\n{cells}</table>\n'
+
+def question_table(rng, q_num):
+    selected = rng.choice([None, 0, 1, 2, 3])
+    correct = rng.randrange(4)
+    rows = [
+        f'<table width="100%" class="questionPnlTbl"><tr><td><font size="2">Q.No:&nbsp;{q_num}</font></td>'
+        f'<td valign="top"><img src="img/q{q_num}_HI.jpg" /><img src="img/q{q_num}_EN.jpg"></td></tr>\n'
+    ]
+    for opt in range(4):
+        if opt == selected and opt == correct:
+            bgcolor = 'green'
+        elif opt == selected:
+            bgcolor = 'red'
+        elif opt == correct:
+            bgcolor = 'yellow'
+        else:
+            bgcolor = ''
+        bg_attr = f' bgcolor="{bgcolor}"' if bgcolor else ''
+        rows.append(
+            f'<tr><td{bg_attr}>{opt + 1}. <img src="img/q{q_num}o{opt}_HI.png">'
+            f'<img src="img/q{q_num}o{opt}_EN.png"></td></tr>\n'
+        )
+    rows.append('</table>\n')
+    return ''.join(rows)
+
+def make_page(seed, question_count):
+    rng = random.Random(seed)
+    tables = ''.join(question_table(rng, q) for q in range(1, question_count + 1))
+    return PAGE_HEAD + candidate_table(seed) + tables + '</body></html>\n'
+
+def main():
+    for name, exam_type, per_part in FIXTURE_SETS:
+        plan = get_exam_plan(exam_type)
+        out_dir = os.path.join(FIXTURES_DIR, name)
+        os.makedirs(out_dir, exist_ok=True)
+
+        for index, part_info in enumerate(generate_part_urls('/x/ViewCandResponse.aspx', plan)):
+            question_count = per_part or part_info['subject']['totalQuestions']
+            file_name = part_info['url'].rsplit('/', 1)[1]
+            with open(os.path.join(out_dir, file_name), 'w', encoding='utf-8', newline='\r\n') as f:
+                f.write(make_page(1000 + index, question_count))
+            print(f'{name}/{file_name}: {question_count} questions')
+
+if __name__ == '__main__':
+    main()
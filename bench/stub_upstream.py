@@ -0,0 +1,90 @@
+"""Local stand-in for the answer-key host, serving the recorded fixture pages.
+
+Standalone:  python bench/stub_upstream.py --port 8765 --latency 0.2 --failure-rate 0.05
+A fixture set is addressed by directory, e.g.
+    http://127.0.0.1:8765/dp_head_constable/ViewCandResponse.aspx?rid=1
+"""
+import argparse
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+class StubConfig:
+    def __init__(self, latency=0.0, jitter=0.0, failure_rate=0.0, error_status=503, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.error_status = error_status
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.failures = 0
+        self.lock = threading.Lock()
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        config = self.server.config
+        with config.lock:
+            config.requests += 1
+            delay = config.latency + config.random.uniform(0, config.jitter)
+            fail = config.random.random() < config.failure_rate
+            if fail:
+                config.failures += 1
+
+        if delay:
+            time.sleep(delay)
+
+        path = self.path.split('?')[0].lstrip('/')
+        file_path = os.path.normpath(os.path.join(FIXTURES_DIR, path))
+        if fail:
+            self.send_body(config.error_status, b'<html><body>Service Unavailable</body></html>')
+        elif not file_path.startswith(FIXTURES_DIR) or not os.path.isfile(file_path):
+            self.send_body(404, b'<html><body>Not Found</body></html>')
+        else:
+            with open(file_path, 'rb') as f:
+                self.send_body(200, f.read())
+
+    def send_body(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_stub(port=0, **config):
+    """Start the stub on a background thread, returning (server, base_url)"""
+    ThreadingHTTPServer.daemon_threads = True
+    server = ThreadingHTTPServer(('127.0.0.1', port), StubHandler)
+    server.config = StubConfig(**config)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help='base delay per request, seconds')
+    parser.add_argument('--jitter', type=float, default=0.0, help='extra uniform random delay, seconds')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='fraction of requests answered with --error-status')
+    parser.add_argument('--error-status', type=int, default=503)
+    args = parser.parse_args()
+
+    server, base_url = start_stub(
+        args.port, latency=args.latency, jitter=args.jitter,
+        failure_rate=args.failure_rate, error_status=args.error_status,
+    )
+    print(f'Stub upstream serving {FIXTURES_DIR} at {base_url}')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+from types import MappingProxyType
+
+logger = logging.getLogger(__name__)
+
+EXAM_PLANS_PATH = os.environ.get('EXAM_PLANS_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'exam_plans.json'))
+# How often the data file's mtime is checked for a hot reload
+EXAM_PLANS_RELOAD_SECONDS = float(os.environ.get('EXAM_PLANS_RELOAD_SECONDS', 5))
+
+# Everything an analysis needs about one exam, computed once per (re)load.
+#   config        the exam definition as served to clients (treat as read-only)
+#   subjects      subject dicts in part order
+#   parts         part letters in order; part_index maps each to its position
+#   offsets       part -> question number offset within the paper
+#   part_files    (part, file name, subject) for every part with a response page
+#   correct_marks / negative_marks / section_templates  scoring vectors, by part_index
+#   version       hash of the definition; changes whenever a reload changes anything about the exam
+ExamPlan = namedtuple('ExamPlan', [
+    'id', 'config', 'subjects', 'parts', 'part_index', 'offsets', 'part_files',
+    'correct_marks', 'negative_marks', 'section_templates', 'version',
+])
+
+def compile_plan(config, part_files):
+    """Immutable ExamPlan for one exam definition"""
+    subjects = tuple(config['subjects'])
+    parts = tuple(s['part'] for s in subjects)
+
+    offsets = {}
+    question_offset = 0
+    for subject in subjects:
+        offsets[subject['part']] = question_offset
+        question_offset += subject['totalQuestions']
+
+    return ExamPlan(
+        id=config['id'],
+        config=config,
+        subjects=subjects,
+        parts=parts,
+        part_index=MappingProxyType({part: i for i, part in enumerate(parts)}),
+        offsets=MappingProxyType(offsets),
+        part_files=tuple((s['part'], part_files[s['part']], s) for s in subjects if s['part'] in part_files),
+        correct_marks=tuple(s['correctMarks'] for s in subjects),
+        negative_marks=tuple(s['negativeMarks'] for s in subjects),
+        section_templates=tuple(
+            (s['part'], s['name'], s['maxMarks'], s['correctMarks'], s['negativeMarks'], s.get('isQualifying', False))
+            for s in subjects
+        ),
+        version=hashlib.sha256(json.dumps([config, part_files], sort_keys=True).encode('utf-8')).hexdigest()[:16],
+    )
+
+def build_sections(plan, part_counts):
+    """Section dicts from (correct, wrong, unattempted) counts in plan.parts order"""
+    sections = []
+    for template, (correct, wrong, unattempted) in zip(plan.section_templates, part_counts):
+        part, name, max_marks, correct_marks, negative_marks, is_qualifying = template
+        sections.append({
+            'part': part,
+            'subject': name,
+            'correct': correct,
+            'wrong': wrong,
+            'unattempted': unattempted,
+            'score': correct * correct_marks - wrong * negative_marks,
+            'maxMarks': max_marks,
+            'correctMarks': correct_marks,
+            'negativeMarks': negative_marks,
+            'isQualifying': is_qualifying,
+        })
+    return sections
+
+def compile_plans(data):
+    """({exam id: ExamPlan}, default exam id) from the parsed data file"""
+    part_files = data['partFiles']
+    plans = {}
+    for config in data['exams']:
+        exam_part_files = dict(part_files, **config.get('partFiles', {}))
+        plans[config['id']] = compile_plan(config, exam_part_files)
+    default_exam = data['defaultExam']
+    if default_exam not in plans:
+        raise ValueError(f'Default exam {default_exam} is not defined')
+    return plans, default_exam
+
+class ExamPlanRegistry:
+    """Compiled plans for every exam, reloaded when the data file changes.
+
+    A reload compiles the whole file first and swaps it in at once, so requests
+    see either the old plans or the new ones, never a mix; a file that fails to
+    load is logged and the previous plans stay in service. Callbacks added with
+    on_reload get the ids of exams whose definition changed.
+    """
+
+    def __init__(self, path=EXAM_PLANS_PATH, reload_seconds=EXAM_PLANS_RELOAD_SECONDS):
+        self.path = path
+        self.reload_seconds = reload_seconds
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self._mtime = None
+        self._plans = {}
+        self._default_exam = None
+        self._listeners = []
+        self.reload()
+
+    def on_reload(self, callback):
+        """Call callback(changed exam ids) after each reload that changes an existing exam"""
+        self._listeners.append(callback)
+
+    def reload(self):
+        """Load and compile the data file now, replacing every plan"""
+        mtime = os.stat(self.path).st_mtime
+        with open(self.path, encoding='utf-8') as f:
+            plans, default_exam = compile_plans(json.load(f))
+        with self._lock:
+            old_plans = self._plans
+            self._plans, self._default_exam = plans, default_exam
+            self._mtime = mtime
+            self._checked_at = time.monotonic()
+        logger.info('exam plans loaded path=%s exams=%s', self.path, ','.join(plans))
+
+        changed = [exam_id for exam_id, plan in plans.items() if exam_id in old_plans and old_plans[exam_id].version != plan.version]
+        if changed:
+            for callback in self._listeners:
+                try:
+                    callback(changed)
+                except Exception:
+                    logger.exception('exam plan reload callback failed exams=%s', ','.join(changed))
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_seconds:
+            return
+        self._checked_at = now
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError as e:
+            logger.warning('exam plans unreadable path=%s error=%s, keeping previous plans', self.path, e)
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            self.reload()
+        except Exception:
+            logger.exception('exam plan reload failed path=%s, keeping previous plans', self.path)
+            # Not retried until the file changes again
+            self._mtime = mtime
+
+    def get(self, exam_id):
+        """Plan for exam_id, falling back to the default exam for unknown ids"""
+        self._maybe_reload()
+        with self._lock:
+            plans, default_exam = self._plans, self._default_exam
+        plan = plans.get(exam_id)
+        return plan if plan is not None else plans[default_exam]
+
+    def find(self, exam_id):
+        """Plan for exam_id, or None if it is not defined"""
+        self._maybe_reload()
+        return self._plans.get(exam_id)
+
+    def configs(self):
+        """{exam id: config} for every plan"""
+        self._maybe_reload()
+        return {exam_id: plan.config for exam_id, plan in self._plans.items()}
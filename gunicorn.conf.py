@@ -0,0 +1,49 @@
+# Production server config: gunicorn -c gunicorn.conf.py
+import multiprocessing
+import os
+
+wsgi_app = 'server:app'
+bind = f"0.0.0.0:{os.environ.get('PORT', 3001)}"
+
+# One process per core (plus headroom), each with a pool of threads; analyses
+# spend most of their time waiting on the upstream host, so threads go a long way
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+# With UPSTREAM_BUCKET_BACKEND=memory each worker enforces its share of the per-host rate limit
+os.environ.setdefault('UPSTREAM_WORKERS', str(workers))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+
+# A slow analysis can wait on several 30s part fetches
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 60))
+keepalive = 5
+
+# Recycle workers periodically so long-lived caches and pools cannot grow without bound
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = 200
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+def post_worker_init(worker):
+    """Fail readiness as soon as SIGTERM arrives, while the worker finishes the requests it has accepted"""
+    import signal
+    from server import mark_draining
+
+    def handle_term(sig, frame):
+        mark_draining()
+        worker.handle_exit(sig, frame)
+
+    signal.signal(signal.SIGTERM, handle_term)
+    signal.siginterrupt(signal.SIGTERM, False)
+
+def worker_int(worker):
+    """SIGINT/SIGQUIT: fail readiness and drain before the worker exits"""
+    from server import begin_shutdown
+    begin_shutdown()
+
+def worker_exit(server, worker):
+    """Graceful SIGTERM path: finish in-flight batches before the process goes away"""
+    from server import begin_shutdown
+    begin_shutdown()
@@ -0,0 +1,200 @@
+import codecs
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError, ConnectTimeout, Timeout
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import EmptyPoolError
+
+# Connection pool settings for upstream answer-key hosts
+POOL_CONNECTIONS = int(os.environ.get('HTTP_POOL_CONNECTIONS', 10))
+POOL_MAXSIZE = int(os.environ.get('HTTP_POOL_MAXSIZE', 10))
+
+def parse_host_limits(value):
+    """{host: max connections} from 'host=4,other.host=2'"""
+    limits = {}
+    for entry in value.split(','):
+        host, _, limit = entry.strip().partition('=')
+        if host and limit:
+            limits[host.strip().lower()] = int(limit)
+    return limits
+
+# Per-host max connections, e.g. HTTP_HOST_MAX_CONNECTIONS='ssc.digialm.com=4'; hosts not listed use POOL_MAXSIZE
+HOST_MAX_CONNECTIONS = parse_host_limits(os.environ.get('HTTP_HOST_MAX_CONNECTIONS', ''))
+
+# Retry with exponential backoff on 5xx responses and connect/read errors (see get_within)
+RETRY_TOTAL = int(os.environ.get('HTTP_RETRY_TOTAL', 2))
+RETRY_BACKOFF = float(os.environ.get('HTTP_RETRY_BACKOFF', 0.5))
+RETRY_STATUSES = (500, 502, 503, 504)
+
+# Streamed bodies are read and decoded this many bytes at a time
+STREAM_CHUNK_BYTES = int(os.environ.get('HTTP_STREAM_CHUNK_BYTES', 16384))
+
+_session = None
+_session_lock = threading.Lock()
+
+# Longest the current thread's request may wait for a free pooled connection
+_pool_wait = threading.local()
+
+class BodyTooLarge(Exception):
+    """A streamed body went past its size limit"""
+
+class BodyDeadlineExceeded(Exception):
+    """A streamed body was still arriving when its deadline passed"""
+
+class BoundedWaitMixin:
+    """Pool whose blocking _get_conn waits no longer than the request's connect timeout"""
+
+    def _get_conn(self, timeout=None):
+        if timeout is None:
+            timeout = getattr(_pool_wait, 'seconds', None)
+        return super()._get_conn(timeout=timeout)
+
+class BoundedHTTPConnectionPool(BoundedWaitMixin, HTTPConnectionPool):
+    pass
+
+class BoundedHTTPSConnectionPool(BoundedWaitMixin, HTTPSConnectionPool):
+    pass
+
+def connect_timeout(timeout):
+    """Connect part of a requests timeout (float, (connect, read) or None)"""
+    if isinstance(timeout, tuple):
+        return timeout[0]
+    return timeout
+
+class BoundedPoolAdapter(HTTPAdapter):
+    """Blocking pooled adapter where waiting for a free connection counts against the connect timeout.
+
+    requests never passes pool_timeout to urllib3, so with pool_block=True a
+    thread would otherwise wait forever once every connection to a host is busy.
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {'http': BoundedHTTPConnectionPool, 'https': BoundedHTTPSConnectionPool}
+
+    def send(self, request, timeout=None, **kwargs):
+        _pool_wait.seconds = connect_timeout(timeout)
+        try:
+            return super().send(request, timeout=timeout, **kwargs)
+        except EmptyPoolError as e:
+            raise ConnectTimeout(f'No free connection to {request.url} within {_pool_wait.seconds}s', request=request) from e
+        finally:
+            _pool_wait.seconds = None
+
+def build_adapter(max_connections):
+    """Keep-alive adapter that never opens more than max_connections per host.
+
+    It does not retry: urllib3's backoff knows nothing of a fetch's deadline, so
+    retries are made by get_within, which does.
+    """
+    return BoundedPoolAdapter(
+        pool_connections=POOL_CONNECTIONS,
+        pool_maxsize=max_connections,
+        pool_block=True,
+        max_retries=0,
+    )
+
+def build_session(host_max_connections=None):
+    """Create a pooled session, mounting a dedicated adapter for each limited host"""
+    session = requests.Session()
+    session.mount('http://', build_adapter(POOL_MAXSIZE))
+    session.mount('https://', build_adapter(POOL_MAXSIZE))
+
+    for host, max_connections in (host_max_connections or HOST_MAX_CONNECTIONS).items():
+        adapter = build_adapter(max_connections)
+        session.mount(f'http://{host}/', adapter)
+        session.mount(f'https://{host}/', adapter)
+
+    return session
+
+def get_session():
+    """Shared process-wide session so fetches reuse TCP+TLS connections"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = build_session()
+    return _session
+
+def get_within(url, deadline, timeout, before_retry=None, **kwargs):
+    """Streamed GET on the shared session, retried while a time.monotonic() deadline leaves room.
+
+    Connect/read errors and RETRY_STATUSES responses are retried up to RETRY_TOTAL
+    times with exponential backoff (RETRY_BACKOFF), but never when the backoff
+    would end past the deadline; each attempt's timeout is capped to what is left.
+    before_retry(seconds left) may refuse a retry by returning False, e.g. when
+    the host's rate limit has no token for it. The last response is returned
+    (the caller closes it) or the last error raised.
+    """
+    session = get_session()
+    attempt = 0
+    while True:
+        attempt_timeout = min(timeout, max(deadline - time.monotonic(), 0.1))
+        try:
+            response = session.get(url, timeout=attempt_timeout, stream=True, **kwargs)
+        except (ConnectionError, Timeout):
+            if not _may_retry(attempt, deadline, before_retry):
+                raise
+        else:
+            if response.status_code not in RETRY_STATUSES or not _may_retry(attempt, deadline, before_retry):
+                return response
+            response.close()
+        time.sleep(RETRY_BACKOFF * 2 ** attempt)
+        attempt += 1
+
+def _may_retry(attempt, deadline, before_retry):
+    left = deadline - time.monotonic() - RETRY_BACKOFF * 2 ** attempt
+    if attempt >= RETRY_TOTAL or left <= 0:
+        return False
+    return before_retry is None or before_retry(left)
+
+def content_length(response):
+    """Declared body size in bytes, or None"""
+    length = response.headers.get('Content-Length', '')
+    return int(length) if length.isdigit() else None
+
+def iter_bytes(response, max_bytes, deadline, chunk_size=STREAM_CHUNK_BYTES):
+    """Body chunks of a stream=True response, capped at max_bytes and a time.monotonic() deadline"""
+    length = content_length(response)
+    if length is not None and length > max_bytes:
+        raise BodyTooLarge(f'{response.url} is {length} bytes (limit {max_bytes})')
+
+    received = 0
+    for chunk in response.iter_content(chunk_size):
+        received += len(chunk)
+        if received > max_bytes:
+            raise BodyTooLarge(f'{response.url} is over {max_bytes} bytes')
+        if time.monotonic() > deadline:
+            raise BodyDeadlineExceeded(f'{response.url} still downloading after its deadline ({received} bytes in)')
+        yield chunk
+
+def text_decoder(encoding):
+    """Incremental decoder for a response charset, falling back to utf-8; bad bytes are replaced"""
+    try:
+        return codecs.getincrementaldecoder(encoding or 'utf-8')(errors='replace')
+    except LookupError:
+        return codecs.getincrementaldecoder('utf-8')(errors='replace')
+
+def iter_text(response, max_bytes, deadline, chunk_size=STREAM_CHUNK_BYTES):
+    """iter_bytes decoded as it arrives"""
+    decoder = text_decoder(response.encoding)
+    for chunk in iter_bytes(response, max_bytes, deadline, chunk_size):
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+def reset_session():
+    """Close the shared session, e.g. after changing pool settings"""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
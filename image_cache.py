@@ -0,0 +1,353 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from analysis_store import STORE_PATH
+from http_client import BodyDeadlineExceeded, BodyTooLarge, get_within, iter_bytes
+from response_cache import normalize_url
+from single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+IMAGE_CACHE_DIR = os.environ.get('IMAGE_CACHE_DIR', 'image_cache')
+IMAGE_CACHE_MAX_BYTES = int(os.environ.get('IMAGE_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+# Each worker also re-reads the real total and LRU order from disk at least this often
+IMAGE_CACHE_RESCAN_SECONDS = float(os.environ.get('IMAGE_CACHE_RESCAN_SECONDS', 60))
+# Question images never change within a paper, so revalidate rarely
+IMAGE_CACHE_TTL = float(os.environ.get('IMAGE_CACHE_TTL', 24 * 60 * 60))
+IMAGE_FETCH_TIMEOUT = 15
+# Larger bodies are refused rather than cached; question images are tens of KB
+IMAGE_MAX_BYTES = int(os.environ.get('IMAGE_MAX_BYTES', 2 * 1024 * 1024))
+IMAGE_PREFETCH = os.environ.get('IMAGE_PREFETCH', '0') == '1'
+IMAGE_PREFETCH_WORKERS = int(os.environ.get('IMAGE_PREFETCH_WORKERS', 4))
+
+# Hosts the proxy may fetch from, on top of the hosts of every analyzed answer sheet
+IMAGE_PROXY_HOSTS = {h.strip().lower() for h in os.environ.get('IMAGE_PROXY_HOSTS', '').split(',') if h.strip()}
+# State every worker shares: allowed sheet hosts and the disk cache's total size
+# (in the analysis store's file by default, so it also survives a restart)
+IMAGE_STATE_PATH = os.environ.get('IMAGE_STATE_PATH', STORE_PATH)
+
+_allowed_hosts = None
+_image_cache = None
+_image_cache_lock = threading.Lock()
+
+class AllowedHosts:
+    """Image hosts the proxy may fetch from, kept in a SQLite table shared by every worker.
+
+    Hosts already seen by this process are answered from memory; any other host
+    is looked up in the table, so a host allowed by one worker is allowed by all.
+    """
+
+    def __init__(self, path=IMAGE_STATE_PATH, static_hosts=IMAGE_PROXY_HOSTS):
+        self._known = set(static_hosts)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS image_hosts (host TEXT PRIMARY KEY, added_at REAL NOT NULL) WITHOUT ROWID')
+
+    def add(self, host):
+        with self._lock:
+            if host in self._known:
+                return
+            try:
+                self._conn.execute('INSERT OR IGNORE INTO image_hosts (host, added_at) VALUES (?, ?)', (host, time.time()))
+            except sqlite3.Error as e:
+                # Still allowed here; other workers pick it up from the next sheet of the host
+                logger.warning('image host not recorded host=%s error=%s', host, e)
+            self._known.add(host)
+
+    def __contains__(self, host):
+        with self._lock:
+            if host in self._known:
+                return True
+            try:
+                found = self._conn.execute('SELECT 1 FROM image_hosts WHERE host = ?', (host,)).fetchone() is not None
+            except sqlite3.Error as e:
+                logger.warning('image host lookup failed host=%s error=%s', host, e)
+                return False
+            if found:
+                self._known.add(host)
+            return found
+
+def allowed_hosts():
+    """Process-wide view of the shared allowlist, opened on first use"""
+    global _allowed_hosts
+    if _allowed_hosts is None:
+        with _image_cache_lock:
+            if _allowed_hosts is None:
+                _allowed_hosts = AllowedHosts()
+    return _allowed_hosts
+
+def allow_host(url):
+    """Let the proxy serve images from url's host (called for sheets that parsed into questions)"""
+    host = urlsplit(url).hostname
+    if host:
+        allowed_hosts().add(host.lower())
+
+def is_allowed(url):
+    """Only http(s) URLs on an allowed host, so the proxy cannot be aimed anywhere"""
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        return False
+    return parts.hostname.lower() in allowed_hosts()
+
+class ImageCache:
+    """Size-bounded on-disk cache of upstream images, keyed by normalized URL.
+
+    Each image is stored as a body file plus a JSON sidecar holding its content
+    type and validators. Entries older than the TTL are revalidated with a
+    conditional GET; if upstream is unreachable the stale copy is still served.
+    Least recently used entries are evicted once the total exceeds max_bytes.
+
+    Every worker writes to the same directory, so the total lives in a SQLite
+    row that each write adds to. When it passes max_bytes (or rescan_seconds
+    have gone by) the writer re-reads sizes and LRU order from disk, where reads
+    bump body mtimes, evicts, and stores the true total back.
+    """
+
+    def __init__(self, directory=IMAGE_CACHE_DIR, max_bytes=IMAGE_CACHE_MAX_BYTES, ttl=IMAGE_CACHE_TTL,
+                 rescan_seconds=IMAGE_CACHE_RESCAN_SECONDS, state_path=IMAGE_STATE_PATH):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.rescan_seconds = rescan_seconds
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._scanned_at = 0.0
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        self._prefetch_executor = None
+        os.makedirs(directory, exist_ok=True)
+        self._usage = sqlite3.connect(state_path, check_same_thread=False, isolation_level=None)
+        self._usage.execute('PRAGMA journal_mode=WAL')
+        self._usage.execute('CREATE TABLE IF NOT EXISTS image_cache_usage (directory TEXT PRIMARY KEY, bytes INTEGER NOT NULL)')
+        self._directory_key = os.path.abspath(directory)
+        self._load()
+        self._set_usage(self._total_bytes)
+
+    def _paths(self, key):
+        base = os.path.join(self.directory, key[:2], key)
+        return base, base + '.json'
+
+    def _load(self):
+        """Rebuild the LRU order and total from what is on disk, written by any worker, oldest access first"""
+        found = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(('.json', '.tmp')):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue
+                found.append((stat.st_mtime, name, stat.st_size))
+        entries = OrderedDict((key, size) for _, key, size in sorted(found))
+        with self._lock:
+            self._entries = entries
+            self._total_bytes = sum(entries.values())
+            self._scanned_at = time.monotonic()
+
+    def _add_usage(self, delta):
+        """Add to the shared total of the directory; returns the new total (None if the table is unavailable)"""
+        try:
+            with self._lock:
+                row = self._usage.execute(
+                    'INSERT INTO image_cache_usage (directory, bytes) VALUES (?, ?) '
+                    'ON CONFLICT (directory) DO UPDATE SET bytes = bytes + excluded.bytes RETURNING bytes',
+                    (self._directory_key, delta),
+                ).fetchone()
+            return row[0]
+        except sqlite3.Error as e:
+            logger.warning('image cache usage not updated error=%s', e)
+            return None
+
+    def _set_usage(self, total):
+        try:
+            with self._lock:
+                self._usage.execute(
+                    'INSERT OR REPLACE INTO image_cache_usage (directory, bytes) VALUES (?, ?)', (self._directory_key, total),
+                )
+        except sqlite3.Error as e:
+            logger.warning('image cache usage not updated error=%s', e)
+
+    def read(self, key):
+        """(body, meta) for a cached key, or None"""
+        body_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(body_path, 'rb') as f:
+                body = f.read()
+        except (OSError, ValueError):
+            return None
+        # The mtime is the access time other workers' rescans order by
+        try:
+            os.utime(body_path)
+        except OSError:
+            pass
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+        return body, meta
+
+    def write(self, key, body, meta):
+        body_path, meta_path = self._paths(key)
+        os.makedirs(os.path.dirname(body_path), exist_ok=True)
+        # Write-then-rename so readers never see a half-written image
+        for path, data, mode in ((body_path, body, 'wb'), (meta_path, json.dumps(meta), 'w')):
+            tmp = f'{path}.{threading.get_ident()}.tmp'
+            with open(tmp, mode) as f:
+                f.write(data)
+            os.replace(tmp, path)
+
+        with self._lock:
+            delta = len(body) - self._entries.pop(key, 0)
+            self._total_bytes += delta
+            self._entries[key] = len(body)
+            stale = time.monotonic() - self._scanned_at > self.rescan_seconds
+        shared_total = self._add_usage(delta)
+        if shared_total is None:
+            shared_total = self._total_bytes
+        if shared_total <= self.max_bytes and not stale:
+            return
+
+        # Count what the other workers have written before deciding what to evict
+        self._load()
+        with self._lock:
+            evicted = []
+            while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                old_key, size = self._entries.popitem(last=False)
+                self._total_bytes -= size
+                evicted.append(old_key)
+            total = self._total_bytes
+        for old_key in evicted:
+            for path in self._paths(old_key):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        self._set_usage(total)
+
+    def touch(self, key, meta):
+        _, meta_path = self._paths(key)
+        tmp = f'{meta_path}.{threading.get_ident()}.tmp'
+        with open(tmp, 'w') as f:
+            f.write(json.dumps(meta))
+        os.replace(tmp, meta_path)
+
+    def fetch(self, url):
+        """(body, meta) for url from disk, revalidating or downloading as needed"""
+        key = hashlib.sha256(normalize_url(url).encode('utf-8')).hexdigest()
+        cached = self.read(key)
+        if cached is not None and cached[1]['fetchedAt'] + self.ttl > time.time():
+            return cached
+        result, _ = self._flight.do(key, lambda: self._refresh(url, key, cached))
+        return result
+
+    def _refresh(self, url, key, cached):
+        headers = {}
+        if cached is not None:
+            if cached[1].get('etag'):
+                headers['If-None-Match'] = cached[1]['etag']
+            if cached[1].get('lastModified'):
+                headers['If-Modified-Since'] = cached[1]['lastModified']
+
+        # Redirects are not followed: they could lead off the allowed hosts
+        deadline = time.monotonic() + IMAGE_FETCH_TIMEOUT
+        try:
+            with get_within(url, deadline, IMAGE_FETCH_TIMEOUT, headers=headers, allow_redirects=False) as response:
+                body = self._read_body(url, response, deadline)
+        except ImageFetchError:
+            raise
+        except Exception:
+            if cached is not None:
+                return cached
+            raise
+
+        if response.status_code == 304 and cached is not None:
+            body, meta = cached
+            meta = dict(meta, fetchedAt=time.time())
+            self.touch(key, meta)
+            return body, meta
+
+        if response.status_code != 200:
+            if cached is not None and response.status_code >= 500:
+                return cached
+            raise ImageFetchError(response.status_code, url)
+
+        content_type = response.headers.get('Content-Type', 'application/octet-stream')
+        if not content_type.startswith('image/'):
+            raise ImageFetchError(502, url)
+
+        meta = {
+            'url': url,
+            'contentType': content_type,
+            'etag': response.headers.get('ETag'),
+            'lastModified': response.headers.get('Last-Modified'),
+            'fetchedAt': time.time(),
+        }
+        self.write(key, body, meta)
+        return body, meta
+
+    def _read_body(self, url, response, deadline):
+        """The body of a 200 image response, capped at IMAGE_MAX_BYTES; other responses are not read"""
+        if response.status_code != 200 or not response.headers.get('Content-Type', '').startswith('image/'):
+            return b''
+        try:
+            return b''.join(iter_bytes(response, IMAGE_MAX_BYTES, deadline))
+        except (BodyTooLarge, BodyDeadlineExceeded):
+            raise ImageFetchError(502, url)
+
+    def prefetch(self, urls):
+        """Warm the cache for urls in the background; errors are ignored"""
+        urls = [u for u in dict.fromkeys(urls) if u and is_allowed(u)]
+        if not urls:
+            return
+        with self._lock:
+            if self._prefetch_executor is None:
+                self._prefetch_executor = ThreadPoolExecutor(max_workers=IMAGE_PREFETCH_WORKERS)
+            executor = self._prefetch_executor
+        for url in urls:
+            executor.submit(self._prefetch_one, url)
+
+    def _prefetch_one(self, url):
+        try:
+            self.fetch(url)
+        except Exception:
+            pass
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._total_bytes, 'maxBytes': self.max_bytes}
+
+class ImageFetchError(Exception):
+    """Upstream answered an image request with an error status (or a non-image)"""
+
+    def __init__(self, status, url):
+        super().__init__(f'Upstream returned {status} for {url}')
+        self.status = status
+
+def get_image_cache():
+    """Process-wide image cache, created on first use"""
+    global _image_cache
+    if _image_cache is None:
+        with _image_cache_lock:
+            if _image_cache is None:
+                _image_cache = ImageCache()
+    return _image_cache
+
+def question_image_urls(questions):
+    """Every distinct question and option image URL in the parsed questions"""
+    urls = []
+    for q in questions:
+        urls.extend((q['questionImageUrl'], q['questionImageUrlHindi'], q['questionImageUrlEnglish']))
+        for o in q['options']:
+            urls.extend((o['imageUrl'], o['imageUrlHindi'], o['imageUrlEnglish']))
+    return [u for u in dict.fromkeys(urls) if u]
@@ -0,0 +1,164 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 4))
+# Jobs queued or running at once per process; beyond this submissions get 429
+JOB_MAX_PENDING = int(os.environ.get('JOB_MAX_PENDING', 200))
+# Finished jobs stay pollable this long
+JOB_TTL = float(os.environ.get('JOB_TTL', 60 * 60))
+# 'sqlite' shares job state between gunicorn workers, so any worker can answer a poll;
+# 'memory' only suits a single process
+JOB_STATE_BACKEND = os.environ.get('JOB_STATE_BACKEND', 'sqlite')
+JOB_STATE_PATH = os.environ.get('JOB_STATE_PATH', 'jobs.sqlite3')
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+class QueueFull(Exception):
+    """Raised by JobQueue.submit when the pending limit is reached"""
+
+class MemoryJobState:
+    """Job records in this process only"""
+
+    def __init__(self, ttl=JOB_TTL):
+        self.ttl = ttl
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def put(self, job_id, record):
+        with self._lock:
+            self._jobs[job_id] = record
+            self._expire()
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            record = self._jobs.get(job_id)
+            if record is not None:
+                record.update(fields)
+
+    def get(self, job_id):
+        with self._lock:
+            record = self._jobs.get(job_id)
+            return dict(record) if record is not None else None
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl
+        expired = [k for k, r in self._jobs.items() if r.get('finishedAt') and r['finishedAt'] < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+class SQLiteJobState:
+    """Job records in a SQLite file shared by every worker on the box"""
+
+    def __init__(self, path=JOB_STATE_PATH, ttl=JOB_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, record TEXT NOT NULL, finished_at REAL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_finished ON jobs (finished_at)')
+
+    def put(self, job_id, record):
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO jobs (id, record, finished_at) VALUES (?, ?, ?)',
+                (job_id, json.dumps(record), record.get('finishedAt')),
+            )
+            self._conn.execute('DELETE FROM jobs WHERE finished_at < ?', (time.time() - self.ttl,))
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            row = self._conn.execute('SELECT record FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            if row is None:
+                return
+            record = json.loads(row[0])
+            record.update(fields)
+            self._conn.execute(
+                'UPDATE jobs SET record = ?, finished_at = ? WHERE id = ?',
+                (json.dumps(record), record.get('finishedAt'), job_id),
+            )
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute('SELECT record FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+JOB_STATE_BACKENDS = {
+    'memory': MemoryJobState,
+    'sqlite': SQLiteJobState,
+}
+
+def create_job_state(backend=JOB_STATE_BACKEND, **kwargs):
+    """Build job state storage for the named backend ('memory' or 'sqlite')"""
+    if backend not in JOB_STATE_BACKENDS:
+        raise ValueError(f'Unknown job state backend: {backend}')
+    return JOB_STATE_BACKENDS[backend](**kwargs)
+
+class JobQueue:
+    """Bounded background execution of analyses, polled by job id.
+
+    At most max_pending jobs are queued or running per process; submit raises
+    QueueFull past that so the caller can answer 429 instead of piling up work.
+    """
+
+    def __init__(self, state=None, workers=JOB_WORKERS, max_pending=JOB_MAX_PENDING):
+        self.state = state if state is not None else create_job_state()
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job')
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args):
+        """Queue fn(*args), returning the new job id"""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise QueueFull(f'{self._pending} jobs pending')
+            self._pending += 1
+
+        job_id = uuid.uuid4().hex
+        self.state.put(job_id, {'id': job_id, 'status': QUEUED, 'createdAt': time.time()})
+        try:
+            self._executor.submit(self._run, job_id, fn, args)
+        except RuntimeError:
+            # Executor already shut down
+            with self._lock:
+                self._pending -= 1
+            self.state.update(job_id, status=FAILED, error='Server is shutting down', finishedAt=time.time())
+            raise
+        return job_id
+
+    def _run(self, job_id, fn, args):
+        self.state.update(job_id, status=RUNNING, startedAt=time.time())
+        try:
+            result = fn(*args)
+        except Exception as e:
+            logger.warning('job failed id=%s error=%s', job_id, e)
+            self.state.update(job_id, status=FAILED, error=str(e), finishedAt=time.time())
+        else:
+            self.state.update(job_id, status=DONE, result=result, finishedAt=time.time())
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def get(self, job_id):
+        return self.state.get(job_id)
+
+    def depth(self):
+        """Jobs queued or running in this process"""
+        with self._lock:
+            return self._pending
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,140 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds: upstream fetches run 50 ms .. 30 s, parsing and scoring well under that
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Bytes: a compressed compact result is a few KB, a full 100-question result ~150 KB
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label(value)}"' for name, value in pairs) + '}'
+
+def format_number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """Monotonic count, optionally split by label values"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        with self._lock:
+            return self._values.get(labels, 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            yield self.name + format_labels(self.labelnames, labels), value
+
+class Histogram:
+    """Bucketed distribution (cumulative buckets, sum and count per label set)"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def count(self, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            return series[2] if series else 0
+
+    def samples(self):
+        with self._lock:
+            items = sorted((labels, (list(s[0]), s[1], s[2])) for labels, s in self._series.items())
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = (('le', format_number(bound)),)
+                yield self.name + '_bucket' + format_labels(self.labelnames, labels, le), cumulative
+            yield self.name + '_sum' + format_labels(self.labelnames, labels), total
+            yield self.name + '_count' + format_labels(self.labelnames, labels), count
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self.register(Counter(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS, labelnames=()):
+        return self.register(Histogram(name, help_text, buckets, labelnames))
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.help_text}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for sample_name, value in metric.samples():
+                lines.append(f'{sample_name} {format_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = Registry()
+
+UPSTREAM_FETCH_SECONDS = REGISTRY.histogram(
+    'rankmitra_upstream_fetch_seconds', 'Upstream part page fetch latency', labelnames=('outcome',))
+PART_PARSE_SECONDS = REGISTRY.histogram(
+    'rankmitra_part_parse_seconds', 'Time to parse one part page')
+SCORING_SECONDS = REGISTRY.histogram(
+    'rankmitra_scoring_seconds', 'Time to score and assemble one analysis')
+ANALYSIS_SECONDS = REGISTRY.histogram(
+    'rankmitra_analysis_seconds', 'Fetch, parse and score of a whole answer sheet')
+RESPONSE_BYTES = REGISTRY.histogram(
+    'rankmitra_response_bytes', 'Size of buffered JSON response bodies as sent', SIZE_BUCKETS, labelnames=('endpoint',))
+UPSTREAM_ERRORS = REGISTRY.counter(
+    'rankmitra_upstream_errors_total', 'Failed upstream part fetches', labelnames=('kind',))
+UPSTREAM_HEDGES = REGISTRY.counter(
+    'rankmitra_upstream_hedges_total', 'Duplicate part requests sent after a part ran past its host p95')
+CACHE_REQUESTS = REGISTRY.counter(
+    'rankmitra_cache_requests_total', 'Response cache lookups', labelnames=('result',))
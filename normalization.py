@@ -0,0 +1,181 @@
+import math
+import os
+import threading
+import time
+
+import numpy as np
+
+# Share of top scorers whose average anchors the scale (0.1%, as in the commission's formula)
+TOP_FRACTION = 0.001
+
+# Normalized ranks may lag new submissions by at most this long
+REFRESH_SECONDS = float(os.environ.get('NORMALIZATION_REFRESH_SECONDS', 1.0))
+
+def normalization_params(scores, shift_ids, shift_count):
+    """Per-shift (scale, offset) so that normalized = scale * raw + offset.
+
+    Uses the shift-wise normalization formula:
+        normalized = (Mtg - Mtq) / (Mig - Miq) * (raw - Miq) + Mtq
+    where Mtg/Mig are the average of the top 0.1% of all candidates / of the
+    shift, and Mtq/Miq are mean + standard deviation of all candidates / of
+    the shift. Shifts with no spread (e.g. a single candidate) map unchanged.
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    shift_ids = np.asarray(shift_ids, dtype=np.int64)
+    scale = np.ones(shift_count)
+    offset = np.zeros(shift_count)
+    if scores.size == 0:
+        return scale, offset
+
+    counts = np.bincount(shift_ids, minlength=shift_count)
+    sums = np.bincount(shift_ids, weights=scores, minlength=shift_count)
+    sumsq = np.bincount(shift_ids, weights=scores * scores, minlength=shift_count)
+
+    present = counts > 0
+    safe_counts = np.maximum(counts, 1)
+    mean = sums / safe_counts
+    sd = np.sqrt(np.maximum(sumsq / safe_counts - mean * mean, 0.0))
+    shift_q = mean + sd
+
+    # Sort by (shift, score) once so each shift's top scorers sit at the end of its segment
+    ordered = scores[np.lexsort((scores, shift_ids))]
+    cumulative = np.concatenate(([0.0], np.cumsum(ordered)))
+    ends = np.cumsum(counts)
+    top_k = np.maximum(np.ceil(counts * TOP_FRACTION), 1).astype(np.int64)
+    top_k = np.minimum(top_k, safe_counts)
+    shift_top = (cumulative[ends] - cumulative[ends - top_k * present]) / top_k
+
+    overall_q = scores.mean() + scores.std()
+    overall_k = max(int(math.ceil(scores.size * TOP_FRACTION)), 1)
+    overall_top = np.partition(scores, scores.size - overall_k)[scores.size - overall_k:].mean()
+
+    spread = shift_top - shift_q
+    usable = present & (spread > 1e-9)
+    scale[usable] = (overall_top - overall_q) / spread[usable]
+    offset[usable] = overall_q - scale[usable] * shift_q[usable]
+    return scale, offset
+
+def normalize_shifts(shift_scores):
+    """Normalize {shift: scores} in one vectorized pass, returning {shift: normalized array}"""
+    keys = list(shift_scores)
+    arrays = [np.asarray(shift_scores[key], dtype=np.float64) for key in keys]
+    scores = np.concatenate(arrays) if arrays else np.zeros(0)
+    shift_ids = np.repeat(np.arange(len(keys)), [a.size for a in arrays])
+
+    scale, offset = normalization_params(scores, shift_ids, len(keys))
+    normalized = scale[shift_ids] * scores + offset[shift_ids]
+    return dict(zip(keys, np.split(normalized, np.cumsum([a.size for a in arrays])[:-1])))
+
+class ExamNormalizer:
+    """Growing pool of raw scores for one exam, normalized across its shifts.
+
+    Candidates are appended into preallocated arrays (re-analysis of a roll
+    number overwrites its slot). Parameters and the sorted normalized pool are
+    recomputed lazily in one batched pass, at most every REFRESH_SECONDS.
+    """
+
+    def __init__(self, capacity=1024):
+        self.shift_index = {}
+        self.rolls = {}
+        self.size = 0
+        self.scores = np.zeros(capacity)
+        self.shift_ids = np.zeros(capacity, dtype=np.int64)
+        self.scale = np.ones(0)
+        self.offset = np.zeros(0)
+        self.sorted_normalized = np.zeros(0)
+        self._dirty = False
+        self._refreshed_at = 0.0
+
+    def add(self, roll_number, shift_key, score):
+        shift_id = self.shift_index.setdefault(shift_key, len(self.shift_index))
+        position = self.rolls.get(roll_number)
+        if position is None:
+            if self.size == self.scores.size:
+                self.scores = np.resize(self.scores, self.size * 2)
+                self.shift_ids = np.resize(self.shift_ids, self.size * 2)
+            position = self.rolls[roll_number] = self.size
+            self.size += 1
+        elif self.scores[position] == score and self.shift_ids[position] == shift_id:
+            return
+        self.scores[position] = score
+        self.shift_ids[position] = shift_id
+        self._dirty = True
+
+    def refresh(self, force=False):
+        if not self._dirty and self.scale.size == len(self.shift_index):
+            return
+        if not force and time.time() - self._refreshed_at < REFRESH_SECONDS and self.scale.size == len(self.shift_index):
+            return
+
+        scores = self.scores[:self.size]
+        shift_ids = self.shift_ids[:self.size]
+        self.scale, self.offset = normalization_params(scores, shift_ids, len(self.shift_index))
+        self.sorted_normalized = np.sort(self.scale[shift_ids] * scores + self.offset[shift_ids])
+        self._dirty = False
+        self._refreshed_at = time.time()
+
+    def lookup(self, shift_key, score):
+        self.refresh()
+        shift_id = self.shift_index.get(shift_key)
+        if shift_id is None or shift_id >= self.scale.size:
+            return None
+        normalized = float(self.scale[shift_id] * score + self.offset[shift_id])
+        total = int(self.sorted_normalized.size)
+        above = total - int(np.searchsorted(self.sorted_normalized, normalized, side='right'))
+        return {
+            'normalizedScore': round(normalized, 4),
+            'normalizedRank': above + 1,
+            'totalCandidates': total,
+            'shifts': len(self.shift_index),
+        }
+
+class NormalizationEngine:
+    """One ExamNormalizer per exam type, fed by every analysis"""
+
+    def __init__(self):
+        self._exams = {}
+        self._lock = threading.Lock()
+
+    def record(self, result):
+        """Add an analysis to its exam's pool and return its normalized score and rank"""
+        candidate = result.get('candidate') or {}
+        shift_key = (candidate.get('testDate', ''), candidate.get('shift', ''))
+        roll_number = candidate.get('rollNumber')
+
+        with self._lock:
+            exam = self._exams.get(result['examType'])
+            if exam is None:
+                exam = self._exams[result['examType']] = ExamNormalizer()
+            if roll_number:
+                exam.add(roll_number, shift_key, result['totalScore'])
+            return exam.lookup(shift_key, result['totalScore'])
+
+    def add_many(self, results):
+        """Add analyses written elsewhere (e.g. by other workers); pools refresh lazily on the next lookup"""
+        with self._lock:
+            for result in results:
+                candidate = result.get('candidate') or {}
+                if not candidate.get('rollNumber'):
+                    continue
+                exam = self._exams.get(result['examType'])
+                if exam is None:
+                    exam = self._exams[result['examType']] = ExamNormalizer()
+                exam.add(candidate['rollNumber'], (candidate.get('testDate', ''), candidate.get('shift', '')), result['totalScore'])
+
+    def rebuild(self, results):
+        """Replace every pool with one loaded from stored analysis results"""
+        exams = {}
+        for result in results:
+            candidate = result.get('candidate') or {}
+            if not candidate.get('rollNumber'):
+                continue
+            exam = exams.get(result['examType'])
+            if exam is None:
+                exam = exams[result['examType']] = ExamNormalizer()
+            exam.add(candidate['rollNumber'], (candidate.get('testDate', ''), candidate.get('shift', '')), result['totalScore'])
+
+        for exam in exams.values():
+            exam.refresh(force=True)
+
+        with self._lock:
+            self._exams = exams
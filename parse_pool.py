@@ -0,0 +1,80 @@
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from http_client import BodyDeadlineExceeded, text_decoder
+from question_model import pack_questions
+from response_parser import parse_response_page
+
+logger = logging.getLogger(__name__)
+
+# Worker processes for parsing part pages; 0 keeps all parsing in the server process
+PARSE_PROCESSES = int(os.environ.get('PARSE_PROCESSES', 0))
+# Pages smaller than this are parsed in-process as they stream in; shipping them costs more than it saves
+PARSE_POOL_MIN_BYTES = int(os.environ.get('PARSE_POOL_MIN_BYTES', 64 * 1024))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def parse_page_bytes(body, encoding, part, base_url, subject, question_offset):
+    """Worker side: decode and parse one page, returning (candidate, QuestionTable)"""
+    decoder = text_decoder(encoding)
+    html = decoder.decode(body, final=True)
+    candidate, questions = parse_response_page(html, part, base_url, subject, question_offset)
+    # A column table pickles to a few KB of arrays instead of hundreds of small dicts
+    return candidate, pack_questions(questions)
+
+def should_offload(length):
+    """True if a page of this declared size goes to the pool"""
+    return PARSE_PROCESSES > 0 and length is not None and length >= PARSE_POOL_MIN_BYTES
+
+def get_pool():
+    """Process-wide parse pool, started on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # Never fork a threaded server: workers start clean and import only the parser
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+                if 'forkserver' in methods:
+                    context.set_forkserver_preload(['parse_pool'])
+                _pool = ProcessPoolExecutor(max_workers=PARSE_PROCESSES, mp_context=context)
+                logger.info('parse pool started processes=%d min_bytes=%d', PARSE_PROCESSES, PARSE_POOL_MIN_BYTES)
+    return _pool
+
+def parse_page(body, encoding, part, base_url, subject, question_offset, deadline=None):
+    """(candidate, questions) for a downloaded page, parsed in a worker process by deadline (time.monotonic())"""
+    args = (body, encoding, part, base_url, subject, question_offset)
+    future = get_pool().submit(parse_page_bytes, *args)
+    timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+    try:
+        candidate, table = future.result(timeout=timeout)
+    except TimeoutError:
+        # A page still queued is dropped; one already parsing finishes in its worker, unread
+        future.cancel()
+        raise BodyDeadlineExceeded(f'part {part} still parsing after its deadline')
+    except BrokenProcessPool:
+        logger.warning('parse pool broken, parsing in-process part=%s', part)
+        reset()
+        candidate, table = parse_page_bytes(*args)
+    return candidate, table.rows()
+
+def reset():
+    """Drop a broken pool so the next page starts a fresh one"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def shutdown(wait=True):
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=wait)
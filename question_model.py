@@ -0,0 +1,187 @@
+import struct
+import sys
+from array import array
+
+from response_parser import OPTION_IDS
+
+STATUSES = ('correct', 'wrong', 'unattempted')
+STATUS_CODES = {status: code for code, status in enumerate(STATUSES)}
+
+# Image URLs per question: the question's three variants, then three per option
+QUESTION_URL_KEYS = ('questionImageUrl', 'questionImageUrlHindi', 'questionImageUrlEnglish')
+OPTION_URL_KEYS = ('imageUrl', 'imageUrlHindi', 'imageUrlEnglish')
+URLS_PER_QUESTION = len(QUESTION_URL_KEYS) + len(OPTION_IDS) * len(OPTION_URL_KEYS)
+
+# One fixed-size record per question for bulk re-scoring: question number, part letter,
+# selected and correct option bitmasks (numpy reads a whole population of these at once)
+RESPONSE_RECORD = struct.Struct('<icBB')
+
+def split_url(url):
+    """(base path, file name) so the shared directory prefix is stored once"""
+    cut = url.rfind('/') + 1
+    return url[:cut], url[cut:]
+
+class QuestionTable:
+    """Column store for a result's questions.
+
+    Each question is one row across typed arrays; every string (part, subject,
+    image base path, image file name, marks value) lives once in a shared value
+    table and rows hold indexes into it. Option flags are bitmasks.
+    """
+
+    __slots__ = ('values', '_index', 'numbers', 'parts', 'subjects', 'statuses',
+                 'marks', 'selected', 'correct', 'option_counts', 'urls')
+
+    def __init__(self):
+        self.values = []
+        self._index = {}
+        self.numbers = array('i')
+        self.parts = array('I')
+        self.subjects = array('I')
+        self.statuses = array('B')
+        self.marks = array('I')
+        self.selected = array('B')
+        self.correct = array('B')
+        self.option_counts = array('B')
+        # Two entries (base, file name) per URL, URLS_PER_QUESTION URLs per row
+        self.urls = array('I')
+
+    def __len__(self):
+        return len(self.numbers)
+
+    def _ref(self, value):
+        # Keyed by (type, value) so 2 and 2.0 (or True and 1) stay distinct
+        key = (type(value), value)
+        ref = self._index.get(key)
+        if ref is None:
+            if isinstance(value, str):
+                value = sys.intern(value)
+            ref = self._index[key] = len(self.values)
+            self.values.append(value)
+        return ref
+
+    def _add_url(self, url):
+        base, name = split_url(url)
+        self.urls.append(self._ref(base))
+        self.urls.append(self._ref(name))
+
+    def append(self, question):
+        options = question['options']
+        self.numbers.append(question['questionNumber'])
+        self.parts.append(self._ref(question['part']))
+        self.subjects.append(self._ref(question['subject']))
+        self.statuses.append(STATUS_CODES[question['status']])
+        self.marks.append(self._ref(question['marksAwarded']))
+        self.option_counts.append(len(options))
+
+        selected = correct = 0
+        for i, option in enumerate(options):
+            if option['isSelected']:
+                selected |= 1 << i
+            if option['isCorrect']:
+                correct |= 1 << i
+        self.selected.append(selected)
+        self.correct.append(correct)
+
+        for key in QUESTION_URL_KEYS:
+            self._add_url(question[key])
+        for i in range(len(OPTION_IDS)):
+            option = options[i] if i < len(options) else None
+            for key in OPTION_URL_KEYS:
+                self._add_url(option[key] if option else '')
+
+    def _url(self, slot):
+        values = self.values
+        return values[self.urls[2 * slot]] + values[self.urls[2 * slot + 1]]
+
+    def row(self, i):
+        """Rebuild question i as the dict the parser produced"""
+        values = self.values
+        slot = i * URLS_PER_QUESTION
+        question_urls = [self._url(slot + k) for k in range(len(QUESTION_URL_KEYS))]
+        slot += len(QUESTION_URL_KEYS)
+
+        selected = self.selected[i]
+        correct = self.correct[i]
+        options = []
+        for o in range(self.option_counts[i]):
+            base = slot + o * len(OPTION_URL_KEYS)
+            options.append({
+                'id': OPTION_IDS[o],
+                'imageUrl': self._url(base),
+                'imageUrlHindi': self._url(base + 1),
+                'imageUrlEnglish': self._url(base + 2),
+                'isSelected': bool(selected >> o & 1),
+                'isCorrect': bool(correct >> o & 1),
+            })
+
+        return {
+            'questionNumber': self.numbers[i],
+            'part': values[self.parts[i]],
+            'subject': values[self.subjects[i]],
+            'questionImageUrl': question_urls[0],
+            'questionImageUrlHindi': question_urls[1],
+            'questionImageUrlEnglish': question_urls[2],
+            'options': options,
+            'status': STATUSES[self.statuses[i]],
+            'marksAwarded': values[self.marks[i]],
+        }
+
+    def rows(self):
+        return [self.row(i) for i in range(len(self))]
+
+    def responses(self):
+        """Every question's RESPONSE_RECORD, concatenated"""
+        values = self.values
+        pack = RESPONSE_RECORD.pack
+        return b''.join(
+            pack(self.numbers[i], values[self.parts[i]][:1].encode('ascii', 'replace') or b'?', self.selected[i], self.correct[i])
+            for i in range(len(self))
+        )
+
+    def __getstate__(self):
+        # Pickled as the value table plus raw column bytes (e.g. back from a parse worker process)
+        return self.values, {name: getattr(self, name) for name in COLUMNS}
+
+    def __setstate__(self, state):
+        values, columns = state
+        self.values = values
+        self._index = {(type(v), v): i for i, v in enumerate(values)}
+        for name in COLUMNS:
+            setattr(self, name, columns[name])
+
+    def to_json(self):
+        """Plain lists/strings for JSON storage (e.g. the SQLite response cache)"""
+        return {
+            'values': self.values,
+            'columns': {name: getattr(self, name).tolist() for name in COLUMNS},
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        table = cls()
+        table.values = list(data['values'])
+        table._index = {(type(v), v): i for i, v in enumerate(table.values)}
+        for name in COLUMNS:
+            getattr(table, name).extend(data['columns'][name])
+        return table
+
+COLUMNS = ('numbers', 'parts', 'subjects', 'statuses', 'marks',
+           'selected', 'correct', 'option_counts', 'urls')
+
+def pack_questions(questions):
+    table = QuestionTable()
+    for question in questions:
+        table.append(question)
+    return table
+
+def pack_result(result):
+    """Result with its question list swapped for a QuestionTable"""
+    return dict(result, questions=pack_questions(result['questions']))
+
+def unpack_result(packed):
+    """Inverse of pack_result; also accepts a table already reduced to JSON"""
+    table = packed['questions']
+    if isinstance(table, dict):
+        table = QuestionTable.from_json(table)
+    return dict(packed, questions=table.rows())
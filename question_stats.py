@@ -0,0 +1,387 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from analysis_store import STORE_PATH
+from response_parser import OPTION_IDS
+
+logger = logging.getLogger(__name__)
+
+# 'sqlite' keeps one set of counters shared by every gunicorn worker on the box;
+# 'memory' counts in this process only, snapshotted to an .npz file, and only suits a single process
+QUESTION_STATS_BACKEND = os.environ.get('QUESTION_STATS_BACKEND', 'sqlite')
+# Shared counters go in the analysis store's database file by default
+QUESTION_STATS_DB_PATH = os.environ.get('QUESTION_STATS_DB_PATH', STORE_PATH)
+QUESTION_STATS_PATH = os.environ.get('QUESTION_STATS_PATH', 'question_stats.npz')
+# How often changed counters are written out; 0 disables snapshots
+QUESTION_STATS_SNAPSHOT_SECONDS = float(os.environ.get('QUESTION_STATS_SNAPSHOT_SECONDS', 60))
+
+# Counter columns per question: candidates who left it blank, who answered it, then one per option chosen
+UNATTEMPTED = 0
+ATTEMPTED = 1
+OPTION_COLUMNS = len(OPTION_IDS)
+COLUMNS = 2 + OPTION_COLUMNS
+# The same columns in the shared table
+COUNT_COLUMNS = ['unattempted', 'attempted'] + [f'chose_{option.lower()}' for option in OPTION_IDS]
+
+def shift_key(result):
+    candidate = result.get('candidate') or {}
+    return result['examType'], candidate.get('testDate', ''), candidate.get('shift', '')
+
+def tally(question):
+    """(counter columns one candidate's answer adds 1 to, key bitmask from the sheet's options)"""
+    columns = []
+    key = 0
+    for i, option in enumerate(question['options'][:OPTION_COLUMNS]):
+        if option['isSelected']:
+            columns.append(2 + i)
+        if option['isCorrect']:
+            key |= 1 << i
+    columns.append(ATTEMPTED if columns else UNATTEMPTED)
+    return columns, key
+
+class ShiftQuestionStats:
+    """Running per-question counters for one (examType, testDate, shift).
+
+    Each question is a row of int64 counters (blank, answered, chose A..D) plus the
+    current answer key as an option bitmask, so correct and wrong counts are
+    derived from the option counts and a revised key needs no rescan.
+    """
+
+    def __init__(self, capacity=128):
+        self.index = {}
+        self.parts = []
+        self.numbers = []
+        self.counts = np.zeros((capacity, COLUMNS), dtype=np.int64)
+        self.keys = np.zeros(capacity, dtype=np.uint8)
+        self.dropped = np.zeros(capacity, dtype=bool)
+        self.rolls = set()
+
+    def _row(self, part, number):
+        key = (part, number)
+        row = self.index.get(key)
+        if row is None:
+            row = self.index[key] = len(self.parts)
+            self.parts.append(part)
+            self.numbers.append(number)
+            if row == len(self.keys):
+                self.counts = np.concatenate([self.counts, np.zeros_like(self.counts)])
+                self.keys = np.concatenate([self.keys, np.zeros_like(self.keys)])
+                self.dropped = np.concatenate([self.dropped, np.zeros_like(self.dropped)])
+        return row
+
+    def add(self, roll_number, questions):
+        """Count one candidate's answers; a roll number already counted is ignored"""
+        if roll_number in self.rolls:
+            return False
+        self.rolls.add(roll_number)
+
+        counts = self.counts
+        for q in questions:
+            row = self._row(q['part'], q['questionNumber'])
+            columns, key = tally(q)
+            for column in columns:
+                counts[row, column] += 1
+            # The sheet's key, already revised by any answer-key overrides for the shift
+            if key:
+                self.keys[row] = key
+        return True
+
+    def apply_key(self, overrides):
+        """Take a revised key ({(part, number): (correct bitmask or None, dropped)}) into account"""
+        for (part, number), (correct, dropped) in overrides.items():
+            row = self.index.get((part, number))
+            if row is None:
+                continue
+            if correct is not None:
+                self.keys[row] = correct
+            self.dropped[row] |= dropped
+
+    def summary(self, subjects):
+        """Per-question and per-section stats, computed from the counters alone"""
+        size = len(self.parts)
+        return summarize(self.parts, self.numbers, self.counts[:size], self.keys[:size], self.dropped[:size], len(self.rolls), subjects)
+
+def summarize(part_list, numbers, counts, keys, dropped, candidates, subjects):
+    """Stats for one shift from its counter rows (one per question) and the number of candidates counted"""
+    options = counts[:, 2:]
+    attempted = counts[:, ATTEMPTED]
+    seen = attempted + counts[:, UNATTEMPTED]
+    key_bits = (keys[:, None] >> np.arange(OPTION_COLUMNS, dtype=np.uint8)) & 1
+    # Sheets allow one option per question, so the answers matching the key are the correct ones
+    correct = np.minimum((options * key_bits).sum(axis=1), attempted)
+    correct = np.where(dropped, seen, correct)
+    wrong = np.where(dropped, 0, attempted - correct)
+    # Accuracy is over answers given, though a dropped question's marks go to blanks too
+    right = np.minimum(correct, attempted)
+
+    questions = []
+    for row in np.argsort(np.array(numbers, dtype=np.int64), kind='stable').tolist():
+        total = int(seen[row])
+        tried = int(attempted[row])
+        questions.append({
+            'questionNumber': numbers[row],
+            'part': part_list[row],
+            'candidates': total,
+            'attempted': tried,
+            'correct': int(correct[row]),
+            'wrong': int(wrong[row]),
+            'attemptRate': tried / total if total else 0.0,
+            'accuracy': int(right[row]) / tried if tried else None,
+            'optionCounts': dict(zip(OPTION_IDS, options[row].tolist())),
+            'correctOptions': [o for i, o in enumerate(OPTION_IDS) if keys[row] >> i & 1],
+            'dropped': bool(dropped[row]),
+        })
+
+    sections = []
+    parts = np.array(part_list, dtype=object)
+    for subject in subjects:
+        rows = parts == subject['part']
+        if not rows.any():
+            continue
+        part_seen = int(seen[rows].sum())
+        part_attempted = int(attempted[rows].sum())
+        part_correct = int(correct[rows].sum())
+        part_wrong = int(wrong[rows].sum())
+        score = part_correct * subject['correctMarks'] - part_wrong * subject['negativeMarks']
+        part_right = int(right[rows].sum())
+        sections.append({
+            'part': subject['part'],
+            'subject': subject['name'],
+            'attemptRate': part_attempted / part_seen if part_seen else 0.0,
+            'accuracy': part_right / part_attempted if part_attempted else None,
+            'averageScore': score / candidates if candidates else 0.0,
+            'maxMarks': subject['maxMarks'],
+        })
+
+    return {'candidates': candidates, 'sections': sections, 'questions': questions}
+
+class QuestionStatsEngine:
+    """Per-question stats for every shift, fed by each completed analysis.
+
+    Queries read the running counters, so they cost O(questions) however many
+    candidates have been counted. Counters are snapshotted to one .npz file
+    every snapshot_seconds (when they changed) and reloaded from it on start,
+    so each process must have its own path.
+    """
+
+    def __init__(self, path=QUESTION_STATS_PATH, snapshot_seconds=QUESTION_STATS_SNAPSHOT_SECONDS):
+        self.path = path
+        self.snapshot_seconds = snapshot_seconds
+        self._shifts = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        if path and os.path.exists(path):
+            self.load()
+        if path and snapshot_seconds > 0:
+            thread = threading.Thread(target=self._snapshot_loop, name='question-stats-snapshot', daemon=True)
+            thread.start()
+
+    def record(self, result):
+        """Count a complete analysis's answers under its shift"""
+        roll_number = (result.get('candidate') or {}).get('rollNumber')
+        if not roll_number or not result.get('questions'):
+            return False
+        key = shift_key(result)
+        with self._lock:
+            shift = self._shifts.get(key)
+            if shift is None:
+                shift = self._shifts[key] = ShiftQuestionStats()
+            added = shift.add(roll_number, result['questions'])
+            self._dirty |= added
+        return added
+
+    def apply_key(self, exam_type, test_date, shift_name, overrides):
+        with self._lock:
+            shift = self._shifts.get((exam_type, test_date, shift_name))
+            if shift is not None:
+                shift.apply_key(overrides)
+                self._dirty = True
+
+    def summary(self, exam_type, test_date, shift_name, subjects):
+        """Stats for one shift, or None if no candidate of it has been counted"""
+        with self._lock:
+            shift = self._shifts.get((exam_type, test_date, shift_name))
+            if shift is None:
+                return None
+            return shift.summary(subjects)
+
+    def snapshot(self):
+        """Write every shift's counters to path (atomically); returns False if nothing changed"""
+        with self._lock:
+            if not self.path or not self._dirty:
+                return False
+            meta = []
+            arrays = {}
+            for i, (key, shift) in enumerate(self._shifts.items()):
+                size = len(shift.parts)
+                meta.append({'key': key, 'parts': shift.parts, 'numbers': shift.numbers, 'rolls': sorted(shift.rolls)})
+                arrays[f'counts_{i}'] = shift.counts[:size].copy()
+                arrays[f'keys_{i}'] = shift.keys[:size].copy()
+                arrays[f'dropped_{i}'] = shift.dropped[:size].copy()
+            self._dirty = False
+
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez_compressed(f, meta=np.array(json.dumps(meta)), **arrays)
+        os.replace(tmp_path, self.path)
+        logger.debug('question stats snapshot path=%s shifts=%d', self.path, len(meta))
+        return True
+
+    def load(self):
+        """Replace the counters with the last snapshot"""
+        with np.load(self.path, allow_pickle=False) as data:
+            meta = json.loads(str(data['meta']))
+            shifts = {}
+            for i, entry in enumerate(meta):
+                counts = data[f'counts_{i}']
+                shift = ShiftQuestionStats(capacity=max(len(counts), 1))
+                shift.parts = list(entry['parts'])
+                shift.numbers = list(entry['numbers'])
+                shift.index = {(p, n): row for row, (p, n) in enumerate(zip(shift.parts, shift.numbers))}
+                shift.counts[:len(counts)] = counts
+                shift.keys[:len(counts)] = data[f'keys_{i}']
+                shift.dropped[:len(counts)] = data[f'dropped_{i}']
+                shift.rolls = set(entry['rolls'])
+                shifts[tuple(entry['key'])] = shift
+        with self._lock:
+            self._shifts = shifts
+        logger.info('question stats loaded path=%s shifts=%d', self.path, len(shifts))
+
+    def _snapshot_loop(self):
+        while True:
+            time.sleep(self.snapshot_seconds)
+            try:
+                self.snapshot()
+            except Exception as e:
+                logger.exception('question stats snapshot failed path=%s error=%s', self.path, e)
+
+class SQLiteQuestionStats:
+    """The same per-question counters, kept in a SQLite file shared by every worker on the box.
+
+    Each analysis adds to its questions' rows in one transaction, guarded by a
+    per-shift roll number table, so a candidate analyzed by two workers is
+    still counted once. Queries read one row per question of the shift.
+    """
+
+    def __init__(self, path=QUESTION_STATS_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        counters = ', '.join(f'{column} INTEGER NOT NULL DEFAULT 0' for column in COUNT_COLUMNS)
+        self._conn.executescript(f'''
+            CREATE TABLE IF NOT EXISTS question_stats (
+                exam_type TEXT NOT NULL,
+                test_date TEXT NOT NULL,
+                shift TEXT NOT NULL,
+                part TEXT NOT NULL,
+                question_number INTEGER NOT NULL,
+                {counters},
+                correct INTEGER NOT NULL DEFAULT 0,
+                dropped INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (exam_type, test_date, shift, part, question_number)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS question_stats_rolls (
+                exam_type TEXT NOT NULL,
+                test_date TEXT NOT NULL,
+                shift TEXT NOT NULL,
+                roll_number TEXT NOT NULL,
+                PRIMARY KEY (exam_type, test_date, shift, roll_number)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS question_stats_shifts (
+                exam_type TEXT NOT NULL,
+                test_date TEXT NOT NULL,
+                shift TEXT NOT NULL,
+                candidates INTEGER NOT NULL,
+                PRIMARY KEY (exam_type, test_date, shift)
+            ) WITHOUT ROWID;
+        ''')
+        increments = ', '.join(f'{column} = {column} + excluded.{column}' for column in COUNT_COLUMNS)
+        self._add_sql = (
+            f'INSERT INTO question_stats (exam_type, test_date, shift, part, question_number, {", ".join(COUNT_COLUMNS)}, correct) '
+            f'VALUES ({", ".join("?" * (6 + COLUMNS))}) ON CONFLICT (exam_type, test_date, shift, part, question_number) '
+            f'DO UPDATE SET {increments}, correct = CASE WHEN excluded.correct THEN excluded.correct ELSE correct END'
+        )
+
+    def record(self, result):
+        """Count a complete analysis's answers under its shift, unless any worker already counted its roll number"""
+        roll_number = (result.get('candidate') or {}).get('rollNumber')
+        if not roll_number or not result.get('questions'):
+            return False
+        key = shift_key(result)
+        rows = []
+        for q in result['questions']:
+            columns, correct = tally(q)
+            counts = [0] * COLUMNS
+            for column in columns:
+                counts[column] = 1
+            # The sheet's key, already revised by any answer-key overrides for the shift
+            rows.append((*key, q['part'], q['questionNumber'], *counts, correct))
+
+        with self._lock, self._conn:
+            added = self._conn.execute(
+                'INSERT OR IGNORE INTO question_stats_rolls (exam_type, test_date, shift, roll_number) VALUES (?, ?, ?, ?)',
+                (*key, roll_number),
+            ).rowcount
+            if not added:
+                return False
+            self._conn.execute(
+                'INSERT INTO question_stats_shifts (exam_type, test_date, shift, candidates) VALUES (?, ?, ?, 1) '
+                'ON CONFLICT (exam_type, test_date, shift) DO UPDATE SET candidates = candidates + 1',
+                key,
+            )
+            self._conn.executemany(self._add_sql, rows)
+        return True
+
+    def apply_key(self, exam_type, test_date, shift_name, overrides):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                'UPDATE question_stats SET correct = COALESCE(?, correct), dropped = MAX(dropped, ?) '
+                'WHERE exam_type = ? AND test_date = ? AND shift = ? AND part = ? AND question_number = ?',
+                [
+                    (correct, int(dropped), exam_type, test_date, shift_name, part, number)
+                    for (part, number), (correct, dropped) in overrides.items()
+                ],
+            )
+
+    def summary(self, exam_type, test_date, shift_name, subjects):
+        """Stats for one shift, or None if no candidate of it has been counted"""
+        key = (exam_type, test_date, shift_name)
+        with self._lock:
+            found = self._conn.execute(
+                'SELECT candidates FROM question_stats_shifts WHERE exam_type = ? AND test_date = ? AND shift = ?', key,
+            ).fetchone()
+            rows = self._conn.execute(
+                f'SELECT part, question_number, {", ".join(COUNT_COLUMNS)}, correct, dropped FROM question_stats '
+                'WHERE exam_type = ? AND test_date = ? AND shift = ?',
+                key,
+            ).fetchall()
+        if found is None:
+            return None
+
+        counts = np.array([row[2:2 + COLUMNS] for row in rows], dtype=np.int64).reshape(len(rows), COLUMNS)
+        keys = np.array([row[2 + COLUMNS] for row in rows], dtype=np.uint8)
+        dropped = np.array([row[3 + COLUMNS] for row in rows], dtype=bool)
+        return summarize([row[0] for row in rows], [row[1] for row in rows], counts, keys, dropped, found[0], subjects)
+
+    def snapshot(self):
+        """Nothing to do: every count is committed as it is recorded"""
+        return False
+
+QUESTION_STATS_BACKENDS = {
+    'memory': QuestionStatsEngine,
+    'sqlite': SQLiteQuestionStats,
+}
+
+def create_question_stats(backend=QUESTION_STATS_BACKEND, **kwargs):
+    """Build question stats counters for the named backend ('memory' or 'sqlite')"""
+    if backend not in QUESTION_STATS_BACKENDS:
+        raise ValueError(f'Unknown question stats backend: {backend}')
+    return QUESTION_STATS_BACKENDS[backend](**kwargs)
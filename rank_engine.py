@@ -0,0 +1,160 @@
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+
+class ScoreIndex:
+    """Sorted, array-backed scores answering rank/percentile by binary search"""
+
+    def __init__(self, scores=()):
+        self.scores = array('d', sorted(scores))
+
+    def __len__(self):
+        return len(self.scores)
+
+    def add(self, score):
+        scores = self.scores
+        scores.insert(bisect_right(scores, score), score)
+
+    def remove(self, score):
+        scores = self.scores
+        pos = bisect_left(scores, score)
+        if pos < len(scores) and scores[pos] == score:
+            del scores[pos]
+
+    def rank(self, score):
+        """1 + number of candidates strictly above score (ties share a rank)"""
+        return len(self.scores) - bisect_right(self.scores, score) + 1
+
+    def percentile(self, score):
+        """Share of candidates scoring at or below score, 0-100"""
+        if not self.scores:
+            return 100.0
+        return round(100.0 * bisect_right(self.scores, score) / len(self.scores), 4)
+
+    def lookup(self, score):
+        return {
+            'rank': self.rank(score),
+            'percentile': self.percentile(score),
+            'totalCandidates': len(self.scores),
+        }
+
+class ShiftRanks:
+    """Total and per-section score indexes for one (examType, testDate, shift)"""
+
+    def __init__(self):
+        self.total = ScoreIndex()
+        self.sections = {}
+        self.candidates = {}
+
+    def add(self, roll_number, total_score, section_scores):
+        previous = self.candidates.get(roll_number)
+        if previous is not None:
+            # Re-analysis of the same candidate replaces their earlier entry
+            if previous == (total_score, section_scores):
+                return
+            self.remove(roll_number)
+
+        self.candidates[roll_number] = (total_score, section_scores)
+        self.total.add(total_score)
+        for part, score in section_scores.items():
+            self.sections.setdefault(part, ScoreIndex()).add(score)
+
+    def remove(self, roll_number):
+        total_score, section_scores = self.candidates.pop(roll_number)
+        self.total.remove(total_score)
+        for part, score in section_scores.items():
+            self.sections[part].remove(score)
+
+    def lookup(self, total_score, section_scores):
+        result = self.total.lookup(total_score)
+        result['sections'] = [
+            dict(self.sections[part].lookup(score), part=part)
+            for part, score in section_scores.items()
+            if part in self.sections
+        ]
+        return result
+
+def shift_key(result):
+    """Index key for an analysis result: (examType, testDate, shift)"""
+    candidate = result.get('candidate') or {}
+    return (result.get('examType', ''), candidate.get('testDate', ''), candidate.get('shift', ''))
+
+def section_scores(result):
+    return {s['part']: s['score'] for s in result.get('sections', [])}
+
+class RankEngine:
+    """Per-shift score indexes fed by every analysis.
+
+    Candidates are keyed by roll number, so repeat analyses of the same sheet
+    never count twice. Lookups are binary searches over sorted arrays.
+    """
+
+    def __init__(self):
+        self._shifts = {}
+        self._lock = threading.Lock()
+
+    def record(self, result):
+        """Index a finished analysis and return its rank/percentile block"""
+        key = shift_key(result)
+        total_score = result['totalScore']
+        sections = section_scores(result)
+        roll_number = (result.get('candidate') or {}).get('rollNumber')
+
+        with self._lock:
+            shift = self._shifts.get(key)
+            if shift is None:
+                shift = self._shifts[key] = ShiftRanks()
+            if roll_number:
+                shift.add(roll_number, total_score, sections)
+            return shift.lookup(total_score, sections)
+
+    def add_many(self, results):
+        """Index analyses written elsewhere (e.g. by other workers) without looking anything up"""
+        with self._lock:
+            for result in results:
+                roll_number = (result.get('candidate') or {}).get('rollNumber')
+                if not roll_number:
+                    continue
+                key = shift_key(result)
+                shift = self._shifts.get(key)
+                if shift is None:
+                    shift = self._shifts[key] = ShiftRanks()
+                shift.add(roll_number, result['totalScore'], section_scores(result))
+
+    def lookup(self, exam_type, test_date, shift_name, total_score, sections=None):
+        """Where a score would stand in a shift, without recording it"""
+        with self._lock:
+            shift = self._shifts.get((exam_type, test_date, shift_name))
+            if shift is None:
+                return None
+            return shift.lookup(total_score, sections or {})
+
+    def rebuild(self, results):
+        """Replace every index with one bulk-built from stored analysis results"""
+        shifts = {}
+        for result in results:
+            roll_number = (result.get('candidate') or {}).get('rollNumber')
+            if roll_number:
+                shifts.setdefault(shift_key(result), {})[roll_number] = (result['totalScore'], section_scores(result))
+
+        rebuilt = {}
+        for key, candidates in shifts.items():
+            shift = ShiftRanks()
+            shift.candidates = candidates
+            shift.total = ScoreIndex(total for total, _ in candidates.values())
+            parts = {}
+            for _, sections in candidates.values():
+                for part, score in sections.items():
+                    parts.setdefault(part, []).append(score)
+            shift.sections = {part: ScoreIndex(scores) for part, scores in parts.items()}
+            rebuilt[key] = shift
+
+        with self._lock:
+            self._shifts = rebuilt
+
+    def stats(self):
+        with self._lock:
+            return {
+                'shifts': len(self._shifts),
+                'candidates': sum(len(s.candidates) for s in self._shifts.values()),
+            }
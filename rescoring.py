@@ -0,0 +1,164 @@
+import logging
+import os
+import time
+
+import numpy as np
+
+from exam_plans import build_sections
+from question_model import STATUS_CODES
+from response_parser import OPTION_IDS
+
+logger = logging.getLogger(__name__)
+
+# Analyses scored per vectorized pass; bounds the temporary arrays for very large shifts
+RESCORE_CHUNK = int(os.environ.get('RESCORE_CHUNK', 50000))
+
+# numpy view of question_model.RESPONSE_RECORD
+RESPONSE_DTYPE = np.dtype([('number', '<i4'), ('part', 'S1'), ('selected', 'u1'), ('correct', 'u1')])
+
+CORRECT = STATUS_CODES['correct']
+WRONG = STATUS_CODES['wrong']
+UNATTEMPTED = STATUS_CODES['unattempted']
+
+def option_mask(option_ids):
+    """Bitmask of option ids ('A'..'D'), the form the store keeps correct options in"""
+    mask = 0
+    for option_id in option_ids:
+        if option_id not in OPTION_IDS:
+            raise ValueError(f'Unknown option: {option_id}')
+        mask |= 1 << OPTION_IDS.index(option_id)
+    return mask
+
+def question_key(entry, plan):
+    """(part, question number) for a revision entry; the part is found from the number if omitted"""
+    try:
+        number = int(entry['questionNumber'])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError(f'Invalid question number in {entry}')
+
+    part = entry.get('part')
+    if part is None:
+        for subject in plan.subjects:
+            start = plan.offsets[subject['part']]
+            if start < number <= start + subject['totalQuestions']:
+                part = subject['part']
+                break
+    if part not in plan.part_index:
+        raise ValueError(f'Question {number} is not in any part of {plan.id}')
+    return part, number
+
+def parse_revision(data, plan):
+    """{(part, question number): (correct bitmask or None, dropped)} from a revision body.
+
+    changes: [{questionNumber, part?, correctOptions: ['B']}] sets the accepted option(s);
+    dropped: [{questionNumber, part?}] awards the question's marks to every candidate.
+    """
+    overrides = {}
+    for change in data.get('changes') or []:
+        key = question_key(change, plan)
+        options = change.get('correctOptions')
+        if not options:
+            raise ValueError(f'No correctOptions for question {key[1]}')
+        overrides[key] = (option_mask(options), overrides.get(key, (None, False))[1])
+    for drop in data.get('dropped') or []:
+        key = question_key(drop, plan)
+        overrides[key] = (overrides.get(key, (None, False))[0], True)
+    if not overrides:
+        raise ValueError('The revision changes no questions')
+    return overrides
+
+def apply_key_overrides(questions, overrides, subjects):
+    """Re-mark question dicts (in place) under a shift's overrides; subjects give each part's marking"""
+    if not overrides:
+        return questions
+    marks = {s['part']: (s['correctMarks'], s['negativeMarks']) for s in subjects}
+
+    for q in questions:
+        override = overrides.get((q['part'], q['questionNumber']))
+        if override is None:
+            continue
+        correct, dropped = override
+        if correct is not None:
+            for i, option in enumerate(q['options']):
+                option['isCorrect'] = bool(correct >> i & 1)
+
+        correct_marks, negative_marks = marks.get(q['part'], (0, 0))
+        if dropped or any(o['isSelected'] and o['isCorrect'] for o in q['options']):
+            q['status'], q['marksAwarded'] = 'correct', correct_marks
+        elif any(o['isSelected'] for o in q['options']):
+            q['status'], q['marksAwarded'] = 'wrong', -negative_marks
+        else:
+            q['status'], q['marksAwarded'] = 'unattempted', 0
+    return questions
+
+def score_responses(plan, overrides, blobs):
+    """(part counts [analyses, parts, 3], overall counts [analyses, 3]) of correct/wrong/unattempted.
+
+    Every analysis's response records are scored together: the revised key is a
+    dense lookup indexed by (part, question number), applied with array ops.
+    """
+    records = np.frombuffer(b''.join(blobs), dtype=RESPONSE_DTYPE)
+    lengths = np.fromiter((len(b) for b in blobs), dtype=np.int64, count=len(blobs)) // RESPONSE_DTYPE.itemsize
+    owners = np.repeat(np.arange(len(blobs), dtype=np.int64), lengths)
+
+    # Part letter -> position in the plan; letters outside it go to an extra, discarded slot
+    part_count = len(plan.parts)
+    part_lookup = np.full(256, part_count, dtype=np.int64)
+    for part, index in plan.part_index.items():
+        part_lookup[ord(part[:1])] = index
+    parts = part_lookup[records['part'].view(np.uint8)]
+
+    selected = records['selected']
+    correct = records['correct']
+    dropped = np.zeros(len(records), dtype=bool)
+    if overrides:
+        numbers = records['number'].astype(np.int64)
+        stride = max(int(numbers.max(initial=0)), max(number for _, number in overrides)) + 1
+        key_correct = np.full((part_count + 1) * stride, -1, dtype=np.int16)
+        key_dropped = np.zeros((part_count + 1) * stride, dtype=bool)
+        for (part, number), (mask, drop) in overrides.items():
+            slot = plan.part_index[part] * stride + number
+            if mask is not None:
+                key_correct[slot] = mask
+            key_dropped[slot] = drop
+        keys = parts * stride + np.maximum(numbers, 0)
+        revised = key_correct[keys]
+        correct = np.where(revised >= 0, revised, correct)
+        dropped = key_dropped[keys]
+
+    status = np.where(selected == 0, UNATTEMPTED, np.where(selected & correct != 0, CORRECT, WRONG))
+    status[dropped] = CORRECT
+
+    count = len(blobs)
+    part_counts = np.bincount(
+        (owners * (part_count + 1) + parts) * 3 + status, minlength=count * (part_count + 1) * 3,
+    ).reshape(count, part_count + 1, 3)[:, :part_count]
+    totals = np.bincount(owners * 3 + status, minlength=count * 3).reshape(count, 3)
+    return part_counts, totals
+
+def rescore_stored(store, plan, exam_type, test_date, shift):
+    """Re-score every stored analysis of one shift under plan and the shift's overrides; returns the count"""
+    start = time.perf_counter()
+    overrides = store.key_overrides(exam_type, test_date, shift)
+    ids, blobs = store.load_responses(exam_type, test_date, shift)
+
+    rows = []
+    for begin in range(0, len(ids), RESCORE_CHUNK):
+        end = begin + RESCORE_CHUNK
+        part_counts, totals = score_responses(plan, overrides, blobs[begin:end])
+        for analysis_id, counts, total in zip(ids[begin:end], part_counts.tolist(), totals.tolist()):
+            sections = build_sections(plan, counts)
+            rows.append((analysis_id, sum(s['score'] for s in sections), total, sections))
+    store.save_scores(rows)
+
+    logger.info('rescored exam=%s test_date=%s shift=%s analyses=%d overrides=%d seconds=%.2f',
+                exam_type, test_date, shift, len(rows), len(overrides), time.perf_counter() - start)
+    return len(rows)
+
+def rescore_shift(store, plan, exam_type, test_date, shift, revision):
+    """Record a key revision for one shift and re-score every stored analysis of it; returns the count"""
+    store.save_key_overrides(exam_type, test_date, shift, revision)
+    count = rescore_stored(store, plan, exam_type, test_date, shift)
+    # Logged only once the new scores are saved, so a process that sees it rebuilds from them
+    store.record_key_revision(exam_type, test_date, shift)
+    return count
@@ -0,0 +1,434 @@
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# One pattern drives the whole sweep: every tag, plus the "Q.No:" marker in text
+TOKEN_PATTERN = re.compile(r'</?[a-zA-Z][^>]*>|Q\.No:(?:\s*&nbsp;(\d+))?', re.IGNORECASE)
+IMG_SRC_PATTERN = re.compile(r'<img[^>]+src\s*=\s*["\']([^"\']+)["\']', re.IGNORECASE)
+BGCOLOR_PATTERN = re.compile(r'bgcolor\s*=\s*["\']([^"\']+)["\']', re.IGNORECASE)
+CANDIDATE_VALUE_PATTERN = re.compile(r':?(?:&nbsp;)*\s*([^<]+)', re.IGNORECASE)
+HINDI_IMAGE_PATTERN = re.compile(r'_HI\.(jpg|jpeg|png|gif)', re.IGNORECASE)
+ENGLISH_IMAGE_PATTERN = re.compile(r'_EN\.(jpg|jpeg|png|gif)', re.IGNORECASE)
+
+# Candidate fields and the table labels tried for each, in order of preference
+CANDIDATE_LABELS = (
+    ('rollNumber', ('Roll No', 'Roll Number')),
+    ('name', ('Candidate Name', 'Name')),
+    ('examLevel', ('Exam Level',)),
+    ('testDate', ('Test Date',)),
+    ('shift', ('Test Time', 'Shift')),
+    ('centreName', ('Centre Name', 'Center Name')),
+)
+
+# Every label with its lowercase form, for case-insensitive matching against cell text
+CANDIDATE_LABEL_TABLE = tuple((label, label.lower()) for _, labels in CANDIDATE_LABELS for label in labels)
+
+OPTION_IDS = ['A', 'B', 'C', 'D']
+
+# Table states
+OUTSIDE, SEEK_QUESTION, SEEK_TABLE_END = range(3)
+
+def get_language_urls(image_url):
+    """Get Hindi and English URLs (matching index.ts getLanguageUrls)"""
+    if not image_url:
+        return {'hindi': '', 'english': ''}
+
+    hindi_url = image_url
+    english_url = image_url
+
+    if HINDI_IMAGE_PATTERN.search(image_url):
+        english_url = HINDI_IMAGE_PATTERN.sub(r'_EN.\1', image_url)
+    elif ENGLISH_IMAGE_PATTERN.search(image_url):
+        hindi_url = ENGLISH_IMAGE_PATTERN.sub(r'_HI.\1', image_url)
+
+    return {'hindi': hindi_url, 'english': english_url}
+
+def get_base_dir(base_url):
+    """Directory of a part URL, used to absolutize relative image paths"""
+    url_parts = base_url.split('?')[0]
+    last_slash = url_parts.rfind('/')
+    return url_parts[:last_slash + 1]
+
+class ResponseSheetParser:
+    """Event-driven parser for a ViewCandResponse page.
+
+    Walks the page once, token by token, and emits the same question and
+    candidate dicts the old regex parser produced. HTML can be passed in one
+    go or chunk by chunk through feed(); call close() when the page ends.
+    """
+
+    def __init__(self, part='', base_url='', subject=None, question_offset=0):
+        self.part = part
+        self.subject = subject
+        self.question_offset = question_offset
+        self.base_dir = get_base_dir(base_url)
+
+        self.questions = []
+        self.candidate_values = {}
+
+        self._buffer = ''
+        self._scan_pos = 0
+        self._text_start = 0
+        self._last_token_end = -1
+        self._prev_tag = ''
+
+        # Candidate label/value cell tracking
+        self._label_text = None
+        self._value_labels = None
+        self._candidate_done = False
+
+        # Question table tracking
+        self._table_state = OUTSIDE
+        self._reset_table()
+
+    def _reset_table(self):
+        self._q_num = None
+        self._q_image_url = None
+        self._q_image_pending = False
+        self._q_chain = 0
+        self._options = []
+        self._found_question_row = False
+        self._in_row = False
+        self._row_has_question = False
+        self._row_images = []
+        self._row_bgcolor = None
+
+    @property
+    def finished(self):
+        """True once the rest of the page cannot change the result (candidate-only parse, candidate resolved)"""
+        return self._candidate_done and self.subject is None
+
+    def feed(self, chunk):
+        """Consume more HTML; tokens that may still be incomplete are held back"""
+        if self.finished:
+            return
+        self._buffer += chunk
+        limit = self._buffer.rfind('<')
+        if limit > self._scan_pos:
+            self._scan(limit)
+
+        # Drop consumed input, keeping the current text run for the next tag
+        if self._text_start > 0:
+            shift = self._text_start
+            self._buffer = self._buffer[shift:]
+            self._scan_pos -= shift
+            self._text_start = 0
+            self._last_token_end -= shift
+
+    def close(self):
+        """Consume the rest of the page and return the parsed questions"""
+        self._scan(len(self._buffer))
+
+        # A value cell running to the end of the page has no closing tag to resolve it
+        if self._value_labels is not None:
+            self._track_candidate('', len(self._buffer))
+
+        self._buffer = ''
+        self._scan_pos = 0
+        self._text_start = 0
+        return self.questions
+
+    @property
+    def candidate(self):
+        """Candidate info in the shape of parse_candidate_info()"""
+        values = self.candidate_values
+        return {
+            field: next((values[label] for label in labels if values.get(label)), '')
+            for field, labels in CANDIDATE_LABELS
+        }
+
+    def _scan(self, limit):
+        buffer = self._buffer
+        handle_tag = self._handle_tag
+        candidate_only = self.subject is None
+        for match in TOKEN_PATTERN.finditer(buffer, self._scan_pos, limit):
+            start, end = match.span()
+            if buffer[start] == '<':
+                handle_tag(match.group(0), start, start == self._last_token_end)
+                self._text_start = end
+            else:
+                self._handle_marker(match.group(0), match.group(1))
+            self._last_token_end = end
+            if candidate_only and self._candidate_done:
+                # Nothing past the candidate block is wanted
+                break
+        self._scan_pos = limit
+
+    def _handle_marker(self, marker, q_num):
+        # Candidate details precede the first question; labels not seen by then are absent
+        if not self._candidate_done:
+            self._candidate_done = True
+
+        if self._in_row and marker.startswith('Q.No:'):
+            self._row_has_question = True
+
+        if q_num is None or self._table_state == OUTSIDE:
+            return
+
+        if self._table_state == SEEK_QUESTION:
+            self._q_num = int(q_num)
+            self._table_state = SEEK_TABLE_END
+
+        # A question marker directly followed by </font></td><td> starts the image search
+        if self._q_image_url is None and not self._q_image_pending:
+            self._q_chain = 1
+
+    def _handle_tag(self, tag, start, adjacent):
+        lower = tag[:7].lower()
+
+        if not self._candidate_done:
+            self._track_candidate(lower, start)
+
+        # Candidate-only parses (no subject) never build questions
+        if self.subject is None:
+            return
+
+        if self._table_state == OUTSIDE:
+            if lower.startswith('<table'):
+                self._table_state = SEEK_QUESTION
+                self._reset_table()
+            return
+
+        if self._q_chain or self._q_image_pending:
+            self._track_question_image(tag, lower, adjacent)
+
+        if self._table_state == SEEK_TABLE_END and lower == '</table' and tag.lower() == '</table>':
+            self._emit_question()
+            self._table_state = OUTSIDE
+            return
+
+        self._track_row(tag, lower)
+
+    def _track_row(self, tag, lower):
+        if not self._in_row:
+            if lower.startswith('<tr'):
+                self._in_row = True
+                self._row_has_question = False
+                self._row_images = []
+                self._row_bgcolor = None
+            return
+
+        if lower == '</tr>':
+            self._in_row = False
+            self._finish_row()
+            return
+
+        if 'Q.No:' in tag:
+            self._row_has_question = True
+
+        # Only rows after the question row (and before the 4th option) become options
+        if not self._found_question_row or len(self._options) >= 4:
+            return
+        if lower.startswith('<img'):
+            img_match = IMG_SRC_PATTERN.match(tag)
+            if img_match:
+                self._row_images.append(img_match.group(1))
+        if self._row_bgcolor is None and 'bgcolor' in tag.lower():
+            bg_match = BGCOLOR_PATTERN.search(tag)
+            if bg_match:
+                self._row_bgcolor = bg_match.group(1).lower()
+
+    def _track_question_image(self, tag, lower, adjacent):
+        chain = self._q_chain
+        if chain:
+            if chain == 1 and adjacent and tag.lower() == '</font>':
+                self._q_chain = 2
+            elif chain == 2 and adjacent and tag.lower() == '</td>':
+                self._q_chain = 3
+            elif chain == 3 and adjacent and lower.startswith('<td'):
+                self._q_chain = 0
+                self._q_image_pending = True
+                return
+            else:
+                self._q_chain = 0
+
+        if self._q_image_pending and lower.startswith('<img'):
+            img_match = IMG_SRC_PATTERN.match(tag)
+            if img_match:
+                self._q_image_url = img_match.group(1)
+                self._q_image_pending = False
+
+    def _track_candidate(self, lower, start):
+        # A value cell: <td> right after a closed label cell, separated by whitespace only
+        if self._value_labels is not None:
+            value_labels = self._value_labels
+            self._value_labels = None
+            value_text = self._buffer[self._text_start:start].split('<', 1)[0]
+            value_match = CANDIDATE_VALUE_PATTERN.match(value_text)
+            if value_match:
+                value = value_match.group(1).replace('&nbsp;', ' ').strip()
+                for label in value_labels:
+                    self.candidate_values[label] = value
+                if self._candidate_resolved():
+                    self._candidate_done = True
+                    return
+
+        if lower.startswith('<td'):
+            text = self._buffer[self._text_start:start] if self._label_text is not None else ''
+            if self._label_text is not None and (not text or text.isspace()):
+                labels = self._pending_labels(self._label_text)
+                if labels:
+                    self._value_labels = labels
+            self._label_text = None
+            self._prev_tag = 'td'
+            return
+
+        self._label_text = None
+        if lower == '</td>' and self._prev_tag == 'td':
+            text = self._buffer[self._text_start:start]
+            if '<' not in text:
+                self._label_text = text
+        self._prev_tag = ''
+
+    def _pending_labels(self, label_text):
+        label_text = label_text.lower()
+        return [
+            label for label, label_lower in CANDIDATE_LABEL_TABLE
+            if label not in self.candidate_values and label_lower in label_text
+        ]
+
+    def _candidate_resolved(self):
+        """True once every field has its final value, so later cells can be skipped"""
+        values = self.candidate_values
+        for _, labels in CANDIDATE_LABELS:
+            for label in labels:
+                if label not in values:
+                    return False
+                if values[label]:
+                    break
+        return True
+
+    def _finish_row(self):
+        if len(self._options) >= 4:
+            return
+
+        if self._row_has_question:
+            self._found_question_row = True
+            return
+
+        if not self._found_question_row:
+            return
+
+        base_dir = self.base_dir
+        image_urls = []
+        for url in self._row_images:
+            if url and not url.startswith('http'):
+                url = base_dir + url
+            image_urls.append(url)
+
+        if not image_urls:
+            return
+
+        # Identify Hindi and English URLs
+        hindi_url = ''
+        english_url = ''
+        default_url = image_urls[0]
+
+        for url in image_urls:
+            if HINDI_IMAGE_PATTERN.search(url):
+                hindi_url = url
+            elif ENGLISH_IMAGE_PATTERN.search(url):
+                english_url = url
+
+        # Fallback logic
+        if not hindi_url and not english_url:
+            lang_urls = get_language_urls(default_url)
+            hindi_url = lang_urls['hindi'] or default_url
+            english_url = lang_urls['english'] or default_url
+        else:
+            if not hindi_url:
+                hindi_url = english_url or default_url
+            if not english_url:
+                english_url = hindi_url or default_url
+
+        bgcolor = self._row_bgcolor or ''
+        is_green = 'green' in bgcolor
+        is_red = 'red' in bgcolor
+        is_yellow = 'yellow' in bgcolor
+
+        self._options.append({
+            'id': OPTION_IDS[len(self._options)],
+            'imageUrl': default_url,
+            'imageUrlHindi': hindi_url,
+            'imageUrlEnglish': english_url,
+            'isSelected': is_green or is_red,
+            'isCorrect': is_green or is_yellow,
+        })
+
+    def _emit_question(self):
+        subject = self.subject
+        if subject is None:
+            return
+
+        options = self._options
+
+        question_image_url = self._q_image_url or ''
+        if question_image_url and not question_image_url.startswith('http'):
+            question_image_url = self.base_dir + question_image_url
+
+        # Get language URLs for question
+        question_lang_urls = get_language_urls(question_image_url)
+        final_q_hindi = question_lang_urls['hindi'] or question_image_url
+        final_q_english = question_lang_urls['english'] or question_image_url
+
+        # Pad options to 4
+        while len(options) < 4:
+            options.append({
+                'id': OPTION_IDS[len(options)],
+                'imageUrl': '',
+                'imageUrlHindi': '',
+                'imageUrlEnglish': '',
+                'isSelected': False,
+                'isCorrect': False,
+            })
+
+        # Determine status
+        has_selected = any(o['isSelected'] for o in options)
+        selected_is_correct = any(o['isSelected'] and o['isCorrect'] for o in options)
+
+        if not has_selected:
+            status = 'unattempted'
+        elif selected_is_correct:
+            status = 'correct'
+        else:
+            status = 'wrong'
+
+        # Calculate marks
+        if status == 'correct':
+            marks_awarded = subject['correctMarks']
+        elif status == 'wrong':
+            marks_awarded = -subject['negativeMarks']
+        else:
+            marks_awarded = 0
+
+        self.questions.append({
+            'questionNumber': self.question_offset + self._q_num,
+            'part': self.part,
+            'subject': subject['name'],
+            'questionImageUrl': question_image_url,
+            'questionImageUrlHindi': final_q_hindi,
+            'questionImageUrlEnglish': final_q_english,
+            'options': options,
+            'status': status,
+            'marksAwarded': marks_awarded,
+        })
+
+def parse_response_page(html, part, base_url, subject, question_offset):
+    """Parse candidate info and questions from one part page in a single pass"""
+    logger.debug('parse part=%s parser=single-pass-tokenizer-3.0', part)
+    parser = ResponseSheetParser(part, base_url, subject, question_offset)
+    parser.feed(html)
+    parser.close()
+    return parser.candidate, parser.questions
+
+def parse_candidate_info(html):
+    """Parse candidate information from HTML (matching index.ts parseCandidateInfo)"""
+    parser = ResponseSheetParser()
+    parser.feed(html)
+    parser.close()
+    return parser.candidate
+
+def parse_questions_for_part(html, part, base_url, subject, question_offset):
+    """Parse questions from HTML for a specific part (matching index.ts parseQuestionsForPart)"""
+    return parse_response_page(html, part, base_url, subject, question_offset)[1]
@@ -1,633 +1,959 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
-import requests
-import re
-from urllib.parse import urlparse, parse_qs
+from requests import RequestException
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+
+from analysis_store import StoreWriter, create_store
+from exam_plans import ExamPlanRegistry, build_sections
+from http_client import BodyDeadlineExceeded, BodyTooLarge, content_length, get_within, iter_bytes, iter_text
+from job_queue import DONE, JobQueue, QueueFull
+from response_cache import cache_key, create_cache
+from single_flight import SingleFlight
+from rank_engine import RankEngine
+from normalization import NormalizationEngine
+from question_stats import create_question_stats
+import parse_pool
+from question_model import pack_result, unpack_result
+from rescoring import apply_key_overrides, parse_revision, rescore_shift, rescore_stored
+from metrics import (
+    ANALYSIS_SECONDS, CACHE_REQUESTS, PART_PARSE_SECONDS, REGISTRY, RESPONSE_BYTES, SCORING_SECONDS,
+    UPSTREAM_ERRORS, UPSTREAM_FETCH_SECONDS, UPSTREAM_HEDGES,
+)
+from image_cache import IMAGE_CACHE_TTL, IMAGE_PREFETCH, ImageFetchError, allow_host, get_image_cache, is_allowed, question_image_urls
+from upstream_guard import UpstreamUnavailable, guard_for, host_states
+from wire_format import COMPRESS_MIN_BYTES, choose_encoding, compact_result, compress, etag_for, etag_matches
+from response_parser import ResponseSheetParser, get_language_urls, parse_candidate_info, parse_questions_for_part, parse_response_page
 
 app = Flask(__name__)
 CORS(app)
 
-PORT = 3001
-
-# Full Exam Configurations matching index.ts
-EXAM_CONFIGS = {
-    'SSC_CGL_PRE': {
-        'id': 'SSC_CGL_PRE',
-        'name': 'SSC CGL PRE (Tier-I)',
-        'displayName': 'SSC CGL Tier-I',
-        'emoji': '🟢',
-        'subjects': [
-            {'name': 'General Intelligence & Reasoning', 'part': 'A', 'totalQuestions': 25, 'maxMarks': 50, 'correctMarks': 2, 'negativeMarks': 0.50},
-            {'name': 'General Awareness', 'part': 'B', 'totalQuestions': 25, 'maxMarks': 50, 'correctMarks': 2, 'negativeMarks': 0.50},
-            {'name': 'Quantitative Aptitude', 'part': 'C', 'totalQuestions': 25, 'maxMarks': 50, 'correctMarks': 2, 'negativeMarks': 0.50},
-            {'name': 'English Comprehension', 'part': 'D', 'totalQuestions': 25, 'maxMarks': 50, 'correctMarks': 2, 'negativeMarks': 0.50},
-        ],
-        'totalQuestions': 100,
-        'maxMarks': 200,
-    },
-    'DELHI_POLICE_HEAD_CONSTABLE': {
-        'id': 'DELHI_POLICE_HEAD_CONSTABLE',
-        'name': 'Delhi Police Head Constable (CBT)',
-        'displayName': 'DP Head Constable',
-        'emoji': '🚔',
-        'subjects': [
-            {'name': 'General Awareness', 'part': 'A', 'totalQuestions': 25, 'maxMarks': 25, 'correctMarks': 1, 'negativeMarks': 0.25},
-            {'name': 'Quantitative Aptitude', 'part': 'B', 'totalQuestions': 20, 'maxMarks': 20, 'correctMarks': 1, 'negativeMarks': 0.25},
-            {'name': 'Reasoning', 'part': 'C', 'totalQuestions': 25, 'maxMarks': 25, 'correctMarks': 1, 'negativeMarks': 0.25},
-            {'name': 'English Language', 'part': 'D', 'totalQuestions': 20, 'maxMarks': 20, 'correctMarks': 1, 'negativeMarks': 0.25},
-            {'name': 'Computer Fundamentals', 'part': 'E', 'totalQuestions': 10, 'maxMarks': 10, 'correctMarks': 1, 'negativeMarks': 0.25},
-        ],
-        'totalQuestions': 100,
-        'maxMarks': 100,
-    },
-}
-
-def generate_part_urls(input_url, exam_config):
-    """Generate URLs for all parts based on exam config (matching index.ts generatePartUrls)"""
-    parts = []
-    
-    url_parts = input_url.split('?')
-    query_string = url_parts[1] if len(url_parts) > 1 else ''
-    base_path = url_parts[0]
-    last_slash = base_path.rfind('/')
-    base_dir = base_path[:last_slash + 1]
-    
-    # Map parts to file names (matching index.ts)
-    part_file_map = {
-        'A': 'ViewCandResponse.aspx',
-        'B': 'ViewCandResponse2.aspx',
-        'C': 'ViewCandResponse3.aspx',
-        'D': 'ViewCandResponse4.aspx',
-        'E': 'ViewCandResponse5.aspx',
-    }
+PORT = int(os.environ.get('PORT', 3001))
+DEBUG = os.environ.get('FLASK_DEBUG', '1') == '1'
+
+# key=value messages, gated by LOG_LEVEL (per-part detail is DEBUG)
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+logging.basicConfig(level=LOG_LEVEL, format='%(asctime)s level=%(levelname)s logger=%(name)s %(message)s')
+logger = logging.getLogger('server')
+
+# Set once the process starts draining so load balancers stop routing to it
+shutting_down = threading.Event()
+drain_started = threading.Event()
+
+# Upper bound on simultaneous part downloads for a single analysis
+FETCH_WORKERS = 5
+FETCH_TIMEOUT = 30
+
+# Part pages are parsed as they stream in; larger pages, or ones still arriving after the deadline, fail that part
+PART_MAX_BYTES = int(os.environ.get('PART_MAX_BYTES', 5 * 2**20))
+PART_DEADLINE = float(os.environ.get('PART_DEADLINE', FETCH_TIMEOUT))
+
+# Whole-analysis budget: parts not in by then are reported missing and the rest is scored
+ANALYSIS_DEADLINE = float(os.environ.get('ANALYSIS_DEADLINE', 20))
+
+# Scraped analyses keyed on exam type + normalized part URLs (backend set via RESPONSE_CACHE_BACKEND)
+response_cache = create_cache()
+
+# Identical analyses already in progress are shared instead of re-scraped
+analysis_flight = SingleFlight()
+
+# Score indexes per (examType, testDate, shift), fed by every completed analysis
+rank_engine = RankEngine()
+
+# Cross-shift normalized scores per exam type, over the same stream of analyses
+normalization_engine = NormalizationEngine()
+
+# Per-question attempt/accuracy/option counters per shift, fed once per candidate by complete analyses
+question_stats = create_question_stats()
+
+# Complete analyses are persisted off the request path and can be looked up by roll number
+analysis_store = create_store()
+store_writer = StoreWriter(analysis_store)
+STORE_REBUILD_ON_START = os.environ.get('ANALYSIS_STORE_REBUILD_ON_START', '1') == '1'
+
+# Each worker's rank and normalization indexes take in what the other workers stored this often
+STANDINGS_SYNC_SECONDS = float(os.environ.get('STANDINGS_SYNC_SECONDS', 2))
+# Rows committed out of updated_at order by concurrent writers are caught by re-reading this far back
+STANDINGS_SYNC_OVERLAP = 5.0
+# A pull larger than this (e.g. a bulk re-score) rebuilds the indexes instead of adding row by row
+STANDINGS_SYNC_MAX_ROWS = int(os.environ.get('STANDINGS_SYNC_MAX_ROWS', 2000))
+standings_lock = threading.Lock()
+standings_state = {'since': time.time(), 'revision': analysis_store.key_revision()}
+
+def rebuild_standings():
+    """Reload the rank and normalization indexes from every stored analysis"""
+    # Analyses this process has recorded but not yet written would otherwise drop out of the new indexes
+    store_writer.flush()
+    with standings_lock:
+        standings_state['since'] = time.time()
+    stored = list(analysis_store.iter_summaries())
+    rank_engine.rebuild(stored)
+    normalization_engine.rebuild(stored)
+
+if STORE_REBUILD_ON_START:
+    rebuild_standings()
+
+def sync_standings():
+    """Add analyses stored by any worker since the last pass; rebuild after a key revision or a bulk change"""
+    revision = analysis_store.key_revision()
+    with standings_lock:
+        revised = revision != standings_state['revision']
+        standings_state['revision'] = revision
+        since = standings_state['since']
+    if revised:
+        rebuild_standings()
+        logger.info('standings rebuilt for key revision=%s', revision)
+        return
     
-    for subject in exam_config['subjects']:
-        part = subject['part']
-        file_name = part_file_map.get(part)
-        if file_name:
-            url = f"{base_dir}{file_name}"
-            if query_string:
-                url += f"?{query_string}"
-            parts.append({'part': part, 'url': url, 'subject': subject})
-    
-    return parts
-
-def parse_candidate_info(html):
-    """Parse candidate information from HTML (matching index.ts parseCandidateInfo)"""
-    def get_table_value(label):
-        pattern = rf'<td[^>]*>[^<]*{re.escape(label)}[^<]*</td>\s*<td[^>]*>:?(?:&nbsp;)*\s*([^<]+)'
-        match = re.search(pattern, html, re.IGNORECASE)
-        if match:
-            return match.group(1).replace('&nbsp;', ' ').strip()
-        return ''
-    
-    return {
-        'rollNumber': get_table_value('Roll No') or get_table_value('Roll Number') or '',
-        'name': get_table_value('Candidate Name') or get_table_value('Name') or '',
-        'examLevel': get_table_value('Exam Level') or '',
-        'testDate': get_table_value('Test Date') or '',
-        'shift': get_table_value('Test Time') or get_table_value('Shift') or '',
-        'centreName': get_table_value('Centre Name') or get_table_value('Center Name') or '',
-    }
+    changed, latest = analysis_store.summaries_since(since - STANDINGS_SYNC_OVERLAP)
+    if len(changed) > STANDINGS_SYNC_MAX_ROWS:
+        rebuild_standings()
+        logger.info('standings rebuilt after bulk change rows=%d', len(changed))
+        return
+    rank_engine.add_many(changed)
+    normalization_engine.add_many(changed)
+    with standings_lock:
+        standings_state['since'] = max(standings_state['since'], latest)
+
+def standings_sync_loop():
+    while True:
+        time.sleep(STANDINGS_SYNC_SECONDS)
+        try:
+            sync_standings()
+        except Exception as e:
+            logger.exception('standings sync failed error=%s', e)
+
+if STANDINGS_SYNC_SECONDS > 0:
+    threading.Thread(target=standings_sync_loop, name='standings-sync', daemon=True).start()
+
+# Answer-key revisions (POST /answer-keys) re-score stored analyses in bulk; disabled unless a token is set
+ANSWER_KEY_TOKEN = os.environ.get('ANSWER_KEY_TOKEN', '')
+
+# Bulk uploads share one bounded pool so a large batch cannot starve other requests
+BATCH_WORKERS = 8
+BATCH_MAX_ITEMS = 500
+batch_executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS)
+
+# Submit-and-poll analyses (POST /jobs); bounded, answers 429 when full
+JOB_RETRY_AFTER = int(os.environ.get('JOB_RETRY_AFTER', 5))
+job_queue = JobQueue()
+
+# Exam definitions live in exam_plans.json, compiled once and hot-reloaded when the file changes
+exam_plans = ExamPlanRegistry()
+
+def rescore_exams(exam_ids):
+    """Re-score every stored analysis of exam_ids under their current plans, then rebuild standings"""
+    store_writer.flush()
+    for exam_id in exam_ids:
+        plan = exam_plans.find(exam_id)
+        if plan is None:
+            continue
+        # Every worker reloads the same file; one re-scores the store and the rest pick it up on their next standings sync
+        if not analysis_store.claim_rescore(exam_id, plan.version):
+            logger.info('plan re-score already claimed exam=%s version=%s', exam_id, plan.version)
+            continue
+        for test_date, shift in analysis_store.list_shifts(exam_id):
+            rescore_stored(analysis_store, plan, exam_id, test_date, shift)
+    rebuild_standings()
+
+def on_plans_changed(exam_ids):
+    """Cached results are keyed on the plan version, so only stored scores and standings need redoing"""
+    logger.info('exam plans changed exams=%s, re-scoring stored analyses', ','.join(exam_ids))
+    threading.Thread(target=rescore_exams, args=(exam_ids,), name='plan-rescore', daemon=True).start()
+
+exam_plans.on_reload(on_plans_changed)
+
+def generate_part_urls(input_url, plan):
+    """Generate URLs for all parts from the plan's part file templates (matching index.ts generatePartUrls)"""
+    base_path, _, query_string = input_url.partition('?')
+    base_dir = base_path[:base_path.rfind('/') + 1]
+    suffix = f'?{query_string}' if query_string else ''
+    
+    return [
+        {'part': part, 'url': f'{base_dir}{file_name}{suffix}', 'subject': subject}
+        for part, file_name, subject in plan.part_files
+    ]
 
-def get_language_urls(image_url):
-    """Get Hindi and English URLs (matching index.ts getLanguageUrls)"""
-    if not image_url:
-        return {'hindi': '', 'english': ''}
+def fetch_part(part_info, part_offset, deadline=None, hedge=False):
+    """Stream one part page through the parser, returning (candidate, questions, error) so failures stay isolated.
     
-    is_hindi = bool(re.search(r'_HI\.(jpg|jpeg|png|gif)', image_url, re.IGNORECASE))
-    is_english = bool(re.search(r'_EN\.(jpg|jpeg|png|gif)', image_url, re.IGNORECASE))
+    The part gets PART_DEADLINE seconds, or less if deadline (time.monotonic()) comes sooner.
+    """
+    part_deadline = time.monotonic() + PART_DEADLINE
+    if deadline is not None:
+        part_deadline = min(part_deadline, deadline)
     
-    hindi_url = image_url
-    english_url = image_url
+    # Per-host circuit breaker refuses at once; the rate limit queues the part within its budget.
+    # A hedge only goes out if a token is free right now, so it never delays a primary request.
+    guard = guard_for(part_info['url'])
+    try:
+        guard.before_request(wait=0 if hedge else max(part_deadline - time.monotonic(), 0))
+    except UpstreamUnavailable as e:
+        UPSTREAM_ERRORS.inc(e.reason.replace(' ', '_'))
+        return None, [], e
+    
+    parser = ResponseSheetParser(part_info['part'], part_info['url'], part_info['subject'], part_offset)
+    parse_seconds = 0.0
+    body = None
+    start = time.perf_counter()
+    # 5xx answers and connect/read errors are retried only while the part's budget leaves room,
+    # each retry taking its own rate-limit token, so an abandoned part still stops in time
+    take_token = lambda left: guard.bucket.acquire(timeout=0 if hedge else left)
+    try:
+        with get_within(part_info['url'], part_deadline, FETCH_TIMEOUT, before_retry=take_token) as response:
+            status = response.status_code
+            encoding = response.encoding
+            if parse_pool.should_offload(content_length(response)):
+                # Large page: download it whole (same limits) and parse it in a worker process
+                body = b''.join(iter_bytes(response, PART_MAX_BYTES, part_deadline))
+            else:
+                # Each chunk is parsed as it arrives, so only the unparsed tail of the page is held
+                for text in iter_text(response, PART_MAX_BYTES, part_deadline):
+                    parse_start = time.perf_counter()
+                    parser.feed(text)
+                    parse_seconds += time.perf_counter() - parse_start
+    except BodyTooLarge as e:
+        guard.record(True)
+        UPSTREAM_ERRORS.inc('too_large')
+        return None, [], e
+    except (RequestException, BodyDeadlineExceeded) as e:
+        guard.record(False)
+        UPSTREAM_FETCH_SECONDS.observe(time.perf_counter() - start - parse_seconds, 'error')
+        UPSTREAM_ERRORS.inc(type(e).__name__)
+        return None, [], e
+    except Exception as e:
+        # The page arrived but the parser failed on it, which says nothing about the host
+        guard.record(True)
+        return None, [], e
     
-    if is_hindi:
-        english_url = re.sub(r'_HI\.(jpg|jpeg|png|gif)', r'_EN.\1', image_url, flags=re.IGNORECASE)
-    elif is_english:
-        hindi_url = re.sub(r'_EN\.(jpg|jpeg|png|gif)', r'_HI.\1', image_url, flags=re.IGNORECASE)
+    guard.record(status < 500)
+    fetch_seconds = time.perf_counter() - start - parse_seconds
+    if status >= 400:
+        UPSTREAM_FETCH_SECONDS.observe(fetch_seconds, 'error')
+        UPSTREAM_ERRORS.inc(f'http_{status}')
+    else:
+        UPSTREAM_FETCH_SECONDS.observe(fetch_seconds, 'ok')
+        guard.latency.observe(fetch_seconds)
     
-    return {'hindi': hindi_url, 'english': english_url}
+    parse_start = time.perf_counter()
+    try:
+        if body is not None:
+            candidate, questions = parse_pool.parse_page(
+                body, encoding, part_info['part'], part_info['url'], part_info['subject'], part_offset, part_deadline,
+            )
+        else:
+            parser.close()
+            candidate, questions = parser.candidate, parser.questions
+    except Exception as e:
+        return None, [], e
+    PART_PARSE_SECONDS.observe(parse_seconds + time.perf_counter() - parse_start)
+    return candidate, questions, None
 
-def parse_questions_for_part(html, part, base_url, subject, question_offset):
-    """Parse questions from HTML for a specific part (matching index.ts parseQuestionsForPart)"""
-    print(f'=== PARSER VERSION 2.0 - Multi-image extraction enabled - Part {part} ===')
-    questions = []
+def iter_parsed_parts(part_urls, part_offsets, deadline=None):
+    """Fetch all parts concurrently, yielding (part_info, candidate, questions, error) as each is parsed.
     
-    url_parts = base_url.split('?')[0]
-    last_slash = url_parts.rfind('/')
-    base_dir = url_parts[:last_slash + 1]
+    A part still outstanding after its host's recent p95 gets one hedged duplicate request and
+    whichever copy answers first is used. Parts not in by deadline (time.monotonic(), default
+    ANALYSIS_DEADLINE from now) are yielded with a TimeoutError and left to finish unread.
+    """
+    if not part_urls:
+        return
+    if deadline is None:
+        deadline = time.monotonic() + ANALYSIS_DEADLINE
     
-    # Find all question tables
-    question_table_pattern = re.compile(r'<table[^>]*>[\s\S]*?Q\.No:\s*&nbsp;(\d+)[\s\S]*?</table>', re.IGNORECASE)
+    for part_info in part_urls:
+        logger.debug('scraping part=%s url=%s', part_info['part'], part_info['url'])
+    
+    # Room for one hedge per part on top of the primary requests
+    executor = ThreadPoolExecutor(max_workers=min(FETCH_WORKERS, len(part_urls)) * 2)
+    pending = {}
+    copies = {}
+    started = {}
+    hedged = set()
+    finished = set()
+    
+    def launch(part_info, hedge=False):
+        part = part_info['part']
+        future = executor.submit(fetch_part, part_info, part_offsets[part], deadline, hedge)
+        pending[future] = part_info
+        copies[part] = copies.get(part, 0) + 1
+        started.setdefault(part, time.monotonic())
     
-    for table_match in question_table_pattern.finditer(html):
-        q_num = int(table_match.group(1))
-        table_content = table_match.group(0)
-        
-        # Extract question image
-        q_img_pattern = re.search(r'Q\.No:\s*&nbsp;\d+</font></td><td[^>]*>[\s\S]*?<img[^>]+src\s*=\s*["\']([^"\']+)["\']', table_content, re.IGNORECASE)
-        question_image_url = q_img_pattern.group(1) if q_img_pattern else ''
-        
-        if question_image_url and not question_image_url.startswith('http'):
-            question_image_url = base_dir + question_image_url
-        
-        # Get language URLs for question
-        question_lang_urls = get_language_urls(question_image_url)
-        final_q_hindi = question_lang_urls['hindi'] or question_image_url
-        final_q_english = question_lang_urls['english'] or question_image_url
-        
-        options = []
-        option_ids = ['A', 'B', 'C', 'D']
-        
-        # Parse option rows
-        option_row_pattern = re.compile(r'<tr[^>]*(?:bgcolor\s*=\s*["\']([^"\']+)["\'])?[^>]*>([\s\S]*?)</tr>', re.IGNORECASE)
-        opt_idx = 0
-        found_question_row = False
-        
-        for row_match in option_row_pattern.finditer(table_content):
-            if opt_idx >= 4:
-                break
-                
-            row_bgcolor = (row_match.group(1) or '').lower()
-            row_content = row_match.group(2)
-            
-            if 'Q.No:' in row_content:
-                found_question_row = True
-                continue
-            
-            if not found_question_row:
-                continue
-            
-            # Extract ALL images from this option row
-            img_regex = re.compile(r'<img[^>]+src\s*=\s*["\']([^"\']+)["\']', re.IGNORECASE)
-            image_urls = []
-            
-            for img_match in img_regex.finditer(row_content):
-                url = img_match.group(1)
-                if url and not url.startswith('http'):
-                    url = base_dir + url
-                image_urls.append(url)
-            
-            if not image_urls:
-                continue
-            
-            # Identify Hindi and English URLs
-            hindi_url = ''
-            english_url = ''
-            default_url = image_urls[0]
-            
-            for url in image_urls:
-                if re.search(r'_HI\.(jpg|jpeg|png|gif)', url, re.IGNORECASE):
-                    hindi_url = url
-                elif re.search(r'_EN\.(jpg|jpeg|png|gif)', url, re.IGNORECASE):
-                    english_url = url
-            
-            # Fallback logic
-            if not hindi_url and not english_url:
-                lang_urls = get_language_urls(default_url)
-                hindi_url = lang_urls['hindi'] or default_url
-                english_url = lang_urls['english'] or default_url
-            else:
-                if not hindi_url:
-                    hindi_url = english_url or default_url
-                if not english_url:
-                    english_url = hindi_url or default_url
-            
-            # Get bgcolor from td if not on tr
-            bgcolor = row_bgcolor
-            if not bgcolor:
-                td_bg_match = re.search(r'bgcolor\s*=\s*["\']([^"\']+)["\']', row_content, re.IGNORECASE)
-                if td_bg_match:
-                    bgcolor = td_bg_match.group(1).lower()
-            
-            is_green = 'green' in bgcolor
-            is_red = 'red' in bgcolor
-            is_yellow = 'yellow' in bgcolor
-            
-            is_correct = is_green or is_yellow
-            is_selected = is_green or is_red
-            
-            options.append({
-                'id': option_ids[opt_idx],
-                'imageUrl': default_url,
-                'imageUrlHindi': hindi_url,
-                'imageUrlEnglish': english_url,
-                'isSelected': is_selected,
-                'isCorrect': is_correct,
-            })
-            
-            opt_idx += 1
-        
-        # Pad options to 4
-        while len(options) < 4:
-            options.append({
-                'id': option_ids[len(options)],
-                'imageUrl': '',
-                'imageUrlHindi': '',
-                'imageUrlEnglish': '',
-                'isSelected': False,
-                'isCorrect': False,
-            })
-        
-        if len(options) >= 2:
-            # Determine status
-            has_selected = any(o['isSelected'] for o in options)
-            selected_is_correct = any(o['isSelected'] and o['isCorrect'] for o in options)
-            
-            if not has_selected:
-                status = 'unattempted'
-            elif selected_is_correct:
-                status = 'correct'
-            else:
-                status = 'wrong'
-            
-            # Calculate marks
-            if status == 'correct':
-                marks_awarded = subject['correctMarks']
-            elif status == 'wrong':
-                marks_awarded = -subject['negativeMarks']
-            else:
-                marks_awarded = 0
-            
-            actual_question_number = question_offset + q_num
-            
-            questions.append({
-                'questionNumber': actual_question_number,
-                'part': part,
-                'subject': subject['name'],
-                'questionImageUrl': question_image_url,
-                'questionImageUrlHindi': final_q_hindi,
-                'questionImageUrlEnglish': final_q_english,
-                'options': options,
-                'status': status,
-                'marksAwarded': marks_awarded,
-            })
-    
-    return questions
-
-def calculate_sections(questions, exam_config):
-    """Calculate section-wise breakdown (matching index.ts calculateSections)"""
-    sections = []
-    
-    for subject in exam_config['subjects']:
-        part_questions = [q for q in questions if q['part'] == subject['part']]
-        correct = len([q for q in part_questions if q['status'] == 'correct'])
-        wrong = len([q for q in part_questions if q['status'] == 'wrong'])
-        unattempted = len([q for q in part_questions if q['status'] == 'unattempted'])
-        score = correct * subject['correctMarks'] - wrong * subject['negativeMarks']
-        
-        sections.append({
-            'part': subject['part'],
-            'subject': subject['name'],
-            'correct': correct,
-            'wrong': wrong,
-            'unattempted': unattempted,
-            'score': score,
-            'maxMarks': subject['maxMarks'],
-            'correctMarks': subject['correctMarks'],
-            'negativeMarks': subject['negativeMarks'],
-            'isQualifying': subject.get('isQualifying', False),
-        })
-    
-    return sections
-
-@app.route('/', methods=['POST'])
-def analyze():
     try:
-        data = request.json
-        url = data.get('url')
-        exam_type = data.get('examType', 'DELHI_POLICE_HEAD_CONSTABLE')
-        language = data.get('language', 'hindi')
-        
-        print(f'Analyzing URL: {url} | Exam: {exam_type} | Language: {language}')
-        
-        # Get exam config
-        exam_config = EXAM_CONFIGS.get(exam_type, EXAM_CONFIGS['DELHI_POLICE_HEAD_CONSTABLE'])
-        
-        # Generate URLs for all parts
-        part_urls = generate_part_urls(url, exam_config)
-        print(f'Fetching parts: {[p["part"] for p in part_urls]}')
-        
-        all_questions = []
-        candidate = None
-        
-        # Calculate question offsets
-        question_offset = 0
-        part_offsets = {}
-        for subject in exam_config['subjects']:
-            part_offsets[subject['part']] = question_offset
-            question_offset += subject['totalQuestions']
-        
-        # Fetch and parse all parts
         for part_info in part_urls:
-            part = part_info['part']
-            part_url = part_info['url']
-            subject = part_info['subject']
-            
-            print(f'Scraping Part {part}: {part_url}')
+            launch(part_info)
+        
+        # Losing hedge copies stay in pending but are never waited on
+        while pending and len(finished) < len(part_urls):
+            now = time.monotonic()
+            if now >= deadline:
+                break
             
-            try:
-                response = requests.get(part_url, timeout=30)
-                html = response.text
+            # Hedge parts that have run past their host's p95, and wake for the next one due
+            wake = deadline
+            for part_info in part_urls:
+                part = part_info['part']
+                if part in finished or part in hedged:
+                    continue
+                hedge_after = guard_for(part_info['url']).hedge_after()
+                if hedge_after is None:
+                    continue
+                hedge_at = started[part] + hedge_after
+                if hedge_at <= now:
+                    logger.info('hedging part=%s url=%s after=%.2fs', part, part_info['url'], now - started[part])
+                    UPSTREAM_HEDGES.inc()
+                    hedged.add(part)
+                    launch(part_info, hedge=True)
+                else:
+                    wake = min(wake, hedge_at)
+            
+            done, _ = wait(pending, timeout=wake - now, return_when=FIRST_COMPLETED)
+            for future in done:
+                part_info = pending.pop(future)
+                part = part_info['part']
+                copies[part] -= 1
+                if part in finished:
+                    # The other copy already answered
+                    continue
                 
-                # Parse candidate info from first part
-                if not candidate:
-                    candidate = parse_candidate_info(html)
+                page_candidate, questions, error = future.result()
+                if error is not None and copies[part]:
+                    # Its hedge twin may still succeed
+                    continue
+                finished.add(part)
                 
-                # Parse questions
-                questions = parse_questions_for_part(html, part, part_url, subject, part_offsets[part])
-                all_questions.extend(questions)
-                print(f'Part {part} parsed: {len(questions)} questions')
+                if error is not None:
+                    logger.warning('part failed part=%s url=%s error=%s', part, part_info['url'], error)
+                    yield part_info, None, [], error
+                    continue
                 
-            except Exception as e:
-                print(f'Error scraping Part {part}: {str(e)}')
-                continue
-        
-        # Sort questions by number
-        all_questions.sort(key=lambda q: q['questionNumber'])
-        
-        # Use default candidate if parsing failed
-        if not candidate or not candidate.get('rollNumber'):
-            candidate = {
-                'rollNumber': '',
-                'name': '',
-                'examLevel': exam_config['name'],
-                'testDate': '',
-                'shift': '',
-                'centreName': '',
-            }
-        
-        # Calculate sections
-        sections = calculate_sections(all_questions, exam_config)
-        
-        # Calculate totals
-        correct_count = len([q for q in all_questions if q['status'] == 'correct'])
-        wrong_count = len([q for q in all_questions if q['status'] == 'wrong'])
-        unattempted_count = len([q for q in all_questions if q['status'] == 'unattempted'])
-        total_score = sum(s['score'] for s in sections)
-        
-        result = {
-            'candidate': candidate,
-            'examType': exam_type,
-            'examConfig': exam_config,
-            'language': language,
-            'totalScore': total_score,
-            'maxScore': exam_config['maxMarks'],
-            'totalQuestions': len(all_questions),
-            'correctCount': correct_count,
-            'wrongCount': wrong_count,
-            'unattemptedCount': unattempted_count,
-            'sections': sections,
-            'questions': all_questions,
-        }
-        
-        print(f'Analysis complete. Total score: {total_score}/{exam_config["maxMarks"]}')
-        
-        return jsonify({'success': True, 'data': result})
+                logger.debug('part parsed part=%s questions=%d', part, len(questions))
+                
+                # Images on the host of a real answer sheet may be served through GET /image;
+                # a page with no questions proves nothing about its host
+                if questions:
+                    allow_host(part_info['url'])
+                    if IMAGE_PREFETCH:
+                        get_image_cache().prefetch(question_image_urls(questions))
+                
+                yield part_info, page_candidate, questions, None
         
-    except Exception as e:
-        print(f'Error: {str(e)}')
-        import traceback
-        traceback.print_exc()
-        return jsonify({'success': False, 'error': str(e)}), 500
+        for part_info in part_urls:
+            if part_info['part'] not in finished:
+                logger.warning('part missed deadline part=%s url=%s', part_info['part'], part_info['url'])
+                UPSTREAM_ERRORS.inc('analysis_deadline')
+                yield part_info, None, [], TimeoutError(f'Part {part_info["part"]} did not arrive before the analysis deadline')
+    finally:
+        # Stragglers stop on their own at the deadline; nobody waits for them
+        executor.shutdown(wait=False, cancel_futures=True)
 
-if __name__ == '__main__':
-    print(f'Starting Python Crawler Server on port {PORT}...')
-    print('This server fetches all parts (A, B, C, D, E) and calculates section-wise scores')
-    app.run(port=PORT, debug=True)
-
-
-# Exam Configurations (Simplified for local testing)
-EXAM_CONFIGS = {
-    'DELHI_POLICE_HEAD_CONSTABLE': {
-        'id': 'DELHI_POLICE_HEAD_CONSTABLE',
-        'subjects': [
-             {'name': 'General Awareness', 'part': 'A', 'totalQuestions': 25, 'maxMarks': 25, 'correctMarks': 1, 'negativeMarks': 0.25},
-             {'name': 'Quantitative Aptitude', 'part': 'B', 'totalQuestions': 20, 'maxMarks': 20, 'correctMarks': 1, 'negativeMarks': 0.25},
-             {'name': 'Reasoning', 'part': 'C', 'totalQuestions': 25, 'maxMarks': 25, 'correctMarks': 1, 'negativeMarks': 0.25},
-             {'name': 'English Language', 'part': 'D', 'totalQuestions': 20, 'maxMarks': 20, 'correctMarks': 1, 'negativeMarks': 0.25},
-             {'name': 'Computer Fundamentals', 'part': 'E', 'totalQuestions': 10, 'maxMarks': 10, 'correctMarks': 1, 'negativeMarks': 0.25},
-        ],
-        'maxMarks': 100
-    }
-    # Add other configs as needed, or default to generic if unknown
-}
+def score_questions(questions, plan):
+    """Section breakdown and overall counts from a single pass over the questions"""
+    # Per-part [correct, wrong, unattempted] by the plan's part index, plus the same across all questions
+    part_index = plan.part_index
+    part_counts = [[0, 0, 0] for _ in plan.parts]
+    totals = [0, 0, 0]
+    status_slot = {'correct': 0, 'wrong': 1, 'unattempted': 2}
+    
+    for q in questions:
+        slot = status_slot.get(q['status'])
+        if slot is None:
+            continue
+        totals[slot] += 1
+        index = part_index.get(q['part'])
+        if index is not None:
+            part_counts[index][slot] += 1
+    
+    return build_sections(plan, part_counts), {'correct': totals[0], 'wrong': totals[1], 'unattempted': totals[2]}
 
-def get_language_urls(image_url):
-    if not image_url:
-        return {'hindi': '', 'english': ''}
+def calculate_sections(questions, plan):
+    """Calculate section-wise breakdown (matching index.ts calculateSections)"""
+    return score_questions(questions, plan)[0]
+
+def build_result(exam_type, plan, language, candidate, all_questions):
+    """Assemble the analysis payload from the parsed questions of every part"""
+    start = time.perf_counter()
+    exam_config = plan.config
     
-    is_hindi = '_HI.' in image_url
-    is_english = '_EN.' in image_url
+    # Sort questions by number
+    all_questions.sort(key=lambda q: q['questionNumber'])
     
-    hindi_url = image_url
-    english_url = image_url
+    # Use default candidate if parsing failed
+    if not candidate or not candidate.get('rollNumber'):
+        candidate = {
+            'rollNumber': '',
+            'name': '',
+            'examLevel': exam_config['name'],
+            'testDate': '',
+            'shift': '',
+            'centreName': '',
+        }
     
-    if is_hindi:
-        english_url = image_url.replace('_HI.', '_EN.')
-    elif is_english:
-        hindi_url = image_url.replace('_EN.', '_HI.')
-        
-    return {'hindi': hindi_url, 'english': english_url}
+    # A revised answer key for the shift takes precedence over the one on the sheet
+    overrides = analysis_store.key_overrides(exam_type, candidate.get('testDate', ''), candidate.get('shift', ''))
+    apply_key_overrides(all_questions, overrides, plan.subjects)
+    
+    # Calculate sections and totals together
+    sections, counts = score_questions(all_questions, plan)
+    total_score = sum(s['score'] for s in sections)
+    
+    result = {
+        'candidate': candidate,
+        'examType': exam_type,
+        'examConfig': exam_config,
+        'language': language,
+        'totalScore': total_score,
+        'maxScore': exam_config['maxMarks'],
+        'totalQuestions': len(all_questions),
+        'correctCount': counts['correct'],
+        'wrongCount': counts['wrong'],
+        'unattemptedCount': counts['unattempted'],
+        'sections': sections,
+        'questions': all_questions,
+    }
+    
+    SCORING_SECONDS.observe(time.perf_counter() - start)
+    logger.info('analysis complete exam=%s roll=%s score=%s max=%s', exam_type, candidate['rollNumber'], total_score, exam_config['maxMarks'])
+    
+    return result
+
+def first_candidate(part_urls, candidates):
+    """Candidate info from the first part (in part order) that was parsed"""
+    for part_info in part_urls:
+        if part_info['part'] in candidates:
+            return candidates[part_info['part']]
+    return None
+
+def refused_error(refused):
+    """The UpstreamUnavailable to answer with when parts were refused: the longest wait wins"""
+    return max(refused, key=lambda e: e.retry_after)
+
+def refused_status(error):
+    """429 when our own rate limit refused the fetch, 503 when the host's breaker is open"""
+    return 429 if error.reason == 'rate limited' else 503
 
-def parse_questions(html, part, base_dir, subject, question_offset):
-    questions = []
+def run_analysis(url, exam_type, plan, part_urls, language):
+    """Fetch, parse and score every part, returning (result, missing_parts).
     
-    # Python regex for finding tables with Q.No
-    # Note: Regex parsing HTML is fragile, but matches the TS implementation structure
-    table_pattern = re.compile(r'<table[^>]*>[\s\S]*?Q\.No:\s*&nbsp;(\d+)[\s\S]*?<\/table>', re.IGNORECASE)
+    Raises UpstreamUnavailable if the host guard refused any part, rather than scoring without it.
+    """
+    start = time.perf_counter()
+    all_questions = []
+    candidates = {}
+    missing_parts = []
+    refused = []
     
-    for match in table_pattern.finditer(html):
-        table_content = match.group(0)
-        q_num = int(match.group(1))
+    for part_info, page_candidate, questions, error in iter_parsed_parts(part_urls, plan.offsets):
+        part = part_info['part']
         
-        # Extract Question Image
-        q_img_pattern = re.search(r'Q\.No:\s*&nbsp;\d+<\/font><\/td><td[^>]*>[\s\S]*?<img[^>]+src\s*=\s*["\']([^"\']+)["\']', table_content, re.IGNORECASE)
-        question_image_url = q_img_pattern.group(1) if q_img_pattern else ''
+        if error is not None:
+            if isinstance(error, UpstreamUnavailable):
+                refused.append(error)
+            missing_parts.append(part)
+            continue
         
-        if question_image_url and not question_image_url.startswith('http'):
-            question_image_url = base_dir + question_image_url
-            
-        # Get Language URLs for question (Questions usually share UUIDs)
-        q_lang_urls = get_language_urls(question_image_url)
-        final_q_hindi = q_lang_urls['hindi']
-        final_q_english = q_lang_urls['english']
+        candidates[part] = page_candidate
+        all_questions.extend(questions)
         
-        options = []
-        option_ids = ['A', 'B', 'C', 'D']
+        # An error page from upstream parses cleanly but yields no questions
+        if not questions:
+            missing_parts.append(part)
+    
+    if refused:
+        raise refused_error(refused)
+    
+    candidate = first_candidate(part_urls, candidates)
+    result = build_result(exam_type, plan, language, candidate, all_questions)
+    if missing_parts:
+        result['missingParts'] = sorted(missing_parts)
+    
+    ANALYSIS_SECONDS.observe(time.perf_counter() - start)
+    return result, missing_parts
+
+def get_exam_plan(exam_type):
+    """Compiled plan for exam_type, defaulting to the data file's defaultExam (Delhi Police Head Constable)"""
+    return exam_plans.get(exam_type)
+
+def get_exam_config(exam_type):
+    """Exam config for exam_type, defaulting to Delhi Police Head Constable"""
+    return get_exam_plan(exam_type).config
+
+def attach_standing(result):
+    """Record the analysis in the rank and normalization indexes and add its current standing"""
+    # Partial scores are neither cached nor stored, so indexing them would skew ranks until the next rebuild
+    if not result['totalQuestions'] or result.get('missingParts'):
+        return dict(result, rank=None, normalized=None)
+    return dict(result, rank=rank_engine.record(result), normalized=normalization_engine.record(result))
+
+def with_key_overrides(result):
+    """A stored result with its questions re-marked under the shift's current answer key"""
+    candidate = result['candidate']
+    overrides = analysis_store.key_overrides(result['examType'], candidate.get('testDate', ''), candidate.get('shift', ''))
+    apply_key_overrides(result['questions'], overrides, result['sections'])
+    return result
+
+def rescore_cached(result, plan):
+    """A cached result re-scored under the shift's current answer key, which may postdate the cache entry"""
+    candidate = result['candidate']
+    overrides = analysis_store.key_overrides(result['examType'], candidate.get('testDate', ''), candidate.get('shift', ''))
+    if not overrides:
+        return result
+    apply_key_overrides(result['questions'], overrides, plan.subjects)
+    sections, counts = score_questions(result['questions'], plan)
+    return dict(
+        result,
+        totalScore=sum(s['score'] for s in sections),
+        correctCount=counts['correct'],
+        wrongCount=counts['wrong'],
+        unattemptedCount=counts['unattempted'],
+        sections=sections,
+    )
+
+def stored_fallback(url, exam_type, exam_config, language):
+    """While the sheet's host has its breaker open, the last stored analysis of the sheet (else 503)"""
+    guard = guard_for(url)
+    if not guard.breaker.is_open():
+        return None
+    
+    found = analysis_store.get_by_source_url(url, exam_type)
+    if found is None:
+        guard.raise_if_open()
+        return None
+    
+    logger.info('upstream down, serving stored analysis url=%s exam=%s', url, exam_type)
+    allow_host(url)
+    return dict(with_key_overrides(found[0]), examConfig=exam_config, language=language, stale=True)
+
+def analyze_cached(url, exam_type, language):
+    """Serve an analysis from the cache or an identical in-flight run, else run the pipeline"""
+    # Get the compiled exam plan
+    plan = get_exam_plan(exam_type)
+    
+    # Generate URLs for all parts
+    part_urls = generate_part_urls(url, plan)
+    key = cache_key(part_urls, exam_type, plan.version)
+    
+    result = response_cache.get(key)
+    if result is not None:
+        CACHE_REQUESTS.inc('hit')
+        logger.info('cache hit url=%s exam=%s', url, exam_type)
+        # Only complete analyses are cached, so the sheet's host has served real questions
+        allow_host(url)
+        return attach_standing(dict(rescore_cached(unpack_result(result), plan), language=language))
+    
+    CACHE_REQUESTS.inc('miss')
+    
+    fallback = stored_fallback(url, exam_type, plan.config, language)
+    if fallback is not None:
+        return attach_standing(fallback)
+    
+    def compute():
+        logger.debug('fetching parts=%s', ','.join(p['part'] for p in part_urls))
+        result, missing_parts = run_analysis(url, exam_type, plan, part_urls, language)
         
-        # Extract Options
-        # Find all rows that might contain options
-        row_iter = re.finditer(r'<tr[^>]*(?:bgcolor\s*=\s*["\']([^"\']+)["\'])?[^>]*>([\s\S]*?)<\/tr>', table_content, re.IGNORECASE)
+        # Only complete analyses are cached so a flaky part is retried next time
+        if not missing_parts:
+            response_cache.set(key, pack_result(result))
+            store_writer.submit(result, url)
+            question_stats.record(result)
         
-        opt_idx = 0
-        found_question_row = False
+        return result
+    
+    result, shared = analysis_flight.do(key, compute)
+    if shared:
+        logger.info('joined in-flight analysis url=%s exam=%s', url, exam_type)
+        result = dict(result, language=language)
+    
+    # Rank and normalized score are computed per request, never cached, since they move as candidates arrive
+    return attach_standing(result)
+
+def ndjson(record):
+    return json.dumps(record) + '\n'
+
+def summary_record(result):
+    """Final streamed record: the full result minus the questions already sent per part"""
+    return {'type': 'totals', 'data': {k: v for k, v in result.items() if k != 'questions'}}
+
+def part_record(plan, part, questions, error=None):
+    """Streamed record for one part: its questions and that part's section score"""
+    section = calculate_sections(questions, plan)[plan.part_index[part]]
+    record = {'type': 'part', 'part': part, 'success': error is None, 'questions': questions, 'section': section}
+    if error is not None:
+        record['error'] = str(error)
+    return record
+
+def stream_analysis(url, exam_type, language):
+    """Analysis as NDJSON records: candidate, then each part as it is parsed, then totals"""
+    plan = get_exam_plan(exam_type)
+    part_urls = generate_part_urls(url, plan)
+    key = cache_key(part_urls, exam_type, plan.version)
+    
+    def replay(result):
+        yield ndjson({'type': 'candidate', 'data': result['candidate']})
+        for part_info in part_urls:
+            part = part_info['part']
+            questions = [q for q in result['questions'] if q['part'] == part]
+            yield ndjson(part_record(plan, part, questions))
+        yield ndjson(summary_record(result))
+    
+    def generate():
+        all_questions = []
+        candidates = {}
+        missing_parts = []
+        refused = []
+        candidate_sent = False
         
-        for row_match in row_iter:
-            if opt_idx >= 4: break
-            
-            row_bgcolor = (row_match.group(1) or '').lower()
-            row_content = row_match.group(2)
-            
-            if 'Q.No:' in row_content:
-                found_question_row = True
-                continue
-            
-            if not found_question_row:
-                continue
-                
-            # Extract ALL images from this option row (Robust Fix)
-            img_regex = re.compile(r'<img[^>]+src\s*=\s*["\']([^"\']+)["\']', re.IGNORECASE)
-            image_urls = []
-            
-            for img_m in img_regex.finditer(row_content):
-                url = img_m.group(1)
-                if url and not url.startswith('http'):
-                    url = base_dir + url
-                image_urls.append(url)
-            
-            if not image_urls:
-                continue
-                
-            # Identify Hindi vs English based on suffix
-            hindi_url = ''
-            english_url = ''
-            default_url = image_urls[0]
-            
-            for url in image_urls:
-                if '_HI.' in url:
-                    hindi_url = url
-                elif '_EN.' in url:
-                    english_url = url
-            
-            # Fallback Logic
-            if not hindi_url and not english_url:
-                lang_urls = get_language_urls(default_url)
-                hindi_url = lang_urls['hindi']
-                english_url = lang_urls['english']
-            else:
-                if not hindi_url: hindi_url = english_url or default_url
-                if not english_url: english_url = hindi_url or default_url
-
-            # Determine Correctness
-            if not row_bgcolor:
-               bg_match = re.search(r'bgcolor\s*=\s*["\']([^"\']+)["\']', row_content, re.IGNORECASE)
-               if bg_match:
-                   row_bgcolor = bg_match.group(1).lower()
-            
-            is_green = 'green' in row_bgcolor
-            is_red = 'red' in row_bgcolor
-            is_yellow = 'yellow' in row_bgcolor
-            
-            is_correct = is_green or is_yellow
-            is_selected = is_green or is_red
-            
-            options.append({
-                'id': option_ids[opt_idx],
-                'imageUrl': default_url,
-                'imageUrlHindi': hindi_url,
-                'imageUrlEnglish': english_url,
-                'isSelected': is_selected,
-                'isCorrect': is_correct
-            })
+        for part_info, page_candidate, questions, error in iter_parsed_parts(part_urls, plan.offsets):
+            part = part_info['part']
             
-            opt_idx += 1
+            if isinstance(error, UpstreamUnavailable):
+                refused.append(error)
+            if error is None:
+                # Candidate details are the same on every part, so send the first one parsed
+                if not candidate_sent and page_candidate.get('rollNumber'):
+                    yield ndjson({'type': 'candidate', 'data': page_candidate})
+                    candidate_sent = True
+                candidates[part] = page_candidate
+                all_questions.extend(questions)
             
-        # Pad options if less than 4
-        while len(options) < 4:
-            options.append({
-                'id': option_ids[len(options)],
-                'imageUrl': '',
-                'imageUrlHindi': '',
-                'imageUrlEnglish': '',
-                'isSelected': False,
-                'isCorrect': False
-            })
+            if error is not None or not questions:
+                missing_parts.append(part)
             
-        # Determine Status
-        status = 'unattempted'
-        has_selected = any(o['isSelected'] for o in options)
-        selected_is_correct = any(o['isSelected'] and o['isCorrect'] for o in options)
+            yield ndjson(part_record(plan, part, questions, error))
         
-        if not has_selected:
-            status = 'unattempted'
-        elif selected_is_correct:
-            status = 'correct'
-        else:
-            status = 'wrong'
-            
-        # Calculate Marks
-        marks = 0
-        if status == 'correct': marks = subject['correctMarks']
-        elif status == 'wrong': marks = -subject['negativeMarks']
+        # Headers are long gone, so a refusal ends the stream with an error record instead of a partial summary
+        if refused:
+            error = refused_error(refused)
+            yield ndjson({'type': 'error', 'error': str(error), 'status': refused_status(error), 'retryAfter': int(error.retry_after) + 1})
+            return
+        
+        candidate = first_candidate(part_urls, candidates)
+        result = build_result(exam_type, plan, language, candidate, all_questions)
+        if missing_parts:
+            result['missingParts'] = sorted(missing_parts)
         
-        questions.append({
-            'questionNumber': question_offset + q_num,
-            'part': part,
-            'subject': subject['name'],
-            'questionImageUrl': question_image_url,
-            'questionImageUrlHindi': final_q_hindi,
-            'questionImageUrlEnglish': final_q_english,
-            'options': options,
-            'status': status,
-            'marksAwarded': marks
-        })
+        if not missing_parts:
+            response_cache.set(key, pack_result(result))
+            store_writer.submit(result, url)
+            question_stats.record(result)
         
-    return questions
+        yield ndjson(summary_record(attach_standing(result)))
+    
+    cached = response_cache.get(key)
+    if cached is not None:
+        CACHE_REQUESTS.inc('hit')
+        logger.info('cache hit url=%s exam=%s', url, exam_type)
+        allow_host(url)
+        return replay(attach_standing(dict(rescore_cached(unpack_result(cached), plan), language=language)))
+    
+    CACHE_REQUESTS.inc('miss')
+    
+    fallback = stored_fallback(url, exam_type, plan.config, language)
+    if fallback is not None:
+        return replay(attach_standing(fallback))
+    
+    return generate()
 
 @app.route('/', methods=['POST'])
 def analyze():
     try:
         data = request.json
         url = data.get('url')
-        exam_type = data.get('examType', 'DELHI_POLICE_HEAD_CONSTABLE') # Default if missing
+        exam_type = data.get('examType', 'DELHI_POLICE_HEAD_CONSTABLE')
         language = data.get('language', 'hindi')
         
-        print(f"Analyzing URL: {url} | Exam: {exam_type} | Lang: {language}")
-        
-        # Fetch Content
-        response = requests.get(url)
-        html_content = response.text
+        logger.info('analyze url=%s exam=%s language=%s', url, exam_type, language)
         
-        # Base Directory for relative URLs
-        base_dir = url.split('?')[0].rsplit('/', 1)[0] + '/'
+        # Opt-in incremental mode: one NDJSON record per part as soon as it is parsed
+        if data.get('stream') or request.args.get('stream'):
+            return Response(stream_analysis(url, exam_type, language), mimetype='application/x-ndjson')
         
-        # Config
-        config = EXAM_CONFIGS.get(exam_type, EXAM_CONFIGS['DELHI_POLICE_HEAD_CONSTABLE'])
-        
-        all_questions = []
-        # Simplified: Just parsing the first subject/part found in the single URL
-        # Real logic might need to fetch multiple pages if configured, but start simple
-        subject = config['subjects'][0] # Taking first subject as default container
+        result = analyze_cached(url, exam_type, language)
         
-        # In a real scenario, you'd iterate subjects and fetch their specific pages if needed
-        # For simplicity, we parse the provided page assuming it contains questions
-        # Note: The original logic handled multiple parts. For this Python script, 
-        # we will parse everything from the single page provided.
-        
-        parsed_questions = parse_questions(html_content, subject['part'], base_dir, subject, 0)
-        
-        result = {
-            'candidate': {}, # Placeholder
-            'examType': exam_type,
-            'examConfig': config,
-            'language': language,
-            'totalScore': sum(q['marksAwarded'] for q in parsed_questions),
-            'maxScore': config['maxMarks'],
-            'totalQuestions': len(parsed_questions),
-            'correctCount': len([q for q in parsed_questions if q['status'] == 'correct']),
-            'wrongCount': len([q for q in parsed_questions if q['status'] == 'wrong']),
-            'unattemptedCount': len([q for q in parsed_questions if q['status'] == 'unattempted']),
-            'sections': [],
-            'questions': parsed_questions
-        }
+        # Opt-in slim payload: config by id, relative image names, no duplicate language variants
+        if data.get('format') == 'compact' or request.args.get('format') == 'compact':
+            result = compact_result(result)
         
         return jsonify({'success': True, 'data': result})
-
+        
+    except UpstreamUnavailable as e:
+        logger.warning('analyze refused url=%s error=%s', url, e)
+        response = jsonify({'success': False, 'error': str(e)})
+        response.headers['Retry-After'] = str(int(e.retry_after) + 1)
+        return response, refused_status(e)
     except Exception as e:
-        print(f"Error: {str(e)}")
+        logger.exception('analyze failed error=%s', e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def analyze_item(url, exam_type, language):
+    """Run one analysis, returning the same success/error shape as POST /"""
+    try:
+        return {'success': True, 'data': analyze_cached(url, exam_type, language)}
+    except Exception as e:
+        logger.warning('batch item failed url=%s error=%s', url, e)
+        return {'success': False, 'error': str(e)}
+
+@app.route('/batch', methods=['POST'])
+def analyze_batch():
+    """Analyze many {url, examType} items, streaming NDJSON lines as each finishes"""
+    data = request.json
+    items = data.get('items') if isinstance(data, dict) else data
+    
+    if not isinstance(items, list) or not items:
+        return jsonify({'success': False, 'error': 'Expected a non-empty list of items'}), 400
+    if len(items) > BATCH_MAX_ITEMS:
+        return jsonify({'success': False, 'error': f'At most {BATCH_MAX_ITEMS} items per batch'}), 400
+    
+    # Repeated (url, examType) pairs are analyzed once and fanned back out
+    groups = {}
+    for index, item in enumerate(items):
+        item = item if isinstance(item, dict) else {}
+        key = (item.get('url'), item.get('examType', 'DELHI_POLICE_HEAD_CONSTABLE'))
+        groups.setdefault(key, []).append((index, item.get('language', 'hindi')))
+    
+    logger.info('batch items=%d unique=%d', len(items), len(groups))
+    
+    def generate():
+        futures = {}
+        for (url, exam_type), members in groups.items():
+            if not url:
+                for index, _ in members:
+                    yield json.dumps({'index': index, 'url': url, 'success': False, 'error': 'Missing url'}) + '\n'
+                continue
+            future = batch_executor.submit(analyze_item, url, exam_type, members[0][1])
+            futures[future] = (url, members)
+        
+        for future in as_completed(futures):
+            url, members = futures[future]
+            outcome = future.result()
+            for index, language in members:
+                line = dict(outcome, index=index, url=url)
+                if outcome['success']:
+                    line['data'] = dict(outcome['data'], language=language)
+                yield json.dumps(line) + '\n'
+    
+    return Response(generate(), mimetype='application/x-ndjson')
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """Queue an analysis and return its job id at once; poll GET /jobs/<id> for the result"""
+    data = request.json or {}
+    url = data.get('url')
+    if not url:
+        return jsonify({'success': False, 'error': 'Missing url'}), 400
+    if shutting_down.is_set():
+        return jsonify({'success': False, 'error': 'Server is shutting down'}), 503
+    
+    exam_type = data.get('examType', 'DELHI_POLICE_HEAD_CONSTABLE')
+    language = data.get('language', 'hindi')
+    try:
+        job_id = job_queue.submit(analyze_cached, url, exam_type, language)
+    except QueueFull:
+        response = jsonify({'success': False, 'error': 'Too many analyses queued, retry shortly'})
+        response.headers['Retry-After'] = str(JOB_RETRY_AFTER)
+        return response, 429
+    
+    logger.info('job queued id=%s url=%s exam=%s', job_id, url, exam_type)
+    response = jsonify({'success': True, 'jobId': job_id, 'status': 'queued', 'statusUrl': f'/jobs/{job_id}'})
+    response.headers['Location'] = f'/jobs/{job_id}'
+    return response, 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Job status; once done, data.result holds the same payload POST / returns"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Unknown or expired job'}), 404
+    if job['status'] == DONE and request.args.get('format') == 'compact':
+        job['result'] = compact_result(job['result'])
+    return jsonify({'success': True, 'data': job})
+
+@app.route('/rank', methods=['GET'])
+def rank_lookup():
+    """Where a total score would stand in a shift: ?examType=&testDate=&shift=&score="""
+    try:
+        score = float(request.args['score'])
+    except (KeyError, ValueError):
+        return jsonify({'success': False, 'error': 'A numeric score is required'}), 400
+    
+    rank = rank_engine.lookup(
+        request.args.get('examType', 'DELHI_POLICE_HEAD_CONSTABLE'),
+        request.args.get('testDate', ''),
+        request.args.get('shift', ''),
+        score,
+    )
+    if rank is None:
+        return jsonify({'success': False, 'error': 'No candidates recorded for this shift yet'}), 404
+    return jsonify({'success': True, 'data': rank})
+
+@app.route('/analysis/<roll_number>', methods=['GET'])
+def stored_analysis(roll_number):
+    """A previously stored analysis by roll number, without fetching anything: ?examType=&language="""
+    found = analysis_store.get_by_roll(roll_number, request.args.get('examType'))
+    if found is None:
+        return jsonify({'success': False, 'error': 'No stored analysis for this roll number'}), 404
+    
+    result, source_url = found
+    if source_url:
+        allow_host(source_url)
+    result = with_key_overrides(result)
+    result['examConfig'] = get_exam_config(result['examType'])
+    result['language'] = request.args.get('language', result.get('language', 'hindi'))
+    result = attach_standing(result)
+    if request.args.get('format') == 'compact':
+        result = compact_result(result)
+    return jsonify({'success': True, 'data': result, 'sourceUrl': source_url})
+
+@app.route('/answer-keys', methods=['POST'])
+def revise_answer_key():
+    """Apply a revised answer key to one shift and re-score its stored analyses without re-fetching"""
+    authorization = request.headers.get('Authorization', '')
+    if not ANSWER_KEY_TOKEN or not hmac.compare_digest(authorization, f'Bearer {ANSWER_KEY_TOKEN}'):
+        return jsonify({'success': False, 'error': 'Not authorized'}), 403
+    
+    data = request.get_json(silent=True) or {}
+    exam_type = data.get('examType')
+    plan = exam_plans.find(exam_type)
+    if plan is None:
+        return jsonify({'success': False, 'error': f'Unknown exam type: {exam_type}'}), 400
+    if not data.get('testDate') or not data.get('shift'):
+        return jsonify({'success': False, 'error': 'testDate and shift are required'}), 400
+    try:
+        revision = parse_revision(data, plan)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    # Analyses still queued for the store are re-scored too
+    store_writer.flush()
+    start = time.perf_counter()
+    count = rescore_shift(analysis_store, plan, exam_type, data['testDate'], data['shift'], revision)
+    
+    # Cached results and standings predate the revision; other workers re-score cache hits
+    # and rebuild their standings once they see the logged revision
+    response_cache.clear()
+    revision_id = analysis_store.key_revision()
+    rebuild_standings()
+    with standings_lock:
+        standings_state['revision'] = max(standings_state['revision'], revision_id)
+    question_stats.apply_key(exam_type, data['testDate'], data['shift'], revision)
+    
+    return jsonify({'success': True, 'data': {'rescored': count, 'overrides': len(revision), 'seconds': round(time.perf_counter() - start, 3)}})
+
+@app.route('/question-stats', methods=['GET'])
+def shift_question_stats():
+    """Attempt rate, accuracy and option spread per question, and difficulty per section: ?examType=&testDate=&shift="""
+    exam_type = request.args.get('examType', 'DELHI_POLICE_HEAD_CONSTABLE')
+    plan = exam_plans.find(exam_type)
+    if plan is None:
+        return jsonify({'success': False, 'error': f'Unknown exam type: {exam_type}'}), 400
+    
+    stats = question_stats.summary(exam_type, request.args.get('testDate', ''), request.args.get('shift', ''), plan.subjects)
+    if stats is None:
+        return jsonify({'success': False, 'error': 'No candidates recorded for this shift yet'}), 404
+    return jsonify({'success': True, 'data': stats})
+
+@app.route('/exam-configs', methods=['GET'])
+def list_exam_configs():
+    """Every exam config, for clients using the compact format's examConfigId"""
+    return jsonify({'success': True, 'data': exam_plans.configs()})
+
+@app.route('/exam-configs/<exam_id>', methods=['GET'])
+def exam_config_by_id(exam_id):
+    plan = exam_plans.find(exam_id)
+    if plan is None:
+        return jsonify({'success': False, 'error': f'Unknown exam config: {exam_id}'}), 404
+    return jsonify({'success': True, 'data': plan.config})
+
+@app.route('/image', methods=['GET'])
+def image_proxy():
+    """Question/option image via the shared disk cache: ?url=<upstream image URL>"""
+    url = request.args.get('url', '')
+    if not url:
+        return jsonify({'success': False, 'error': 'An image url is required'}), 400
+    if not is_allowed(url):
+        return jsonify({'success': False, 'error': 'Image host is not allowed'}), 403
+    
+    try:
+        body, meta = get_image_cache().fetch(url)
+    except ImageFetchError as e:
+        return jsonify({'success': False, 'error': str(e)}), 404 if e.status == 404 else 502
+    except Exception as e:
+        logger.warning('image proxy failed url=%s error=%s', url, e)
+        return jsonify({'success': False, 'error': str(e)}), 502
+    
+    response = Response(body, mimetype=meta['contentType'])
+    response.cache_control.public = True
+    response.cache_control.max_age = int(IMAGE_CACHE_TTL)
+    response.add_etag()
+    return response.make_conditional(request)
+
+@app.after_request
+def finalize_response(response):
+    """ETag and gzip/brotli for buffered JSON responses; NDJSON streams pass through"""
+    if response.is_streamed or response.direct_passthrough or response.status_code != 200:
+        return response
+    if response.mimetype != 'application/json' or 'Content-Encoding' in response.headers:
+        return response
+    
+    body = response.get_data()
+    etag = etag_for(body)
+    response.headers['ETag'] = etag
+    response.vary.add('Accept-Encoding')
+    
+    # A conditional POST has already done its work; 304 is only for safe reads
+    if request.method in ('GET', 'HEAD') and etag_matches(request.headers.get('If-None-Match'), etag):
+        response.status_code = 304
+        response.set_data(b'')
+        return response
+    
+    encoding = choose_encoding(request.headers.get('Accept-Encoding')) if len(body) >= COMPRESS_MIN_BYTES else None
+    if encoding:
+        response.set_data(compress(body, encoding))
+        response.headers['Content-Encoding'] = encoding
+    RESPONSE_BYTES.observe(response.content_length or 0, request.endpoint or '')
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def scrape_metrics():
+    """Prometheus scrape endpoint (per process; scrape each gunicorn worker or aggregate upstream)"""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """Liveness: the process is up and serving requests"""
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    """Readiness: accepting new analyses (503 while draining for shutdown)"""
+    if shutting_down.is_set():
+        return jsonify({'status': 'shutting_down'}), 503
+    return jsonify({'status': 'ready', 'inFlight': analysis_flight.in_flight(), 'jobsPending': job_queue.depth(), 'upstream': host_states()})
+
+def mark_draining():
+    """Fail readiness and refuse new jobs; the drain itself happens in begin_shutdown"""
+    shutting_down.set()
+
+def begin_shutdown():
+    """Stop taking new work and let in-flight analyses and batches finish"""
+    if drain_started.is_set():
+        return
+    drain_started.set()
+    mark_draining()
+    logger.info('shutting down: draining in-flight analyses')
+    batch_executor.shutdown(wait=True)
+    job_queue.shutdown(wait=True)
+    parse_pool.shutdown()
+    store_writer.flush()
+    question_stats.snapshot()
+
 if __name__ == '__main__':
-    print(f"Starting Python Crawler Server on port {PORT}...")
-    app.run(port=PORT, debug=True)
+    logger.info('starting Python Crawler Server port=%d', PORT)
+    logger.info('This server fetches all parts (A, B, C, D, E) and calculates section-wise scores')
+    logger.info('Development server only - use `gunicorn -c gunicorn.conf.py` in production')
+    app.run(port=PORT, debug=DEBUG)
@@ -0,0 +1,38 @@
+"""Shared setup for the tests: an isolated server module and the bench stub upstream.
+
+server reads its configuration at import time, so every path it writes to is
+pointed at a temporary directory before the first import.
+"""
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'bench'))
+
+DATA_DIR = tempfile.mkdtemp(prefix='rankmitra-tests-')
+ANSWER_KEY_TOKEN = 'test-token'
+
+for name, value in {
+    'ANALYSIS_STORE_PATH': os.path.join(DATA_DIR, 'analyses.sqlite3'),
+    'JOB_STATE_PATH': os.path.join(DATA_DIR, 'jobs.sqlite3'),
+    'RESPONSE_CACHE_PATH': os.path.join(DATA_DIR, 'response_cache.sqlite3'),
+    'QUESTION_STATS_PATH': os.path.join(DATA_DIR, 'question_stats.npz'),
+    'UPSTREAM_BUCKET_PATH': os.path.join(DATA_DIR, 'upstream_buckets.sqlite3'),
+    'IMAGE_CACHE_DIR': os.path.join(DATA_DIR, 'image_cache'),
+    'ANSWER_KEY_TOKEN': ANSWER_KEY_TOKEN,
+}.items():
+    os.environ.setdefault(name, value)
+
+import server
+from stub_upstream import start_stub
+
+_stub = None
+
+def stub_url(fixture_set='dp_head_constable', rid=1):
+    """URL of a fixture response sheet on a stub upstream started on first use"""
+    global _stub
+    if _stub is None:
+        _stub = start_stub()
+    return f'{_stub[1]}/{fixture_set}/ViewCandResponse.aspx?rid={rid}'
@@ -0,0 +1,52 @@
+import unittest
+
+from tests.support import ANSWER_KEY_TOKEN, server, stub_url
+
+EXAM_TYPE = 'DELHI_POLICE_HEAD_CONSTABLE'
+
+class AnswerKeyRevisionTest(unittest.TestCase):
+    """POST /answer-keys end to end: analysis, revision, then every reader of the new key"""
+
+    def setUp(self):
+        self.client = server.app.test_client()
+
+    def revise(self, body, token=ANSWER_KEY_TOKEN):
+        return self.client.post('/answer-keys', json=body, headers={'Authorization': f'Bearer {token}'})
+
+    def test_revision_rescores_stored_cached_and_stats(self):
+        url = stub_url(rid=101)
+        before = self.client.post('/', json={'url': url, 'examType': EXAM_TYPE}).get_json()['data']
+        server.store_writer.flush()
+        candidate = before['candidate']
+        shift = {'examType': EXAM_TYPE, 'testDate': candidate['testDate'], 'shift': candidate['shift']}
+
+        wrong = next(q for q in before['questions'] if q['status'] == 'wrong')
+        response = self.revise(dict(shift, dropped=[{'questionNumber': wrong['questionNumber'], 'part': wrong['part']}]))
+        self.assertEqual(response.status_code, 200, response.get_data(as_text=True))
+        data = response.get_json()['data']
+        self.assertEqual(data['overrides'], 1)
+        self.assertGreaterEqual(data['rescored'], 1)
+
+        # A dropped question turns the candidate's wrong answer into full marks
+        subject = next(s for s in server.get_exam_plan(EXAM_TYPE).subjects if s['part'] == wrong['part'])
+        expected = before['totalScore'] + subject['correctMarks'] + subject['negativeMarks']
+
+        stored = self.client.get(f'/analysis/{candidate["rollNumber"]}', query_string={'examType': EXAM_TYPE}).get_json()['data']
+        self.assertAlmostEqual(stored['totalScore'], expected)
+
+        again = self.client.post('/', json={'url': url, 'examType': EXAM_TYPE}).get_json()['data']
+        self.assertAlmostEqual(again['totalScore'], expected)
+
+        stats = self.client.get('/question-stats', query_string=shift).get_json()['data']
+        question = next(q for q in stats['questions'] if q['questionNumber'] == wrong['questionNumber'])
+        self.assertTrue(question['dropped'])
+
+    def test_revision_needs_token(self):
+        self.assertEqual(self.revise({'examType': EXAM_TYPE}, token='wrong').status_code, 403)
+
+    def test_revision_rejects_unknown_question(self):
+        response = self.revise({'examType': EXAM_TYPE, 'testDate': 'd', 'shift': 's', 'dropped': [{'questionNumber': 9999}]})
+        self.assertEqual(response.status_code, 400)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,29 @@
+import unittest
+
+from tests.support import server, stub_url
+
+EXAM_TYPE = 'DELHI_POLICE_HEAD_CONSTABLE'
+
+class ConditionalResponseTest(unittest.TestCase):
+    """ETags let a client skip re-downloading a read, never skip the answer to a POST"""
+
+    def setUp(self):
+        self.client = server.app.test_client()
+        self.body = {'url': stub_url(rid=3), 'examType': EXAM_TYPE}
+        self.first = self.client.post('/', json=self.body)
+        server.store_writer.flush()
+
+    def test_post_with_matching_etag_gets_the_analysis(self):
+        etag = self.first.headers['ETag']
+        again = self.client.post('/', json=self.body, headers={'If-None-Match': etag})
+        self.assertEqual(again.status_code, 200)
+        self.assertEqual(again.get_json(), self.first.get_json())
+
+    def test_get_with_matching_etag_is_not_modified(self):
+        roll = self.first.get_json()['data']['candidate']['rollNumber']
+        path = f'/analysis/{roll}?examType={EXAM_TYPE}'
+        etag = self.client.get(path).headers['ETag']
+        self.assertEqual(self.client.get(path, headers={'If-None-Match': etag}).status_code, 304)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import time
+import unittest
+
+from tests import support  # noqa: F401  (isolated paths before the app modules load)
+import http_client
+import server
+from stub_upstream import start_stub
+
+class GetWithinTest(unittest.TestCase):
+    """Retries cover a transient failure but never outlast the caller's deadline"""
+
+    def setUp(self):
+        self.stub, base_url = start_stub(failure_rate=1.0)
+        self.url = f'{base_url}/dp_head_constable/ViewCandResponse.aspx?rid=1'
+        self.addCleanup(self.stub.shutdown)
+
+    def test_transient_503_is_retried(self):
+        def recover(left):
+            self.stub.config.failure_rate = 0.0
+            return True
+        with http_client.get_within(self.url, time.monotonic() + 10, 5, before_retry=recover) as response:
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.stub.config.requests, 2)
+
+    def test_no_retry_past_the_deadline(self):
+        start = time.monotonic()
+        with http_client.get_within(self.url, start + http_client.RETRY_BACKOFF / 2, 5) as response:
+            self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.stub.config.requests, 1)
+        self.assertLess(time.monotonic() - start, http_client.RETRY_BACKOFF)
+
+    def test_before_retry_can_refuse(self):
+        with http_client.get_within(self.url, time.monotonic() + 10, 5, before_retry=lambda left: False) as response:
+            self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.stub.config.requests, 1)
+
+class FetchPartTest(unittest.TestCase):
+
+    def test_part_survives_one_503(self):
+        # With this seed the stub fails the first request and serves the second
+        stub, base_url = start_stub(failure_rate=0.5, seed=9)
+        self.addCleanup(stub.shutdown)
+        part_info = server.generate_part_urls(
+            f'{base_url}/dp_head_constable/ViewCandResponse.aspx?rid=1', server.get_exam_plan('DELHI_POLICE_HEAD_CONSTABLE'),
+        )[0]
+        candidate, questions, error = server.fetch_part(part_info, 0)
+        self.assertIsNone(error)
+        self.assertTrue(questions)
+        self.assertEqual((stub.config.requests, stub.config.failures), (2, 1))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+import os
+import tempfile
+import unittest
+
+from tests import support  # noqa: F401  (isolated paths before the app modules load)
+from image_cache import AllowedHosts, ImageCache
+
+class AllowedHostsTest(unittest.TestCase):
+    """Workers share one allowlist: each is its own AllowedHosts on the same file"""
+
+    def test_host_allowed_by_one_worker_is_allowed_by_another(self):
+        path = os.path.join(tempfile.mkdtemp(), 'hosts.sqlite3')
+        first, second = AllowedHosts(path, static_hosts=()), AllowedHosts(path, static_hosts=())
+        self.assertNotIn('exam.example', second)
+        first.add('exam.example')
+        self.assertIn('exam.example', second)
+        # and after a restart
+        self.assertIn('exam.example', AllowedHosts(path, static_hosts=()))
+
+class SharedDirectoryTest(unittest.TestCase):
+    """max_bytes bounds the directory, not each worker's writes to it"""
+
+    def test_total_on_disk_stays_under_max_bytes(self):
+        directory = tempfile.mkdtemp()
+        workers = [ImageCache(directory, max_bytes=4000, ttl=60) for _ in range(3)]
+        for i in range(12):
+            workers[i % 3].write(f'{i:064x}', b'x' * 600, {'fetchedAt': 0})
+        on_disk = sum(
+            os.path.getsize(os.path.join(root, name))
+            for root, _, files in os.walk(directory) for name in files if not name.endswith('.json')
+        )
+        self.assertLessEqual(on_disk, 4000)
+        # The newest image survives eviction
+        self.assertIsNotNone(workers[0].read(f'{11:064x}'))
+
+if __name__ == '__main__':
+    unittest.main()
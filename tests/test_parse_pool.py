@@ -0,0 +1,34 @@
+import os
+import time
+import unittest
+
+from tests import support
+import parse_pool
+from http_client import BodyDeadlineExceeded
+
+PAGE = os.path.join(support.ROOT, 'bench', 'fixtures', 'dp_head_constable', 'ViewCandResponse.aspx')
+
+class ParsePageDeadlineTest(unittest.TestCase):
+
+    def setUp(self):
+        parse_pool.PARSE_PROCESSES, processes = 1, parse_pool.PARSE_PROCESSES
+        self.addCleanup(setattr, parse_pool, 'PARSE_PROCESSES', processes)
+        self.addCleanup(parse_pool.shutdown)
+        part_info = support.server.generate_part_urls(
+            'http://exam.example/ViewCandResponse.aspx', support.server.get_exam_plan('DELHI_POLICE_HEAD_CONSTABLE'),
+        )[0]
+        with open(PAGE, 'rb') as f:
+            self.args = (f.read(), 'utf-8', part_info['part'], part_info['url'], part_info['subject'], 0)
+
+    def test_page_parsed_within_deadline(self):
+        candidate, questions = parse_pool.parse_page(*self.args, deadline=time.monotonic() + 30)
+        self.assertTrue(questions)
+
+    def test_page_past_deadline_is_abandoned(self):
+        start = time.monotonic()
+        with self.assertRaises(BodyDeadlineExceeded):
+            parse_pool.parse_page(*self.args, deadline=start + 0.001)
+        self.assertLess(time.monotonic() - start, 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import copy
+import unittest
+
+from tests.support import server, stub_url
+from analysis_store import create_store, record_for
+
+EXAM_TYPE = 'DELHI_POLICE_HEAD_CONSTABLE'
+
+class SharedStandingsTest(unittest.TestCase):
+    """Ranks and normalized scores count analyses stored by other workers, not only this one's"""
+
+    def analyze(self, rid):
+        return self.client.post('/', json={'url': stub_url(rid=rid), 'examType': EXAM_TYPE}).get_json()['data']
+
+    def setUp(self):
+        self.client = server.app.test_client()
+
+    def test_analysis_stored_by_another_worker_counts_after_sync(self):
+        mine = self.analyze(201)
+        server.store_writer.flush()
+        before = self.analyze(201)
+
+        # Another worker analyzes a stronger candidate of the same shift; it only reaches this one through the store
+        theirs = copy.deepcopy(mine)
+        theirs['candidate']['rollNumber'] = 'OTHER-WORKER-1'
+        theirs['totalScore'] = mine['totalScore'] + 10
+        for section in theirs['sections']:
+            section['score'] += 1
+        create_store().save_many([record_for(theirs, 'http://elsewhere/sheet')])
+
+        server.sync_standings()
+        after = self.analyze(201)
+        self.assertEqual(after['rank']['totalCandidates'], before['rank']['totalCandidates'] + 1)
+        self.assertEqual(after['rank']['rank'], before['rank']['rank'] + 1)
+        self.assertEqual(after['normalized']['totalCandidates'], before['normalized']['totalCandidates'] + 1)
+
+    def test_rebuild_keeps_analyses_not_yet_written(self):
+        queued = copy.deepcopy(self.analyze(202))
+        queued['candidate']['rollNumber'] = 'QUEUED-1'
+        server.store_writer.submit(queued, 'http://elsewhere/queued')
+        # Not flushed by hand: the rebuild must write what is queued before reading the store
+        server.rebuild_standings()
+        candidate = queued['candidate']
+        shift = server.rank_engine._shifts[(EXAM_TYPE, candidate['testDate'], candidate['shift'])]
+        self.assertIn('QUEUED-1', shift.candidates)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from tests import support  # noqa: F401  (isolated paths before the app modules load)
+import analysis_store
+from analysis_store import MemoryStore, SQLiteStore, StoreWriter
+
+class ClaimRescoreTest(unittest.TestCase):
+    """Of the workers reloading the same plan version, exactly one re-scores the store"""
+
+    def check(self, first, second):
+        self.assertTrue(first.claim_rescore('EXAM', 'v2'))
+        self.assertFalse(second.claim_rescore('EXAM', 'v2'))
+        self.assertTrue(second.claim_rescore('EXAM', 'v3'))
+        # Reverting to an earlier definition is a change again
+        self.assertTrue(first.claim_rescore('EXAM', 'v2'))
+        self.assertTrue(first.claim_rescore('OTHER', 'v2'))
+
+    def test_sqlite_workers(self):
+        path = os.path.join(tempfile.mkdtemp(), 'analyses.sqlite3')
+        self.check(SQLiteStore(path), SQLiteStore(path))
+
+    def test_memory(self):
+        store = MemoryStore()
+        self.check(store, store)
+
+class LockedStore(MemoryStore):
+    def __init__(self, failures):
+        super().__init__()
+        self.failures = failures
+
+    def save_many(self, records):
+        if self.failures:
+            self.failures -= 1
+            raise sqlite3.OperationalError('database is locked')
+        super().save_many(records)
+
+class StoreWriterTest(unittest.TestCase):
+
+    def test_locked_database_is_retried_not_dropped(self):
+        analysis_store.WRITE_RETRY_BACKOFF, backoff = 0.01, analysis_store.WRITE_RETRY_BACKOFF
+        self.addCleanup(setattr, analysis_store, 'WRITE_RETRY_BACKOFF', backoff)
+        store = LockedStore(failures=2)
+        writer = StoreWriter(store, flush_seconds=0)
+        result = {'examType': 'EXAM', 'candidate': {'rollNumber': 'R-1'}, 'questions': [], 'sections': []}
+        self.assertTrue(writer.submit(result))
+        writer.flush()
+        self.assertIsNotNone(store.get_by_roll('R-1', 'EXAM'))
+        self.assertEqual(store.failures, 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,275 @@
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+# Token bucket per upstream host: sustained requests/second and burst size for the host as a whole
+UPSTREAM_RATE = float(os.environ.get('UPSTREAM_RATE', 20))
+UPSTREAM_BURST = float(os.environ.get('UPSTREAM_BURST', 40))
+# 'sqlite' keeps one bucket per host in a file shared by every gunicorn worker on the box;
+# 'memory' gives each process its own bucket with a share of the limits
+UPSTREAM_BUCKET_BACKEND = os.environ.get('UPSTREAM_BUCKET_BACKEND', 'sqlite')
+UPSTREAM_BUCKET_PATH = os.environ.get('UPSTREAM_BUCKET_PATH', 'upstream_buckets.sqlite3')
+# Processes splitting the limits under 'memory' (gunicorn.conf.py sets this to its worker count)
+UPSTREAM_WORKERS = max(int(os.environ.get('UPSTREAM_WORKERS', os.environ.get('WEB_CONCURRENCY', 1))), 1)
+# A process's share of the burst never drops below one analysis's parts (5 for Delhi Police),
+# so a single analysis still fetches its parts in parallel; the host may then see up to
+# UPSTREAM_WORKERS times this at once
+UPSTREAM_MIN_PROCESS_BURST = float(os.environ.get('UPSTREAM_MIN_PROCESS_BURST', 5))
+PROCESS_RATE = UPSTREAM_RATE / UPSTREAM_WORKERS
+PROCESS_BURST = max(UPSTREAM_BURST / UPSTREAM_WORKERS, UPSTREAM_MIN_PROCESS_BURST, 1)
+# Longest a fetch with no budget of its own waits for a token before giving up
+UPSTREAM_RATE_WAIT = float(os.environ.get('UPSTREAM_RATE_WAIT', 2))
+
+# Circuit breaker per host: consecutive failures to open, seconds before a half-open probe
+BREAKER_FAILURES = int(os.environ.get('BREAKER_FAILURES', 5))
+BREAKER_RESET_SECONDS = float(os.environ.get('BREAKER_RESET_SECONDS', 30))
+BREAKER_HALF_OPEN_PROBES = int(os.environ.get('BREAKER_HALF_OPEN_PROBES', 1))
+
+# Hedged requests: a part still outstanding after its host's recent p95 latency gets one duplicate
+HEDGE_REQUESTS = os.environ.get('HEDGE_REQUESTS', '1') == '1'
+HEDGE_MIN_SECONDS = float(os.environ.get('HEDGE_MIN_SECONDS', 0.5))
+# Successful fetch latencies kept per host, and how many are needed before hedging starts
+LATENCY_WINDOW = int(os.environ.get('LATENCY_WINDOW', 200))
+LATENCY_MIN_SAMPLES = int(os.environ.get('LATENCY_MIN_SAMPLES', 20))
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+class UpstreamUnavailable(Exception):
+    """The fetch was not attempted: the host's breaker is open or its rate limit was hit"""
+
+    def __init__(self, host, reason, retry_after):
+        super().__init__(f'Upstream {host} unavailable ({reason}), retry in {retry_after:.0f}s')
+        self.host = host
+        self.reason = reason
+        self.retry_after = retry_after
+
+class TokenBucket:
+    """Classic token bucket: rate tokens/second refill, up to burst banked"""
+
+    def __init__(self, rate=PROCESS_RATE, burst=PROCESS_BURST):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, timeout=UPSTREAM_RATE_WAIT):
+        """Take one token, waiting up to timeout seconds; False if none came free"""
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+class SQLiteTokenBucket:
+    """The same token bucket for one host, kept in a SQLite row that every worker on the box draws from.
+
+    Each take is one short write transaction, so the host sees rate and burst
+    as configured however many processes are fetching from it.
+    """
+
+    def __init__(self, host, rate=UPSTREAM_RATE, burst=UPSTREAM_BURST, path=UPSTREAM_BUCKET_PATH):
+        self.host = host
+        self.rate = rate
+        self.burst = burst
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS upstream_buckets (host TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)'
+        )
+
+    def _take(self):
+        """Take a token if one is banked; returns the seconds until one will be (0 when taken)"""
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                now = time.time()
+                row = self._conn.execute('SELECT tokens, updated_at FROM upstream_buckets WHERE host = ?', (self.host,)).fetchone()
+                tokens = self.burst if row is None else min(self.burst, row[0] + max(now - row[1], 0) * self.rate)
+                wait = 0.0 if tokens >= 1 else (1 - tokens) / self.rate
+                if not wait:
+                    tokens -= 1
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO upstream_buckets (host, tokens, updated_at) VALUES (?, ?, ?)',
+                    (self.host, tokens, now),
+                )
+                self._conn.execute('COMMIT')
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+        return wait
+
+    def acquire(self, timeout=UPSTREAM_RATE_WAIT):
+        """Take one token, waiting up to timeout seconds; False if none came free"""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                wait = self._take()
+            except sqlite3.OperationalError as e:
+                # Another process held the file past the busy timeout; try again within the budget
+                logger.warning('upstream bucket busy host=%s error=%s', self.host, e)
+                wait = 1 / self.rate
+            if not wait:
+                return True
+            if time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+def create_bucket(host, backend=UPSTREAM_BUCKET_BACKEND, **kwargs):
+    """Token bucket for one host from the named backend ('memory' or 'sqlite')"""
+    if backend == 'memory':
+        return TokenBucket(**kwargs)
+    if backend == 'sqlite':
+        return SQLiteTokenBucket(host, **kwargs)
+    raise ValueError(f'Unknown upstream bucket backend: {backend}')
+
+class CircuitBreaker:
+    """Closed -> open after consecutive failures -> half-open probes -> closed.
+
+    While open every call is refused until reset_seconds have passed; then up
+    to half_open_probes calls are let through, and the first result decides
+    whether traffic resumes (closed) or the breaker opens again.
+    """
+
+    def __init__(self, failures=BREAKER_FAILURES, reset_seconds=BREAKER_RESET_SECONDS, half_open_probes=BREAKER_HALF_OPEN_PROBES):
+        self.failure_threshold = failures
+        self.reset_seconds = reset_seconds
+        self.half_open_probes = half_open_probes
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """(allowed, retry_after) for a new call"""
+        with self._lock:
+            if self.state == OPEN:
+                remaining = self._opened_at + self.reset_seconds - time.monotonic()
+                if remaining > 0:
+                    return False, remaining
+                self.state = HALF_OPEN
+                self._probes = 0
+            if self.state == HALF_OPEN:
+                if self._probes >= self.half_open_probes:
+                    return False, self.reset_seconds
+                self._probes += 1
+            return True, 0.0
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self.state = CLOSED
+
+    def record_failure(self):
+        """Count a failure; returns True if this call opened the breaker"""
+        with self._lock:
+            self._failures += 1
+            if self.state == HALF_OPEN or self._failures >= self.failure_threshold:
+                opened = self.state != OPEN
+                self.state = OPEN
+                self._opened_at = time.monotonic()
+                return opened
+            return False
+
+    def is_open(self):
+        """True while calls would be refused (ignores a due half-open transition)"""
+        with self._lock:
+            return self.state == OPEN and self._opened_at + self.reset_seconds > time.monotonic()
+
+class LatencyWindow:
+    """The most recent fetch latencies for one host, for percentile estimates"""
+
+    def __init__(self, size=LATENCY_WINDOW, min_samples=LATENCY_MIN_SAMPLES):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, fraction):
+        """Nearest-rank percentile of the window, or None until min_samples are in"""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+class HostGuard:
+    """Rate limiter, circuit breaker and latency window for one upstream host"""
+
+    def __init__(self, host):
+        self.host = host
+        self.bucket = create_bucket(host)
+        self.breaker = CircuitBreaker()
+        self.latency = LatencyWindow()
+
+    def raise_if_open(self):
+        if self.breaker.is_open():
+            raise UpstreamUnavailable(self.host, 'circuit open', self.breaker.reset_seconds)
+
+    def before_request(self, wait=UPSTREAM_RATE_WAIT):
+        """Wait up to wait seconds for a token; raise UpstreamUnavailable instead of letting a doomed or excess request through"""
+        self.raise_if_open()
+        if not self.bucket.acquire(timeout=wait):
+            raise UpstreamUnavailable(self.host, 'rate limited', 1 / self.bucket.rate)
+        # Claimed last so a rate-limited call never uses up a half-open probe slot
+        allowed, retry_after = self.breaker.allow()
+        if not allowed:
+            raise UpstreamUnavailable(self.host, 'circuit open', retry_after)
+
+    def hedge_after(self):
+        """Seconds after which an outstanding request to this host gets a duplicate, or None"""
+        if not HEDGE_REQUESTS or self.breaker.state != CLOSED:
+            return None
+        p95 = self.latency.percentile(0.95)
+        return None if p95 is None else max(p95, HEDGE_MIN_SECONDS)
+
+    def record(self, ok):
+        if ok:
+            if self.breaker.state != CLOSED:
+                logger.info('circuit closed host=%s', self.host)
+            self.breaker.record_success()
+        elif self.breaker.record_failure():
+            logger.warning('circuit opened host=%s retry_in=%.0fs', self.host, self.breaker.reset_seconds)
+
+_guards = {}
+_guards_lock = threading.Lock()
+
+def guard_for(url):
+    """The HostGuard for url's host, created on first use"""
+    host = (urlsplit(url).hostname or '').lower()
+    with _guards_lock:
+        guard = _guards.get(host)
+        if guard is None:
+            guard = _guards[host] = HostGuard(host)
+        return guard
+
+def host_states():
+    """{host: breaker state} for every host seen so far"""
+    with _guards_lock:
+        guards = list(_guards.values())
+    return {g.host: g.breaker.state for g in guards}
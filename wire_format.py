@@ -0,0 +1,131 @@
+import gzip
+import hashlib
+import os
+from collections import Counter
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this are sent as-is; compressing them costs more than it saves
+COMPRESS_MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', 1024))
+GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', 6))
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', 5))
+
+def image_base(urls):
+    """Most common image directory; URLs elsewhere are sent absolute ('' if none)"""
+    counts = Counter(url[:url.rfind('/') + 1] for url in urls if url)
+    if not counts:
+        return ''
+    return counts.most_common(1)[0][0]
+
+def result_image_urls(result):
+    for q in result['questions']:
+        yield q['questionImageUrl']
+        for o in q['options']:
+            yield o['imageUrl']
+
+def compact_images(entry, base, keys):
+    """Default image relative to base; Hindi/English variants only where they differ"""
+    default_key, hindi_key, english_key = keys
+
+    def rel(url):
+        return url[len(base):] if base and url.startswith(base) else url
+
+    default = entry[default_key]
+    images = {default_key: rel(default)}
+    if entry[hindi_key] != default:
+        images[hindi_key] = rel(entry[hindi_key])
+    if entry[english_key] != default:
+        images[english_key] = rel(entry[english_key])
+    return images
+
+def compact_result(result):
+    """Slim form of an analysis result for the compact wire format.
+
+    examConfig is replaced by examConfigId (see GET /exam-configs/<id>), image
+    URLs are relative to imageBase unless they fall outside it, language
+    variants identical to the default image are omitted, and each question's
+    subject is left to the matching section.
+    """
+    base = image_base(result_image_urls(result))
+    question_keys = ('questionImageUrl', 'questionImageUrlHindi', 'questionImageUrlEnglish')
+    option_keys = ('imageUrl', 'imageUrlHindi', 'imageUrlEnglish')
+
+    questions = []
+    for q in result['questions']:
+        compact = {'questionNumber': q['questionNumber'], 'part': q['part']}
+        compact.update(compact_images(q, base, question_keys))
+        compact['options'] = [
+            dict(compact_images(o, base, option_keys), id=o['id'], isSelected=o['isSelected'], isCorrect=o['isCorrect'])
+            for o in q['options']
+        ]
+        compact['status'] = q['status']
+        compact['marksAwarded'] = q['marksAwarded']
+        questions.append(compact)
+
+    slim = {k: v for k, v in result.items() if k not in ('examConfig', 'questions')}
+    slim['format'] = 'compact'
+    slim['examConfigId'] = result['examConfig']['id']
+    slim['imageBase'] = base
+    slim['questions'] = questions
+    return slim
+
+def accepted_encodings(header):
+    """{coding: q} from an Accept-Encoding header"""
+    accepted = {}
+    for item in (header or '').split(','):
+        coding, _, params = item.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding] = q
+    return accepted
+
+def choose_encoding(header):
+    """Best content coding we can produce for the client: 'br', 'gzip' or None"""
+    accepted = accepted_encodings(header)
+    wildcard = accepted.get('*', 0.0)
+    available = ['br', 'gzip'] if brotli is not None else ['gzip']
+
+    best, best_q = None, 0.0
+    for coding in available:
+        q = accepted.get(coding, wildcard)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    return body
+
+def etag_for(body):
+    """Weak validator over the uncompressed body, shared by every content coding of it"""
+    return 'W/"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    # Weak comparison: W/ prefixes are ignored on both sides
+    wanted = etag[2:] if etag.startswith('W/') else etag
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == wanted:
+            return True
+    return False